@@ -0,0 +1,221 @@
+"""
+Модуль с журналом ответов на вопросы теста
+"""
+import json
+import logging
+import sqlite3
+import threading
+import time
+from typing import Dict, List, Optional, Tuple
+
+from db import ConnectionPool
+
+# Типы событий журнала
+EVENT_START = "start"  # Начало новой попытки прохождения теста
+EVENT_ANSWER = "answer"  # Ответ на вопрос
+EVENT_BACK = "back"  # Возврат к предыдущему вопросу
+
+
+def apply_event(answers: List[str], kind: str, question_index: Optional[int], option: Optional[str]) -> List[str]:
+    """
+    Применяет событие к списку ответов
+
+    Args:
+        answers: Ответы пользователя до события (по одному на вопрос, по порядку)
+        kind: Тип события
+        question_index: Номер вопроса (с нуля)
+        option: Номер выбранного варианта ответа (для EVENT_ANSWER)
+
+    Returns:
+        List[str]: Ответы пользователя после события
+    """
+    if kind == EVENT_START:
+        return []
+    if kind == EVENT_ANSWER:
+        if question_index > len(answers):
+            # Ответы на предыдущие вопросы неизвестны - ответ оказался бы не на своем месте
+            logging.error(f"Пропущен ответ на вопрос {question_index}: известны ответы только на {len(answers)} вопросов")
+            return answers
+        # Ответ на вопрос заменяет ответы на него и на все последующие вопросы
+        return answers[:question_index] + [option]
+    if kind == EVENT_BACK:
+        # При возврате к вопросу ответы на него и на последующие вопросы отменяются
+        return answers[:question_index]
+    logging.warning(f"Неизвестный тип события в журнале ответов: {kind}")
+    return answers
+
+
+def count_answers(answers: List[str]) -> Dict[str, int]:
+    """
+    Подсчитывает статистику ответов по номерам вариантов
+    """
+    answer_stats = {"1": 0, "2": 0, "3": 0, "4": 0}
+    for answer in answers:
+        answer_stats[str(answer)] = answer_stats.get(str(answer), 0) + 1
+    return answer_stats
+
+
+class AnswerLog:
+    """
+    Журнал ответов в SQLite: каждый ответ и каждый возврат к вопросу
+    записывается отдельным событием, а текущие ответы пользователя
+    восстанавливаются из последнего снимка и короткого хвоста событий.
+    """
+
+    def __init__(
+        self,
+        pool: ConnectionPool,
+        snapshot_every: int = 10,
+        retention: float = 7 * 24 * 3600,
+        compact_every: int = 1000
+    ):
+        """
+        Args:
+            pool: Пул соединений с базой данных
+            snapshot_every: После скольких событий в хвосте делается новый снимок
+            retention: Сколько секунд хранить события, уже вошедшие в снимок
+            compact_every: После скольких записанных событий запускать уплотнение журнала
+        """
+        self.pool = pool
+        self.snapshot_every = snapshot_every
+        self.retention = retention
+        self.compact_every = compact_every
+        self._lock = threading.Lock()
+        self._appends_since_compact = 0
+
+    def _append(self, user_id: int, kind: str, question_index: Optional[int] = None, option: Optional[str] = None) -> int:
+        """
+        Дописывает событие в журнал
+
+        Returns:
+            int: Номер события в журнале
+        """
+        with self.pool.transaction() as conn:
+            event_id = conn.execute(
+                "INSERT INTO answer_events (user_id, kind, question_index, option, timestamp) VALUES (?, ?, ?, ?, ?)",
+                (user_id, kind, question_index, option, int(time.time()))
+            ).lastrowid
+
+        with self._lock:
+            self._appends_since_compact += 1
+            compact_due = self._appends_since_compact >= self.compact_every
+
+        if compact_due:
+            self.compact()
+        return event_id
+
+    def start_attempt(self, user_id: int) -> int:
+        """
+        Отмечает начало новой попытки прохождения теста
+
+        Returns:
+            int: Номер попытки (номер события начала попытки в журнале)
+        """
+        return self._append(user_id, EVENT_START)
+
+    def append_answer(self, user_id: int, question_index: int, option: str) -> None:
+        """
+        Записывает ответ пользователя на вопрос
+        """
+        self._append(user_id, EVENT_ANSWER, question_index, str(option))
+
+    def append_back(self, user_id: int, question_index: int) -> None:
+        """
+        Записывает возврат пользователя к вопросу question_index
+        """
+        self._append(user_id, EVENT_BACK, question_index)
+
+    def seed(self, user_id: int, answers: List[str]) -> bool:
+        """
+        Заполняет журнал ответами из прогресса, сохраненного до появления журнала
+        (только если для пользователя в журнале еще ничего нет)
+
+        Returns:
+            bool: True, если ответы записаны в журнал
+        """
+        with self.pool.transaction() as conn:
+            has_events = conn.execute(
+                "SELECT 1 FROM answer_events WHERE user_id = ? LIMIT 1", (user_id,)
+            ).fetchone() or conn.execute(
+                "SELECT 1 FROM answer_snapshots WHERE user_id = ?", (user_id,)
+            ).fetchone()
+            if has_events:
+                return False
+            conn.execute(
+                "INSERT INTO answer_snapshots (user_id, last_event_id, answers, timestamp) VALUES (?, ?, ?, ?)",
+                (user_id, 0, json.dumps([str(answer) for answer in answers]), int(time.time()))
+            )
+        return True
+
+    def _load_answers(self, conn: sqlite3.Connection, user_id: int, force_snapshot: bool = False) -> List[str]:
+        """
+        Восстанавливает ответы пользователя из снимка и хвоста событий,
+        при необходимости сохраняя новый снимок
+        """
+        row = conn.execute(
+            "SELECT last_event_id, answers FROM answer_snapshots WHERE user_id = ?",
+            (user_id,)
+        ).fetchone()
+        last_event_id, answers = (row[0], json.loads(row[1])) if row else (0, [])
+
+        tail = conn.execute(
+            "SELECT id, kind, question_index, option FROM answer_events WHERE user_id = ? AND id > ? ORDER BY id",
+            (user_id, last_event_id)
+        ).fetchall()
+        for _, kind, question_index, option in tail:
+            answers = apply_event(answers, kind, question_index, option)
+
+        if tail and (force_snapshot or len(tail) >= self.snapshot_every):
+            with conn:
+                conn.execute(
+                    "INSERT OR REPLACE INTO answer_snapshots (user_id, last_event_id, answers, timestamp) VALUES (?, ?, ?, ?)",
+                    (user_id, tail[-1][0], json.dumps(answers), int(time.time()))
+                )
+
+        return answers
+
+    def get_answers(self, user_id: int) -> List[str]:
+        """
+        Возвращает текущие ответы пользователя (по одному на вопрос, по порядку)
+        """
+        with self.pool.connection() as conn:
+            return self._load_answers(conn, user_id)
+
+    def get_state(self, user_id: int) -> Tuple[List[str], Dict[str, int]]:
+        """
+        Возвращает текущие ответы пользователя и статистику по ним
+        """
+        answers = self.get_answers(user_id)
+        return answers, count_answers(answers)
+
+    def compact(self) -> None:
+        """
+        Уплотняет журнал: снимает снимки для пользователей со старыми событиями
+        и удаляет события, которые уже вошли в снимки и старше срока хранения
+        """
+        try:
+            with self._lock:
+                self._appends_since_compact = 0
+
+            with self.pool.connection() as conn:
+                cutoff = int(time.time() - self.retention)
+
+                user_ids = [row[0] for row in conn.execute('''
+                    SELECT DISTINCT e.user_id FROM answer_events e
+                    LEFT JOIN answer_snapshots s ON s.user_id = e.user_id
+                    WHERE e.timestamp < ? AND e.id > COALESCE(s.last_event_id, 0)
+                ''', (cutoff,)).fetchall()]
+                for user_id in user_ids:
+                    self._load_answers(conn, user_id, force_snapshot=True)
+
+                with conn:
+                    deleted = conn.execute('''
+                        DELETE FROM answer_events
+                        WHERE timestamp < ? AND id <= (
+                            SELECT last_event_id FROM answer_snapshots s WHERE s.user_id = answer_events.user_id
+                        )
+                    ''', (cutoff,)).rowcount
+
+            logging.info(f"Журнал ответов уплотнен: удалено событий {deleted}, новых снимков {len(user_ids)}")
+        except Exception as e:
+            logging.error(f"Ошибка при уплотнении журнала ответов: {e}")
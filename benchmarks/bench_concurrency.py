@@ -0,0 +1,117 @@
+"""
+Замер пропускной способности обработки обновлений на смоделированной толпе
+пользователей: прежняя последовательная обработка (одно обновление за раз)
+против параллельной обработки с очередью на пользователя (UserSerializer).
+
+Каждое обновление - это нажатие на ответ (несколько запросов к API по
+API_LATENCY секунд), а часть пользователей присылает скриншот, загрузка
+которого занимает DOWNLOAD_LATENCY секунд. Замер также проверяет, что
+обновления каждого пользователя обработаны в порядке поступления.
+
+Запуск из корня проекта:
+    python benchmarks/bench_concurrency.py
+"""
+import asyncio
+import random
+import sys
+import time
+from pathlib import Path
+
+sys.path.insert(0, str(Path(__file__).resolve().parent.parent))
+
+from user_serializer import UserSerializer  # noqa: E402
+
+USERS = 200
+UPDATES_PER_USER = 10
+# Задержка одного запроса к API и сколько запросов делает обработка нажатия
+API_LATENCY = 0.005
+API_CALLS_PER_ANSWER = 2
+# Доля пользователей, присылающих скриншот, и время его загрузки
+SCREENSHOT_SHARE = 0.05
+DOWNLOAD_LATENCY = 0.5
+MAX_CONCURRENT_UPDATES = 64
+
+
+def make_updates(rng: random.Random):
+    """
+    Обновления толпы в порядке поступления: (user_id, порядковый номер, это скриншот)
+    """
+    pending = {user_id: 0 for user_id in range(USERS)}
+    screenshot_users = set(rng.sample(range(USERS), int(USERS * SCREENSHOT_SHARE)))
+    updates = []
+    while pending:
+        user_id = rng.choice(list(pending))
+        number = pending[user_id]
+        is_screenshot = user_id in screenshot_users and number == 0
+        updates.append((user_id, number, is_screenshot))
+        if number + 1 == UPDATES_PER_USER:
+            del pending[user_id]
+        else:
+            pending[user_id] = number + 1
+    return updates
+
+
+async def handle(update, processed, latencies, received_at):
+    user_id, number, is_screenshot = update
+    if is_screenshot:
+        await asyncio.sleep(DOWNLOAD_LATENCY)
+    else:
+        for _ in range(API_CALLS_PER_ANSWER):
+            await asyncio.sleep(API_LATENCY)
+    processed.setdefault(user_id, []).append(number)
+    latencies.append(time.perf_counter() - received_at)
+
+
+async def run_sequential(updates):
+    processed, latencies = {}, []
+    started = time.perf_counter()
+    for update in updates:
+        await handle(update, processed, latencies, started)
+    return time.perf_counter() - started, processed, latencies
+
+
+async def run_concurrent(updates):
+    processed, latencies = {}, []
+    serializer = UserSerializer()
+    slots = asyncio.Semaphore(MAX_CONCURRENT_UPDATES)
+
+    async def limited(update):
+        # Как в PerUserUpdateProcessor: место занимается до очереди пользователя
+        async with slots:
+            await serializer.run(update[0], handle(update, processed, latencies, started))
+
+    started = time.perf_counter()
+    # Как в Application с concurrent_updates: на каждое обновление создается задача в порядке поступления
+    tasks = [asyncio.create_task(limited(update)) for update in updates]
+    await asyncio.gather(*tasks)
+    return time.perf_counter() - started, processed, latencies
+
+
+def percentile(values, q):
+    values = sorted(values)
+    return values[min(len(values) - 1, int(q * len(values)))]
+
+
+def main() -> None:
+    updates = make_updates(random.Random(0))
+    expected = list(range(UPDATES_PER_USER))
+
+    results = {}
+    for name, runner in (("Последовательно", run_sequential), ("Параллельно по пользователям", run_concurrent)):
+        elapsed, processed, latencies = asyncio.run(runner(updates))
+        # Обновления каждого пользователя должны быть обработаны в порядке поступления
+        assert all(numbers == expected for numbers in processed.values()), name
+        assert len(processed) == USERS, name
+        results[name] = elapsed
+        print(
+            f"{name}: {elapsed:.2f} с, {len(updates) / elapsed:.0f} обновлений/с, "
+            f"p50 {percentile(latencies, 0.5) * 1000:.0f} мс, p95 {percentile(latencies, 0.95) * 1000:.0f} мс"
+        )
+
+    sequential, concurrent = results.values()
+    print(f"Пользователей: {USERS}, обновлений: {len(updates)}")
+    print(f"Ускорение: {sequential / concurrent:.1f}x")
+
+
+if __name__ == "__main__":
+    main()
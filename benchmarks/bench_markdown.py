@@ -0,0 +1,62 @@
+"""
+Замер скорости экранирования MarkdownV2 на текстах вопросов и вариантов
+ответов: прежние 18 вызовов str.replace против одного прохода через
+скомпилированное регулярное выражение (escape_markdown_v2) и через str.translate.
+
+Запуск из корня проекта:
+    python benchmarks/bench_markdown.py
+"""
+import sys
+import timeit
+from pathlib import Path
+
+sys.path.insert(0, str(Path(__file__).resolve().parent.parent))
+
+from markdown_v2 import escape_markdown_v2, SPECIAL_CHARS  # noqa: E402
+from questions import available_languages, get_questions_by_language  # noqa: E402
+
+ROUNDS = 200
+
+_ESCAPE_TABLE = str.maketrans({char: f"\\{char}" for char in SPECIAL_CHARS})
+
+
+def escape_legacy(text):
+    """
+    Прежний escape_markdown_v2
+    """
+    if not text:
+        return ""
+    if text.startswith("Спасибо за прохождение тестов") or text.startswith("Thank you for completing the tests"):
+        return text
+    special_chars = ['_', '*', '[', ']', '(', ')', '~', '`', '>', '#', '+', '-', '=', '|', '{', '}', '.', '!']
+    for char in special_chars:
+        text = text.replace(char, f"\\{char}")
+    return text
+
+
+def escape_translate(text):
+    return text.translate(_ESCAPE_TABLE) if text else ""
+
+
+def main() -> None:
+    corpus = []
+    for question in (question for language in available_languages() for question in get_questions_by_language(language)):
+        corpus.append(question["question"])
+        corpus.extend(question["options"].values())
+
+    for text in corpus:
+        assert escape_markdown_v2(text) == escape_legacy(text) == escape_translate(text)
+
+    results = {}
+    for name, escape in (("str.replace x18", escape_legacy), ("str.translate", escape_translate), ("re.sub", escape_markdown_v2)):
+        elapsed = min(timeit.repeat(lambda: [escape(text) for text in corpus], number=ROUNDS, repeat=5))
+        results[name] = elapsed / (ROUNDS * len(corpus)) * 1e6
+
+    print(f"Строк в корпусе: {len(corpus)}, символов: {sum(len(text) for text in corpus)}")
+    baseline = results["str.replace x18"]
+    for name, per_call in results.items():
+        print(f"{name:16} {per_call:6.2f} мкс на строку ({baseline / per_call:.1f}x)")
+
+
+if __name__ == "__main__":
+    main()
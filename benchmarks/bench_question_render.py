@@ -0,0 +1,81 @@
+"""
+Замер скорости формирования текста вопроса: прежнее форматирование
+(экранирование вопроса и вариантов при каждом показе) против каталога
+заранее подготовленных вопросов.
+
+Запуск из корня проекта:
+    python benchmarks/bench_question_render.py
+"""
+import random
+import sys
+import timeit
+from pathlib import Path
+
+sys.path.insert(0, str(Path(__file__).resolve().parent.parent))
+
+from localization import get_text  # noqa: E402
+from markdown_v2 import escape_markdown_v2  # noqa: E402
+from question_catalog import get_catalog, OPTION_LETTERS  # noqa: E402
+from questions import available_languages, get_questions_by_language  # noqa: E402
+
+ROUNDS = 20000
+
+
+def render_legacy(question: dict, question_number: int, order, language: str) -> str:
+    """
+    Прежний format_question_with_options (без перемешивания и маппинга)
+    """
+    question_text = question.get("question", "")
+    if language == "ru":
+        question_text = question_text.replace("*Вопрос:*\n", "")
+    else:
+        question_text = question_text.replace("*Question:*\n", "")
+
+    options = question.get("options", {})
+    options_text = ""
+    for i, number in enumerate(order):
+        options_text += f"*{OPTION_LETTERS[i]}\\)* {escape_markdown_v2(options.get(number, ''))}\n\n"
+
+    escaped_question_text = escape_markdown_v2(question_text)
+    questions = get_questions_by_language(language)
+    question_header = get_text("question_header", language).format(current=question_number + 1, total=len(questions))
+    return f"🔷 *{question_header}*\n*{escaped_question_text}*\n\n{options_text}"
+
+
+def render_catalog(question_number: int, order, language: str) -> str:
+    return get_catalog(language)[question_number].render(order)
+
+
+def main() -> None:
+    rng = random.Random(0)
+    cases = []
+    for language in available_languages():
+        questions = get_questions_by_language(language)
+        for index, question in enumerate(questions):
+            order = ["1", "2", "3", "4"]
+            rng.shuffle(order)
+            cases.append((language, index, question, order))
+
+    # Каталог должен давать тот же текст, что и прежнее форматирование
+    for language, index, question, order in cases:
+        assert render_catalog(index, order, language) == render_legacy(question, index, order, language)
+
+    def run_legacy():
+        for language, index, question, order in cases:
+            render_legacy(question, index, order, language)
+
+    def run_catalog():
+        for language, index, _, order in cases:
+            render_catalog(index, order, language)
+
+    legacy = min(timeit.repeat(run_legacy, number=ROUNDS // len(cases), repeat=5))
+    catalog = min(timeit.repeat(run_catalog, number=ROUNDS // len(cases), repeat=5))
+    renders = (ROUNDS // len(cases)) * len(cases)
+    print(f"Вопросов: {len(cases)}, показов в замере: {renders}")
+    print(f"Прежнее форматирование: {legacy / renders * 1e6:.2f} мкс на вопрос")
+    print(f"Каталог вопросов:       {catalog / renders * 1e6:.2f} мкс на вопрос")
+    print(f"Ускорение: {legacy / catalog:.1f}x")
+
+
+if __name__ == "__main__":
+    main()
@@ -1,6 +1,7 @@
 import logging
 import openai
 import asyncio
+import httpx
 from openai import OpenAI
 from telegram import Update, InlineKeyboardButton, InlineKeyboardMarkup
 from telegram.ext import Application, CommandHandler, MessageHandler, filters, CallbackContext, ConversationHandler, CallbackQueryHandler
@@ -8,13 +9,10 @@ from telegram.constants import ParseMode
 import psutil
 import sys
 import os
-import time
 import signal
-import random
-from questions import ALL_QUESTIONS, get_questions_by_language  # Импортируем вопросы из отдельного модуля
-import json
+from questions import get_questions_by_language  # Импортируем вопросы из отдельного модуля
 from typing import Dict, Any, Optional, List, Tuple
-import sqlite3
+from concurrent.futures import Future
 from datetime import datetime
 from pathlib import Path
 import shutil
@@ -23,7 +21,22 @@ import fcntl  # Для блокировки файла
 import re
 import schedule
 import threading
-from localization import get_text, save_user_language, get_user_language  # Импортируем функции для локализации
+from localization import get_text, load_locales  # Импортируем функции для локализации
+from markdown_v2 import escape_markdown_v2
+from results_message import render_results_message, phase_shares
+from question_catalog import (
+    get_catalog, PERMUTATIONS, question_permutation, answer_for_letter
+)
+from keyboards import question_keyboard
+import metrics
+from db import DatabaseExecutor
+from storage import Storage, InMemoryStorage, SQLiteStorage
+from webhook import WebhookServer
+from screenshot_store import ScreenshotStore
+from image_validation import ImageRejected, REJECT_TOO_LARGE, check_declared, read_image, sniff_image
+from rate_limiter import PriorityRateLimiter
+from update_processor import PerUserUpdateProcessor
+from send_scheduler import SendScheduler, PRIORITY_CRITICAL, PRIORITY_HIGH, PRIORITY_LOW
 
 # Загружаем переменные окружения
 load_dotenv()
@@ -53,6 +66,38 @@ ADMIN_USERNAME = os.getenv('ADMIN_USERNAME', 'tier2botadmin')
 # Создаем список администраторов
 ADMIN_IDS = [ADMIN_ID]
 
+# Способ получения обновлений: polling (по умолчанию) или webhook
+BOT_MODE = os.getenv('BOT_MODE', 'polling')
+# Публичный адрес вебхука, который регистрируется в Telegram (если не задан, вебхук не регистрируется)
+WEBHOOK_URL = os.getenv('WEBHOOK_URL')
+WEBHOOK_SECRET = os.getenv('WEBHOOK_SECRET')
+WEBHOOK_HOST = os.getenv('WEBHOOK_HOST', '0.0.0.0')
+WEBHOOK_PORT = int(os.getenv('WEBHOOK_PORT', os.getenv('PORT', '8443')))
+WEBHOOK_PATH = os.getenv('WEBHOOK_PATH', '/telegram')
+
+# Ограничения частоты исходящих запросов (по умолчанию - лимиты Telegram)
+SEND_RATE_GLOBAL = float(os.getenv('SEND_RATE_GLOBAL', '30'))
+SEND_RATE_PER_CHAT = float(os.getenv('SEND_RATE_PER_CHAT', '1'))
+SEND_CHAT_BURST = float(os.getenv('SEND_CHAT_BURST', '3'))
+
+# Сколько обновлений обрабатывать одновременно (обновления одного пользователя - всегда по очереди)
+CONCURRENT_UPDATES = int(os.getenv('CONCURRENT_UPDATES', '64'))
+
+# Сохранять ли скриншоты второго теста на диск (в фоне; администратору они пересылаются по file_id)
+ARCHIVE_SCREENSHOTS = os.getenv('ARCHIVE_SCREENSHOTS', 'false').lower() in ('1', 'true', 'yes')
+# Сколько дней хранить скриншоты (0 - бессрочно) и сколько мегабайт они могут занимать (0 - без ограничения)
+SCREENSHOT_RETENTION_DAYS = float(os.getenv('SCREENSHOT_RETENTION_DAYS', '180'))
+SCREENSHOT_MAX_MB = float(os.getenv('SCREENSHOT_MAX_MB', '2048'))
+# Максимальный размер одного скриншота в мегабайтах (файлы больше отклоняются до загрузки)
+MAX_SCREENSHOT_MB = float(os.getenv('MAX_SCREENSHOT_MB', '10'))
+MAX_SCREENSHOT_BYTES = int(MAX_SCREENSHOT_MB * 1024 * 1024)
+
+# Таймаут запросов к Telegram (в секундах): и для Bot API, и для загрузки скриншотов
+REQUEST_TIMEOUT = 30.0
+
+# Режим одного сообщения: вопросы теста показываются редактированием одного и того же сообщения
+SINGLE_MESSAGE_FLOW = os.getenv('SINGLE_MESSAGE_FLOW', 'false').lower() in ('1', 'true', 'yes')
+
 # Создаем структуру директорий для данных
 BASE_DIR = os.path.dirname(os.path.abspath(__file__))
 BASE_DIR = Path(__file__).resolve().parent  # Директория с bot.py
@@ -60,6 +105,7 @@ DATA_DIR = BASE_DIR / "data"  # Директория для всех данны
 DB_DIR = DATA_DIR / "db"  # Директория для баз данных
 LOGS_DIR = DATA_DIR / "logs"  # Директория для логов
 TEMP_DIR = DATA_DIR / "temp"  # Директория для временных файлов
+SCREENSHOTS_DIR = DATA_DIR / "screenshots"  # Хранилище скриншотов второго теста
 LOCK_FILE = DATA_DIR / "bot.lock"
 
 # Создаем необходимые директории
@@ -88,7 +134,10 @@ def get_absolute_path(relative_path):
 
 # Определяем пути к файлам
 DATABASE_FILE = DB_DIR / "test_results.db"
-PROGRESS_FILE = TEMP_DIR / "user_progress.json"
+LANGUAGE_DATABASE_FILE = DATA_DIR / "bot.db"  # Старая база с языками, переносится в DATABASE_FILE
+PROGRESS_FILE = TEMP_DIR / "user_progress.json"  # Старый формат, переносится в PROGRESS_DB_FILE
+PROGRESS_DB_FILE = DB_DIR / "progress.db"
+PROGRESS_JOURNAL_FILE = TEMP_DIR / "progress.journal"
 LOG_FILE = LOGS_DIR / "bot.log"
 
 # Настраиваем логирование с новым путем к файлу
@@ -101,6 +150,39 @@ logging.basicConfig(
     ]
 )
 
+# Потоки для работы с базами данных вне цикла событий
+DB_READER_THREADS = int(os.getenv('DB_READER_THREADS', '4'))
+db_executor = DatabaseExecutor(reader_threads=DB_READER_THREADS)
+
+# Хранилище скриншотов по хэшу содержимого (используется, если включено ARCHIVE_SCREENSHOTS)
+screenshot_store = ScreenshotStore(
+    SCREENSHOTS_DIR,
+    retention_days=SCREENSHOT_RETENTION_DAYS,
+    max_bytes=int(SCREENSHOT_MAX_MB * 1024 * 1024),
+)
+
+# Хранилище данных бота: sqlite (по умолчанию) или memory (данные только в памяти, для замеров)
+STORAGE_BACKEND = os.getenv('STORAGE_BACKEND', 'sqlite')
+if STORAGE_BACKEND == "memory":
+    storage: Storage = InMemoryStorage()
+else:
+    if STORAGE_BACKEND != "sqlite":
+        logging.warning(f"Неизвестное хранилище STORAGE_BACKEND={STORAGE_BACKEND}, используется sqlite")
+    storage = SQLiteStorage(
+        DATABASE_FILE,
+        PROGRESS_DB_FILE,
+        PROGRESS_JOURNAL_FILE,
+        # По одному соединению на каждый поток работы с базой, на фоновый сброс прогресса и на групповую запись
+        pool_size=DB_READER_THREADS + 3,
+        legacy_progress_file=PROGRESS_FILE,
+        legacy_language_file=LANGUAGE_DATABASE_FILE,
+        batch_max_size=int(os.getenv('DB_BATCH_MAX_SIZE', '100')),
+        batch_max_delay=float(os.getenv('DB_BATCH_MAX_DELAY_MS', '5')) / 1000,
+        progress_cache_size=int(os.getenv('PROGRESS_CACHE_SIZE', '10000')),
+        progress_cache_ttl=float(os.getenv('PROGRESS_CACHE_TTL', '1800')),
+        progress_flush_interval=float(os.getenv('PROGRESS_FLUSH_INTERVAL', '5'))
+    )
+
 # Определяем состояния
 CHOOSING_LANGUAGE = -1  # Новое состояние для выбора языка
 WAITING_FOR_TEST_CHOICE = 2
@@ -134,234 +216,52 @@ def check_single_instance():
         logging.error("Другой экземпляр бота уже запущен. Завершение работы.")
         return False
 
-def init_database():
-    """
-    Инициализирует базу данных
-    """
-    try:
-        conn = get_db_connection()
-        cursor = conn.cursor()
-        
-        # Создаем таблицу для ответов пользователей
-        cursor.execute('''
-            CREATE TABLE IF NOT EXISTS answers (
-                user_id INTEGER,
-                question_number INTEGER,
-                answer TEXT,
-                timestamp INTEGER,
-                PRIMARY KEY (user_id, question_number)
-            )
-        ''')
-        
-        # Создаем таблицу для результатов тестов
-        cursor.execute('''
-            CREATE TABLE IF NOT EXISTS test_results (
-                user_id INTEGER PRIMARY KEY,
-                dominant_type TEXT,
-                username TEXT,
-                first_name TEXT,
-                answers TEXT,
-                answer_stats TEXT,
-                timestamp INTEGER
-            )
-        ''')
-        
-        # Проверяем наличие столбца dominant_type в таблице test_results
-        cursor.execute("PRAGMA table_info(test_results)")
-        columns = [column[1] for column in cursor.fetchall()]
-        if 'dominant_type' not in columns:
-            logging.info("Добавляем столбец dominant_type в таблицу test_results")
-            cursor.execute("ALTER TABLE test_results ADD COLUMN dominant_type TEXT")
-        
-        # Проверяем наличие остальных столбцов в таблице test_results
-        if 'username' not in columns:
-            logging.info("Добавляем столбец username в таблицу test_results")
-            cursor.execute("ALTER TABLE test_results ADD COLUMN username TEXT")
-        
-        if 'first_name' not in columns:
-            logging.info("Добавляем столбец first_name в таблицу test_results")
-            cursor.execute("ALTER TABLE test_results ADD COLUMN first_name TEXT")
-        
-        if 'answers' not in columns:
-            logging.info("Добавляем столбец answers в таблицу test_results")
-            cursor.execute("ALTER TABLE test_results ADD COLUMN answers TEXT")
-        
-        if 'answer_stats' not in columns:
-            logging.info("Добавляем столбец answer_stats в таблицу test_results")
-            cursor.execute("ALTER TABLE test_results ADD COLUMN answer_stats TEXT")
-        
-        # Создаем таблицу для полных результатов тестов
-        cursor.execute('''
-            CREATE TABLE IF NOT EXISTS full_test_results (
-                user_id INTEGER PRIMARY KEY,
-                username TEXT,
-                first_name TEXT,
-                answers TEXT,
-                answer_stats TEXT,
-                timestamp INTEGER
-            )
-        ''')
-        
-        # Создаем таблицу для статусов тестов
-        cursor.execute('''
-            CREATE TABLE IF NOT EXISTS test_status (
-                user_id INTEGER PRIMARY KEY,
-                status TEXT,
-                timestamp INTEGER
-            )
-        ''')
-        
-        # Создаем таблицу для языковых настроек пользователей
-        cursor.execute('''
-            CREATE TABLE IF NOT EXISTS user_language (
-                user_id INTEGER PRIMARY KEY,
-                language TEXT
-            )
-        ''')
-        
-        conn.commit()
-        conn.close()
-        
-        logging.info("База данных инициализирована успешно")
-    except Exception as e:
-        logging.error(f"Ошибка при инициализации базы данных: {e}")
-
-def get_db_connection():
-    """
-    Создает и возвращает соединение с базой данных
-    """
-    try:
-        conn = sqlite3.connect(DATABASE_FILE)
-        return conn
-    except Exception as e:
-        logging.error(f"Ошибка при подключении к базе данных: {e}")
-        raise e
-
-def save_answer_to_db(user_id: int, question_number: int, answer: str):
+def save_answer_to_db(user_id: int, question_number: int, answer: str) -> Future:
     """
     Сохраняет каждый ответ пользователя в базу данных
     """
-    try:
-        conn = get_db_connection()
-        cursor = conn.cursor()
-        
-        # Создаем таблицу, если она не существует
-        cursor.execute('''
-            CREATE TABLE IF NOT EXISTS answers (
-                user_id INTEGER,
-                question_number INTEGER,
-                answer TEXT,
-                timestamp DATETIME DEFAULT CURRENT_TIMESTAMP
-            )
-        ''')
-        
-        # Сохраняем ответ
-        cursor.execute(
-            'INSERT INTO answers (user_id, question_number, answer) VALUES (?, ?, ?)',
-            (user_id, question_number, answer)
-        )
-        
-        conn.commit()
-        conn.close()
-    except Exception as e:
-        logging.error(f"Ошибка при сохранении ответа в базу данных: {e}")
+    return storage.save_answer(user_id, question_number, answer)
 
-def save_test_result(user_id: int, dominant_type: str):
+def save_test_result(user_id: int, dominant_type: str) -> Future:
     """
     Сохраняет результат теста пользователя (доминирующий тип)
     """
-    conn = get_db_connection()
-    cursor = conn.cursor()
-    
-    cursor.execute(
-        "INSERT OR REPLACE INTO test_results (user_id, dominant_type, timestamp) VALUES (?, ?, ?)",
-        (user_id, dominant_type, int(time.time()))
-    )
-    
-    conn.commit()
-    conn.close()
+    return storage.save_dominant_type(user_id, dominant_type)
 
-def save_test_results(user_id: int, username: str, first_name: str, answers: list, answer_stats: dict):
+def save_test_results(user_id: int, username: str, first_name: str, answers: list) -> Future:
     """
     Сохраняет результаты теста в базу данных
+    
+    Returns:
+        Future: Завершается, когда результаты записаны в базу
     """
-    try:
-        conn = sqlite3.connect(DATABASE_FILE)
-        cursor = conn.cursor()
-        
-        # Проверяем, существует ли запись для этого пользователя
-        cursor.execute('SELECT 1 FROM test_results WHERE user_id = ?', (user_id,))
-        exists = cursor.fetchone()
-        
-        if exists:
-            # Обновляем существующую запись
-            cursor.execute(
-                'UPDATE test_results SET username = ?, first_name = ?, answers = ?, answer_stats = ?, timestamp = CURRENT_TIMESTAMP WHERE user_id = ?',
-                (username, first_name, json.dumps(answers), json.dumps(answer_stats), user_id)
-            )
-        else:
-            # Создаем новую запись
-            cursor.execute(
-                'INSERT INTO test_results (user_id, username, first_name, answers, answer_stats) VALUES (?, ?, ?, ?, ?)',
-                (user_id, username, first_name, json.dumps(answers), json.dumps(answer_stats))
-            )
-        
-        conn.commit()
-        conn.close()
-    except Exception as e:
-        logging.error(f"Ошибка при сохранении результатов теста в базу данных: {e}")
+    return storage.save_test_results(user_id, username, first_name, answers)
 
-def update_test_status(user_id: int, status: str):
+def update_test_status(user_id: int, status: str) -> Future:
     """
     Обновляет статус теста пользователя
+    
+    Returns:
+        Future: Завершается, когда статус записан в базу
     """
-
-    try:
-        conn = get_db_connection()
-        cursor = conn.cursor()
-        
-        cursor.execute(
-            "INSERT OR REPLACE INTO test_status (user_id, status, timestamp) VALUES (?, ?, ?)",
-            (user_id, status, int(time.time()))
-        )
-        
-        conn.commit()
-        conn.close()
-        
-        logging.info(f"Обновлен статус теста для пользователя {user_id}: {status}")
-    except Exception as e:
-        logging.error(f"Ошибка при обновлении статуса теста: {e}")
+    logging.info(f"Обновлен статус теста для пользователя {user_id}: {status}")
+    return storage.update_test_status(user_id, status)
 
 def save_user_progress(user_id: int, data: Dict[str, Any]) -> None:
     """
-    Сохраняет прогресс пользователя в файл
+    Сохраняет прогресс пользователя в хранилище
     """
     try:
-        # Загружаем существующие данные
-        all_progress = {}
-        if os.path.exists(PROGRESS_FILE):
-            with open(PROGRESS_FILE, 'r') as f:
-                all_progress = json.load(f)
-        
-        # Обновляем данные для конкретного пользователя
-        all_progress[str(user_id)] = data
-        
-        # Сохраняем обновленные данные
-        with open(PROGRESS_FILE, 'w') as f:
-            json.dump(all_progress, f)
+        storage.save_progress(user_id, data)
     except Exception as e:
-        logging.error(f"Ошибка при сохранении прогресса пользователя в файл: {e}")
+        logging.error(f"Ошибка при сохранении прогресса пользователя: {e}")
 
 def load_user_progress(user_id: int) -> Dict[str, Any]:
     """
-    Загружает прогресс пользователя из файла
+    Загружает прогресс пользователя из хранилища
     """
     try:
-        if os.path.exists(PROGRESS_FILE):
-            with open(PROGRESS_FILE, 'r') as f:
-                all_progress = json.load(f)
-                return all_progress.get(str(user_id), {})
-        return {}
+        return storage.load_progress(user_id)
     except Exception as e:
         logging.error(f"Ошибка при загрузке прогресса пользователя: {e}")
         return {}
@@ -371,75 +271,33 @@ def clear_user_progress(user_id: int) -> None:
     Очищает сохраненный прогресс пользователя
     """
     try:
-        if os.path.exists(PROGRESS_FILE):
-            with open(PROGRESS_FILE, 'r') as f:
-                all_progress = json.load(f)
-            
-            # Удаляем данные пользователя, если они есть
-            all_progress.pop(str(user_id), None)
-            
-            with open(PROGRESS_FILE, 'w') as f:
-                json.dump(all_progress, f)
+        storage.clear_progress(user_id)
     except Exception as e:
         logging.error(f"Ошибка при очистке сохраненного прогресса пользователя: {e}")
 
-def format_question_with_options(question: dict, question_number: int, saved_options=None, user_id=None) -> tuple[str, dict, list]:
-    """
-    Форматирует вопрос с вариантами ответов для отображения
+def format_question_with_options(question_number: int, permutation: int, language: str = "ru") -> str:
     """
-    # Получаем язык пользователя (если не передан, используем русский)
-    language = get_user_language(user_id) if user_id else "ru"
-    
-    # Получаем текст вопроса и варианты ответов
-    question_text = question.get("question", "")
-    # Удаляем префикс в зависимости от языка
-    if language == "ru":
-        question_text = question_text.replace("*Вопрос:*\n", "")
-    else:
-        question_text = question_text.replace("*Question:*\n", "")
-    
-    options = question.get("options", {})
-    
-    # Создаем список пар (номер, текст ответа)
-    original_options = [(str(i), options.get(str(i), "")) for i in range(1, 5)]
-    
-    # Если есть сохраненный порядок вариантов, используем его
-    # Иначе перемешиваем варианты ответов
-    if saved_options:
-        # Используем сохраненный порядок
-        shuffled_options = saved_options
-    else:
-        # Перемешиваем варианты ответов
-        shuffled_options = original_options.copy()
-        random.shuffle(shuffled_options)
-    
-    # Создаем маппинг буква -> номер ответа для подсчета статистики
-    letters = ["A", "B", "C", "D"]
-    letter_to_number = {}
-    keyboard_letters = []
-    
-    # Форматируем варианты ответов
-    options_text = ""
-    for i, (number, option_text) in enumerate(shuffled_options):
-        letter = letters[i]
-        keyboard_letters.append(letter)
-        letter_to_number[letter] = number
-        
-        # Экранируем специальные символы в тексте варианта
-        escaped_option = escape_markdown_v2(option_text)
-        options_text += f"*{letter}\\)* {escaped_option}\n\n"
-    
-    # Экранируем специальные символы в тексте вопроса
-    escaped_question_text = escape_markdown_v2(question_text)
-    
-    # Получаем локализованный заголовок вопроса
-    questions = get_questions_by_language(language)
-    question_header = get_text("question_header", language).format(current=question_number + 1, total=len(questions))
+    Форматирует вопрос с вариантами ответов для отображения.
+    Текст собирается из заранее экранированных фрагментов каталога вопросов.
     
-    # Форматируем полный текст вопроса с блочным форматированием (вариант 2)
-    formatted_text = f"🔷 *{question_header}*\n*{escaped_question_text}*\n\n{options_text}"
-    
-    return formatted_text, letter_to_number, keyboard_letters, shuffled_options
+    Args:
+        question_number: Номер вопроса (с нуля)
+        permutation: Номер перестановки, задающей порядок вариантов ответа
+        language: Код языка (ru, en)
+    """
+    return get_catalog(language)[question_number].render(PERMUTATIONS[permutation])
+
+async def show_question_in_place(query, user_id: int, progress: Dict[str, Any], question_number: int, language: str) -> None:
+    """
+    Показывает вопрос в сообщении, на кнопку которого нажал пользователь (режим SINGLE_MESSAGE_FLOW):
+    сообщение редактируется одним запросом вместо удаления кнопок и отправки нового
+    """
+    await query.edit_message_text(
+        format_question_with_options(question_number, question_permutation(user_id, progress, question_number), language=language),
+        parse_mode=ParseMode.MARKDOWN_V2,
+        reply_markup=question_keyboard(language, has_back=question_number > 0, question=question_number),
+        rate_limit_args=PRIORITY_HIGH
+    )
 
 async def start(update: Update, context: CallbackContext) -> int:
     """
@@ -472,44 +330,29 @@ async def start_test(update: Update, context: CallbackContext) -> int:
     """
     choice = update.message.text
     user_id = update.message.from_user.id
-    language = get_user_language(user_id)
+    language = storage.get_user_language(user_id)
     
     if choice == get_text("take_test", language):
         # Очищаем прогресс пользователя перед началом теста
-        clear_user_progress(user_id)
+        await db_executor.write(clear_user_progress, user_id)
+        attempt_id = await db_executor.write(storage.start_attempt, user_id)
         
         # Загружаем первый вопрос
         current_question = 0
-        questions = get_questions_by_language(language)
-        question = questions[current_question]
+        progress = {"current_question": current_question, "attempt_id": attempt_id}
         
-        # Форматируем вопрос и получаем маппинг ответов
-        formatted_text, letter_to_number, keyboard_letters, shuffled_options = format_question_with_options(question, current_question, user_id=user_id)
-        
-        # Создаем инлайн-клавиатуру с вариантами ответов по 2 в ряд
-        keyboard = []
-        for i in range(0, len(keyboard_letters), 2):
-            row = []
-            for j in range(i, min(i+2, len(keyboard_letters))):
-                letter = keyboard_letters[j]
-                row.append(InlineKeyboardButton(letter, callback_data=f"answer_{letter}"))
-            keyboard.append(row)
-        
-        # Сохраняем начальное состояние с маппингом
-        save_user_progress(user_id, {
-            "current_question": 0,
-            "answers": [],
-            "answer_stats": {"1": 0, "2": 0, "3": 0, "4": 0},
-            "current_mapping": letter_to_number,
-            "shuffled_options": shuffled_options,
-            "question_options": {"0": shuffled_options}  # Сохраняем порядок вариантов для первого вопроса
-        })
+        # Форматируем вопрос в случайном порядке вариантов
+        formatted_text = format_question_with_options(current_question, question_permutation(user_id, progress, current_question), language=language)
+        
+        # Сохраняем начальное состояние с номером попытки
+        await db_executor.write(save_user_progress, user_id, progress)
         
         # Отправляем первый вопрос
         await update.message.reply_text(
                 formatted_text,
             parse_mode=ParseMode.MARKDOWN_V2,
-            reply_markup=InlineKeyboardMarkup(keyboard)
+            reply_markup=question_keyboard(language),
+            rate_limit_args=PRIORITY_HIGH
         )
         return ANSWERING_QUESTIONS
     else:
@@ -532,11 +375,11 @@ async def handle_continue_choice(update: Update, context: CallbackContext) -> in
     """
     choice = update.message.text
     user_id = update.message.from_user.id
-    language = get_user_language(user_id)
+    language = storage.get_user_language(user_id)
     
     if choice == "Продолжить":
         # Загружаем прогресс пользователя
-        progress = load_user_progress(user_id)
+        progress = await db_executor.read(load_user_progress, user_id)
         current_question = progress.get("current_question", 0)
         questions = get_questions_by_language(language)
         
@@ -547,21 +390,11 @@ async def handle_continue_choice(update: Update, context: CallbackContext) -> in
         # Получаем текущий вопрос
         question = questions[current_question]
         
-        # Создаем инлайн-клавиатуру с вариантами ответов
-        keyboard = []
-        keyboard_letters = ["A", "B", "C", "D"]
-        for i in range(0, len(keyboard_letters), 2):
-            row = []
-            for j in range(i, min(i+2, len(keyboard_letters))):
-                letter = keyboard_letters[j]
-                row.append(InlineKeyboardButton(letter, callback_data=f"answer_{letter}"))
-            keyboard.append(row)
-        
         # Отправляем вопрос пользователю
         await update.message.reply_text(
             f"{current_question + 1}. {question['text']}\n\n"
             "Выберите один из вариантов:",
-            reply_markup=InlineKeyboardMarkup(keyboard)
+            reply_markup=question_keyboard(language)
         )
         return ANSWERING_QUESTIONS
     else:
@@ -580,16 +413,17 @@ async def handle_answer_callback(update: Update, context: CallbackContext) -> in
     
     user_id = query.from_user.id
     callback_data = query.data
-    language = get_user_language(user_id)
+    language = storage.get_user_language(user_id)
     
     # Проверяем, что это callback для ответа на вопрос или кнопки "Назад"
     if callback_data.startswith("answer_"):
-        # Получаем букву ответа
-        answer_letter = callback_data.split("_")[1]
+        # Получаем букву ответа (и номер вопроса, если он есть в callback_data)
+        callback_parts = callback_data.split("_")
+        answer_letter = callback_parts[1]
         logging.info(f"Получен ответ от пользователя {user_id}: {answer_letter}")
         
         # Получаем текущий прогресс пользователя
-        progress = load_user_progress(user_id)
+        progress = await db_executor.read(load_user_progress, user_id)
         
         if not progress:
             logging.error(f"Не найден прогресс для пользователя {user_id}")
@@ -602,16 +436,18 @@ async def handle_answer_callback(update: Update, context: CallbackContext) -> in
         # Получаем номер текущего вопроса
         current_question = progress["current_question"]
         
+        # Нажатие на вопрос, который уже заменен следующим (например, двойное нажатие в режиме одного сообщения)
+        if len(callback_parts) > 2 and callback_parts[2] != str(current_question):
+            logging.info(f"Пропущено нажатие пользователя {user_id} на вопрос {callback_parts[2]}, текущий вопрос {current_question}")
+            return ANSWERING_QUESTIONS
+        
         # Сохраняем ID сообщения с текущим вопросом для возможности возврата
         if "previous_question_message_id" not in progress:
             progress["previous_question_message_id"] = {}
         progress["previous_question_message_id"][str(current_question)] = query.message.message_id
         
-        # Получаем маппинг букв на номера ответов
-        letter_to_number = progress["current_mapping"]
-        
-        # Получаем номер ответа по букве
-        answer_number = letter_to_number.get(answer_letter)
+        # Получаем номер ответа по букве и порядку вариантов текущего вопроса
+        answer_number = answer_for_letter(user_id, progress, current_question, answer_letter)
         
         if answer_number is None:
             logging.error(f"Не найден номер ответа для буквы {answer_letter}")
@@ -621,21 +457,36 @@ async def handle_answer_callback(update: Update, context: CallbackContext) -> in
             )
             return ConversationHandler.END
         
-        # Сохраняем ответ пользователя
-        progress["answers"].append(answer_number)
-        
-        # Обновляем статистику ответов
-        progress["answer_stats"][str(answer_number)] += 1
-        
-        # Логируем обновление статистики
-        logging.info(f"Обновлена статистика ответов для пользователя {user_id}: {progress['answer_stats']}")
+        # Записываем ответ пользователя в журнал ответов
+        await db_executor.write(storage.append_answer, user_id, current_question, answer_number)
+        logging.info(f"Записан ответ пользователя {user_id} на вопрос {current_question + 1}: {answer_number}")
+        
+        if SINGLE_MESSAGE_FLOW:
+            # Следующий вопрос (или кнопки завершения) показываем в том же сообщении
+            if current_question >= len(get_questions_by_language(language)) - 1:
+                await db_executor.write(save_user_progress, user_id, progress)
+                await query.edit_message_text(
+                    escape_markdown_v2(get_text("last_question_answered", language)),
+                    parse_mode=ParseMode.MARKDOWN_V2,
+                    reply_markup=question_keyboard(language, has_back=True, is_last=True),
+                    rate_limit_args=PRIORITY_HIGH
+                )
+                return ANSWERING_QUESTIONS
+            
+            current_question += 1
+            progress["current_question"] = current_question
+            await db_executor.write(save_user_progress, user_id, progress)
+            await show_question_in_place(query, user_id, progress, current_question, language)
+            return ANSWERING_QUESTIONS
         
         # Удаляем кнопки и показываем выбранный ответ
         try:
-            await query.edit_message_reply_markup(reply_markup=None)
+            await query.edit_message_reply_markup(reply_markup=None, rate_limit_args=PRIORITY_HIGH)
+            # С тем же приоритетом, что и следующий вопрос, иначе вопрос обогнал бы это сообщение
             response_message = await query.message.reply_text(
-                get_text("answer_selected", language).format(letter=answer_letter),
-                parse_mode=ParseMode.MARKDOWN_V2
+                escape_markdown_v2(get_text("answer_selected", language, letter=answer_letter), trusted=True),
+                parse_mode=ParseMode.MARKDOWN_V2,
+                rate_limit_args=PRIORITY_HIGH
             )
             # Сохраняем ID сообщения с выбранным ответом
             progress["last_answer_message_id"] = response_message.message_id
@@ -643,25 +494,20 @@ async def handle_answer_callback(update: Update, context: CallbackContext) -> in
             logging.warning(f"Не удалось удалить кнопки: {e}")
         
         # Получаем вопросы для языка пользователя
-        language = get_user_language(user_id)
         questions = get_questions_by_language(language)
         
         # Проверяем, был ли это последний вопрос
         if current_question >= len(questions) - 1:
             # Это был последний вопрос, показываем кнопки "Назад" и "Завершить тест"
-            keyboard = [
-                [InlineKeyboardButton(get_text("back_to_previous", language), callback_data="back_to_previous")],
-                [InlineKeyboardButton(get_text("finish_test", language), callback_data="finish_test")]
-            ]
-            
             await query.message.reply_text(
                 escape_markdown_v2(get_text("last_question_answered", language)),
                 parse_mode=ParseMode.MARKDOWN_V2,
-                reply_markup=InlineKeyboardMarkup(keyboard)
+                reply_markup=question_keyboard(language, has_back=True, is_last=True),
+                rate_limit_args=PRIORITY_HIGH
             )
             
             # Сохраняем обновленный прогресс
-            save_user_progress(user_id, progress)
+            await db_executor.write(save_user_progress, user_id, progress)
             
             return ANSWERING_QUESTIONS
         
@@ -669,50 +515,18 @@ async def handle_answer_callback(update: Update, context: CallbackContext) -> in
         current_question += 1
         progress["current_question"] = current_question
         
-        # Загружаем следующий вопрос
-        question = questions[current_question]
-        
-        # Проверяем, есть ли сохраненный порядок вариантов для этого вопроса
-        if "question_options" not in progress:
-            progress["question_options"] = {}
-        
-        saved_options = progress["question_options"].get(str(current_question))
-        formatted_text, letter_to_number, keyboard_letters, shuffled_options = format_question_with_options(
-            question, 
-            current_question,
-            saved_options,
-            user_id=user_id
-        )
-        
-        # Сохраняем порядок вариантов для этого вопроса, если его еще нет
-        if str(current_question) not in progress["question_options"]:
-            progress["question_options"][str(current_question)] = shuffled_options
-        
-        # Обновляем маппинг в прогрессе
-        progress["current_mapping"] = letter_to_number
-        progress["shuffled_options"] = shuffled_options
+        # Форматируем следующий вопрос
+        formatted_text = format_question_with_options(current_question, question_permutation(user_id, progress, current_question), language=language)
         
         # Сохраняем обновленный прогресс
-        save_user_progress(user_id, progress)
-        
-        # Создаем инлайн-клавиатуру с вариантами ответов по 2 в ряд
-        keyboard = []
-        for i in range(0, len(keyboard_letters), 2):
-            row = []
-            for j in range(i, min(i+2, len(keyboard_letters))):
-                letter = keyboard_letters[j]
-                row.append(InlineKeyboardButton(letter, callback_data=f"answer_{letter}"))
-            keyboard.append(row)
-        
-        # Добавляем кнопку "Назад" для всех вопросов, кроме первого
-        if current_question > 0:
-            keyboard.append([InlineKeyboardButton(get_text("back_to_previous", language), callback_data="back_to_previous")])
-        
-        # Отправляем следующий вопрос
+        await db_executor.write(save_user_progress, user_id, progress)
+        
+        # Отправляем следующий вопрос (кнопка "Назад" есть у всех вопросов, кроме первого)
         await query.message.reply_text(
             formatted_text,
             parse_mode=ParseMode.MARKDOWN_V2,
-            reply_markup=InlineKeyboardMarkup(keyboard)
+            reply_markup=question_keyboard(language, has_back=current_question > 0),
+            rate_limit_args=PRIORITY_HIGH
         )
         
         return ANSWERING_QUESTIONS
@@ -733,10 +547,10 @@ async def go_to_previous_question_inline(update: Update, context: CallbackContex
     """
     query = update.callback_query
     user_id = query.from_user.id
-    language = get_user_language(user_id)
+    language = storage.get_user_language(user_id)
     
     # Получаем текущий прогресс пользователя
-    progress = load_user_progress(user_id)
+    progress = await db_executor.read(load_user_progress, user_id)
     
     if not progress:
         logging.error(f"Не найден прогресс для пользователя {user_id}")
@@ -757,6 +571,16 @@ async def go_to_previous_question_inline(update: Update, context: CallbackContex
         )
         return ANSWERING_QUESTIONS
     
+    if SINGLE_MESSAGE_FLOW:
+        # Возвращаемся к предыдущему вопросу в том же сообщении
+        # (ответы на этот и последующие вопросы отменяются)
+        current_question -= 1
+        progress["current_question"] = current_question
+        await db_executor.write(storage.append_back, user_id, current_question)
+        await db_executor.write(save_user_progress, user_id, progress)
+        await show_question_in_place(query, user_id, progress, current_question, language)
+        return ANSWERING_QUESTIONS
+    
     # Пытаемся удалить сообщение с выбранным ответом ("Выбран ответ X")
     if "last_answer_message_id" in progress:
         try:
@@ -787,57 +611,17 @@ async def go_to_previous_question_inline(update: Update, context: CallbackContex
         except Exception as e2:
             logging.warning(f"Не удалось ни удалить, ни скрыть текущий вопрос: {e}, {e2}")
     
-    # Удаляем последний ответ из списка ответов
-    if progress["answers"]:
-        last_answer = progress["answers"].pop()
-        # Уменьшаем счетчик для этого типа ответа
-        progress["answer_stats"][str(last_answer)] -= 1
-    
-    # Получаем вопросы для языка пользователя
-    language = get_user_language(user_id)
-    questions = get_questions_by_language(language)
-    
-    # Переходим к предыдущему вопросу
+    # Переходим к предыдущему вопросу и записываем возврат в журнал ответов
+    # (ответы на этот и последующие вопросы отменяются)
     current_question -= 1
     progress["current_question"] = current_question
+    await db_executor.write(storage.append_back, user_id, current_question)
     
-    # Загружаем предыдущий вопрос
-    question = questions[current_question]
+    # Форматируем предыдущий вопрос в том же порядке вариантов, в котором он был показан
+    formatted_text = format_question_with_options(current_question, question_permutation(user_id, progress, current_question), language=language)
     
-    # Проверяем, есть ли сохраненный порядок вариантов для этого вопроса
-    if "question_options" not in progress:
-        progress["question_options"] = {}
-    
-    saved_options = progress["question_options"].get(str(current_question))
-    
-    # Форматируем вопрос и получаем маппинг ответов
-    formatted_text, letter_to_number, keyboard_letters, shuffled_options = format_question_with_options(
-        question, 
-        current_question,
-        saved_options,
-        user_id=user_id
-    )
-    
-    # Сохраняем порядок вариантов для этого вопроса, если его еще нет
-    if str(current_question) not in progress["question_options"]:
-        progress["question_options"][str(current_question)] = shuffled_options
-    
-    # Обновляем маппинг в прогрессе
-    progress["current_mapping"] = letter_to_number
-    progress["shuffled_options"] = shuffled_options
-    
-    # Создаем инлайн-клавиатуру с вариантами ответов по 2 в ряд
-    keyboard = []
-    for i in range(0, len(keyboard_letters), 2):
-        row = []
-        for j in range(i, min(i+2, len(keyboard_letters))):
-            letter = keyboard_letters[j]
-            row.append(InlineKeyboardButton(letter, callback_data=f"answer_{letter}"))
-        keyboard.append(row)
-    
-    # Добавляем кнопку "Назад" для всех вопросов, кроме первого
-    if current_question > 0:
-        keyboard.append([InlineKeyboardButton(get_text("back_to_previous", language), callback_data="back_to_previous")])
+    # Клавиатура вопроса (кнопка "Назад" есть у всех вопросов, кроме первого)
+    reply_markup = question_keyboard(language, has_back=current_question > 0)
     
     # Проверяем, есть ли сохраненный ID сообщения с предыдущим вопросом
     if "previous_question_message_id" in progress and progress["previous_question_message_id"].get(str(current_question)):
@@ -847,7 +631,8 @@ async def go_to_previous_question_inline(update: Update, context: CallbackContex
             await context.bot.edit_message_reply_markup(
                 chat_id=user_id,
                 message_id=previous_message_id,
-                reply_markup=InlineKeyboardMarkup(keyboard)
+                reply_markup=reply_markup,
+                rate_limit_args=PRIORITY_HIGH
             )
             logging.info(f"Восстановлены кнопки для предыдущего вопроса (ID: {previous_message_id})")
         except Exception as e:
@@ -857,7 +642,8 @@ async def go_to_previous_question_inline(update: Update, context: CallbackContex
                 chat_id=user_id,
                 text=formatted_text,
                 parse_mode=ParseMode.MARKDOWN_V2,
-                reply_markup=InlineKeyboardMarkup(keyboard)
+                reply_markup=reply_markup,
+                rate_limit_args=PRIORITY_HIGH
             )
             # Сохраняем ID отправленного сообщения
             if "previous_question_message_id" not in progress:
@@ -869,7 +655,8 @@ async def go_to_previous_question_inline(update: Update, context: CallbackContex
             chat_id=user_id,
             text=formatted_text,
             parse_mode=ParseMode.MARKDOWN_V2,
-            reply_markup=InlineKeyboardMarkup(keyboard)
+            reply_markup=reply_markup,
+            rate_limit_args=PRIORITY_HIGH
         )
         # Сохраняем ID отправленного сообщения
         if "previous_question_message_id" not in progress:
@@ -877,7 +664,7 @@ async def go_to_previous_question_inline(update: Update, context: CallbackContex
         progress["previous_question_message_id"][str(current_question)] = message.message_id
     
     # Сохраняем обновленный прогресс
-    save_user_progress(user_id, progress)
+    await db_executor.write(save_user_progress, user_id, progress)
     
     return ANSWERING_QUESTIONS
 
@@ -915,7 +702,8 @@ async def handle_admin_response(update: Update, context: CallbackContext) -> Non
             await context.bot.send_message(
                 chat_id=user_id,
                 text=message,
-                parse_mode=ParseMode.MARKDOWN
+                parse_mode=ParseMode.MARKDOWN,
+                rate_limit_args=PRIORITY_CRITICAL
             )
             await update.message.reply_text(
                 f"✅ Ответ успешно отправлен пользователю (ID: {user_id})"
@@ -944,6 +732,16 @@ async def handle_admin_response(update: Update, context: CallbackContext) -> Non
     except Exception as e:
         await update.message.reply_text(f"Ошибка при отправке ответа: {str(e)}")
 
+async def show_metrics(update: Update, context: CallbackContext) -> None:
+    """
+    Показывает администратору текущие метрики работы бота
+    """
+    if update.message.from_user.id != ADMIN_ID:
+        await update.message.reply_text("У вас нет прав для выполнения этой команды.")
+        return
+    
+    await update.message.reply_text(metrics.format_snapshot())
+
 async def test_message(update: Update, context: CallbackContext) -> None:
     """
     Тестовая функция для отправки сообщения
@@ -1003,7 +801,8 @@ async def handle_admin_decision(update: Update, context: CallbackContext) -> Non
             await context.bot.send_message(
                 chat_id=user_id,
                 text=message,
-                parse_mode=ParseMode.MARKDOWN_V2
+                parse_mode=ParseMode.MARKDOWN_V2,
+                rate_limit_args=PRIORITY_CRITICAL
             )
             await update.message.reply_text(
                 f"✅ Ответ успешно отправлен пользователю (ID: {user_id})"
@@ -1025,67 +824,35 @@ async def handle_admin_decision(update: Update, context: CallbackContext) -> Non
         logging.error(f"Ошибка при обработке решения администратора: {e}")
         await update.message.reply_text(f"Произошла ошибка: {str(e)}")
 
-def escape_markdown_v2(text):
-    """
-    Экранирует специальные символы для Markdown V2
-    """
-    if not text:
-        return ""
-    
-    # Проверяем, является ли текст сообщением с результатами теста
-    if text.startswith("Спасибо за прохождение тестов") or text.startswith("Thank you for completing the tests"):
-        # Для сообщения с результатами теста не применяем экранирование
-        return text
-    
-    # Список специальных символов, которые нужно экранировать
-    special_chars = ['_', '*', '[', ']', '(', ')', '~', '`', '>', '#', '+', '-', '=', '|', '{', '}', '.', '!']
-    
-    # Экранируем каждый специальный символ
-    for char in special_chars:
-        text = text.replace(char, f"\\{char}")
-    
-    return text
-
 def format_test_results_message(user_id, language):
     """
     Формирует сообщение с результатами теста на основе статистики ответов пользователя
     """
     # Получаем статистику ответов пользователя
-    conn = get_db_connection()
-    cursor = conn.cursor()
-    cursor.execute("SELECT answers, answer_stats FROM test_results WHERE user_id = ?", (user_id,))
-    result = cursor.fetchone()
-    conn.close()
+    answer_stats = storage.get_answer_stats(user_id)
     
     # Логируем полученные данные
-    logging.info(f"Данные из базы для пользователя {user_id}: {result}")
-    
-    if not result:
-        # Если результаты не найдены, возвращаем стандартное сообщение
-        return get_text("results_received", language)
-    
-    # Получаем базовый шаблон сообщения
-    message_template = get_text("results_received", language)
-    
-    # Получаем статистику ответов
-    answer_stats = json.loads(result[1])
-    total_answers = sum(answer_stats.values())
-    
-    # Формируем строки с результатами
-    if language == "ru":
-        # Для русского языка
-        message = message_template.replace("<b>Ранняя фаза</b>", f"<b>Ответов {answer_stats.get('1', 0)} ({(answer_stats.get('1', 0) / total_answers * 100) if total_answers > 0 else 0:.0f}%) Ранняя фаза</b>")
-        message = message.replace("<b>Средняя фаза</b>", f"<b>Ответов {answer_stats.get('2', 0)} ({(answer_stats.get('2', 0) / total_answers * 100) if total_answers > 0 else 0:.0f}%) Средняя фаза</b>")
-        message = message.replace("<b>Поздняя фаза</b>", f"<b>Ответов {answer_stats.get('3', 0)} ({(answer_stats.get('3', 0) / total_answers * 100) if total_answers > 0 else 0:.0f}%) Поздняя фаза</b>")
-        message = message.replace("<b>Переход к жёлтому</b>", f"<b>Ответов {answer_stats.get('4', 0)} ({(answer_stats.get('4', 0) / total_answers * 100) if total_answers > 0 else 0:.0f}%) Переход к жёлтому</b>")
-    else:
-        # Для английского языка
-        message = message_template.replace("<b>Early phase</b>", f"<b>Answers {answer_stats.get('1', 0)} ({(answer_stats.get('1', 0) / total_answers * 100) if total_answers > 0 else 0:.0f}%) Early phase</b>")
-        message = message.replace("<b>Middle phase</b>", f"<b>Answers {answer_stats.get('2', 0)} ({(answer_stats.get('2', 0) / total_answers * 100) if total_answers > 0 else 0:.0f}%) Middle phase</b>")
-        message = message.replace("<b>Late phase</b>", f"<b>Answers {answer_stats.get('3', 0)} ({(answer_stats.get('3', 0) / total_answers * 100) if total_answers > 0 else 0:.0f}%) Late phase</b>")
-        message = message.replace("<b>Transition to Yellow</b>", f"<b>Answers {answer_stats.get('4', 0)} ({(answer_stats.get('4', 0) / total_answers * 100) if total_answers > 0 else 0:.0f}%) Transition to Yellow</b>")
+    logging.info(f"Статистика ответов из базы для пользователя {user_id}: {answer_stats}")
     
-    return message
+    # Без статистики шаблон заполняется пустыми местами
+    return render_results_message(answer_stats, language)
+
+def get_first_test_stats_text(user_id: int) -> str:
+    """
+    Формирует статистику ответов первого теста для сообщения администратору
+    """
+    answer_stats = storage.get_answer_stats(user_id)
+    if answer_stats is None:
+        logging.warning(f"Не найдена статистика ответов для пользователя {user_id}")
+        return ""
+
+    # Формируем статистику в нужном формате
+    stats_text = ""
+    for answer_type, count, percentage in phase_shares(answer_stats):
+        stats_text += f"{answer_type}) {count} ({percentage:.0f}%)\n"
+
+    logging.info(f"Сформированная статистика для сообщения: {stats_text}")
+    return stats_text
 
 async def finish_test(update: Update, context: CallbackContext) -> int:
     """
@@ -1093,28 +860,23 @@ async def finish_test(update: Update, context: CallbackContext) -> int:
     """
     try:
         user_id = update.message.from_user.id
-        language = get_user_language(user_id)
+        language = storage.get_user_language(user_id)
         
-        # Загружаем прогресс пользователя
-        progress = load_user_progress(user_id)
-        answers = progress.get("answers", [])
-        answer_stats = progress.get("answer_stats", {"1": 0, "2": 0, "3": 0, "4": 0})
+        # Восстанавливаем ответы пользователя из журнала ответов
+        answers, answer_stats = await db_executor.write(storage.get_answer_state, user_id)
         
         # Сохраняем результаты теста в базу данных
         username = update.message.from_user.username or ""
         first_name = update.message.from_user.first_name or ""
-        save_test_results(user_id, username, first_name, answers, answer_stats)
+        # Дожидаемся записи: результаты понадобятся сразу после второго теста
+        await asyncio.wrap_future(save_test_results(user_id, username, first_name, answers))
         logging.info(f"Сохранены результаты теста для пользователя {user_id} в базу данных")
         
-        # Сохраняем статистику ответов для использования после прохождения второго теста
-        save_user_progress(user_id, {
-            "current_question": len(answers),
-            "answers": answers,
-            "answer_stats": answer_stats
-        })
+        # Ответы и статистика уже в результатах теста, в прогрессе остается только номер вопроса
+        await db_executor.write(save_user_progress, user_id, {"current_question": len(answers)})
         
         # Используем локализованную строку для сообщения о втором тесте
-        results_message = get_text("first_test_completed", language)
+        results_message = escape_markdown_v2(get_text("first_test_completed", language), trusted=True)
         
         # Отправляем сообщение с результатами пользователю
         await update.message.reply_text(
@@ -1139,7 +901,7 @@ async def handle_second_test_results(update: Update, context: CallbackContext) -
     Обрабатывает результаты второго теста (скриншот)
     """
     user_id = update.message.from_user.id
-    language = get_user_language(user_id)
+    language = storage.get_user_language(user_id)
     
     logging.info(f"Получен результат второго теста от пользователя {user_id}")
     
@@ -1152,47 +914,31 @@ async def handle_second_test_results(update: Update, context: CallbackContext) -
         logging.info(f"Пользователь {user_id} отправил фото или документ")
         
         try:
-            # Создаем директорию для скриншотов, если она не существует
-            os.makedirs("data/screenshots", exist_ok=True)
-            
-            # Сохраняем скриншот
-            file_path = ""
+            is_document = not update.message.photo
             if update.message.photo:
-                # Получаем фото с наилучшим качеством
+                # Получаем фото с наилучшим качеством (фото Telegram всегда в JPEG)
                 photo = update.message.photo[-1]
                 file_id = photo.file_id
-                
-                # Скачиваем фото
-                file = await context.bot.get_file(file_id)
-                # Используем нашу новую функцию для получения абсолютного пути
-                relative_path = f"data/screenshots/{user_id}_{int(time.time())}.jpg"
-                file_path = get_absolute_path(relative_path)
-                await file.download_to_drive(file_path)
-                
-                logging.info(f"Сохранен скриншот от пользователя {user_id}: {file_path}")
+                mime_type = "image/jpeg"
+                file_size = photo.file_size
             else:
                 # Получаем документ
                 document = update.message.document
                 file_id = document.file_id
-                
-                # Проверяем, что это изображение
-                mime_type = document.mime_type
-                if not mime_type or not mime_type.startswith("image/"):
-                    logging.info(f"Пользователь {user_id} отправил документ, который не является изображением")
-                    await update.message.reply_text(
-                        escape_markdown_v2(get_text("not_image", language)),
-                        parse_mode=ParseMode.MARKDOWN_V2
-                    )
-                    return WAITING_FOR_SECOND_TEST
-                
-                # Скачиваем документ
-                file = await context.bot.get_file(file_id)
-                # Используем нашу новую функцию для получения абсолютного пути
-                relative_path = f"data/screenshots/{user_id}_{int(time.time())}.jpg"
-                file_path = get_absolute_path(relative_path)
-                await file.download_to_drive(file_path)
-                
-                logging.info(f"Сохранен скриншот от пользователя {user_id}: {file_path}")
+                mime_type = document.mime_type or ""
+                file_size = document.file_size
+            
+            # Проверяем заявленные тип и размер файла до загрузки
+            try:
+                check_declared(mime_type, file_size, MAX_SCREENSHOT_BYTES)
+                if is_document:
+                    await check_document_content(context.bot, file_id)
+            except ImageRejected as e:
+                await reply_screenshot_rejected(update, language, e)
+                return WAITING_FOR_SECOND_TEST
+            
+            # Сохраняем скриншот на диск в фоне (если включено)
+            schedule_screenshot_archive(context, user_id, file_id)
             
             # Обновляем статус теста
             try:
@@ -1204,7 +950,7 @@ async def handle_second_test_results(update: Update, context: CallbackContext) -
             # Отправляем сообщение пользователю сразу
             try:
                 logging.info(f"Отправляем сообщение пользователю {user_id}")
-                message_text = format_test_results_message(user_id, language)
+                message_text = await db_executor.read(format_test_results_message, user_id, language)
                 await update.message.reply_text(
                     message_text,
                     parse_mode=ParseMode.HTML
@@ -1225,76 +971,7 @@ async def handle_second_test_results(update: Update, context: CallbackContext) -
                 admin_keyboard = InlineKeyboardMarkup(keyboard)
                 
                 # Получаем статистику ответов пользователя
-                conn = get_db_connection()
-                cursor = conn.cursor()
-                cursor.execute("SELECT answers, answer_stats FROM test_results WHERE user_id = ?", (user_id,))
-                result = cursor.fetchone()
-                conn.close()
-                
-                # Логируем полученные данные из базы данных
-                logging.info(f"SQL-запрос: SELECT answers, answer_stats FROM test_results WHERE user_id = {user_id}")
-                logging.info(f"Результат SQL-запроса для пользователя {user_id}: {result}")
-                
-                stats_text = ""
-                if result:
-                    logging.info(f"Результат найден для пользователя {user_id}")
-                    answer_stats = json.loads(result[1])
-                    
-                    # Проверяем, что все ответы учтены в статистике
-                    answers = json.loads(result[0])
-                    logging.info(f"Ответы пользователя {user_id}: {answers}")
-                    logging.info(f"Статистика ответов до проверки: {answer_stats}")
-                    
-                    # Убеждаемся, что каждый ответ учтен в статистике
-                    for answer in answers:
-                        if answer not in answer_stats:
-                            answer_stats[answer] = 0
-                        
-                    # Проверяем, что сумма значений в статистике равна количеству ответов
-                    total_answers = sum(answer_stats.values())
-                    if total_answers != len(answers):
-                        logging.warning(f"Количество ответов в статистике ({total_answers}) не соответствует количеству ответов пользователя ({len(answers)})")
-                        
-                        # Пересчитываем статистику на основе ответов
-                        answer_stats = {"1": 0, "2": 0, "3": 0, "4": 0}
-                        for answer in answers:
-                            # Убеждаемся, что ответ - это строка, содержащая только цифру
-                            if isinstance(answer, str) and answer.isdigit() and answer in answer_stats:
-                                answer_stats[answer] += 1
-                            elif isinstance(answer, int) or (isinstance(answer, str) and answer.isdigit()):
-                                # Преобразуем числовой ответ в строковый ключ
-                                answer_key = str(answer)
-                                if answer_key in answer_stats:
-                                    answer_stats[answer_key] += 1
-                                else:
-                                    logging.warning(f"Неизвестный тип ответа: {answer}")
-                            else:
-                                logging.warning(f"Неизвестный формат ответа: {answer}, тип: {type(answer)}")
-                        
-                        logging.info(f"Статистика ответов после пересчета: {answer_stats}")
-                        
-                        # Обновляем статистику в базе данных
-                        conn = get_db_connection()
-                        cursor = conn.cursor()
-                        cursor.execute(
-                            "UPDATE test_results SET answer_stats = ? WHERE user_id = ?",
-                            (json.dumps(answer_stats), user_id)
-                        )
-                        conn.commit()
-                        conn.close()
-                    
-                    total_answers = sum(answer_stats.values())
-                    
-                    # Формируем статистику в нужном формате
-                    for answer_type in sorted(answer_stats.keys()):
-                        count = answer_stats[answer_type]
-                        percentage = (count / total_answers) * 100 if total_answers > 0 else 0
-                        stats_text += f"{answer_type}) {count} ({percentage:.0f}%)\n"
-                        
-                    # Логируем сформированную статистику    
-                    logging.info(f"Сформированная статистика для сообщения: {stats_text}")
-                else:
-                    logging.warning(f"Не найдены данные в таблице test_results для пользователя {user_id}")
+                stats_text = await db_executor.read(get_first_test_stats_text, user_id)
                 
                 # Создаем сообщение для администратора
                 admin_message = f"📊 Новые результаты тестов!\n\nПользователь: {first_name} (@{username})\nID: {user_id}\n\nРезультаты первого теста:\n{stats_text}"
@@ -1303,7 +980,8 @@ async def handle_second_test_results(update: Update, context: CallbackContext) -
                 await send_admin_notification(
                     context=context,
                     message_text=admin_message,
-                    photo_path=file_path,
+                    file_id=file_id,
+                    is_document=is_document,
                     reply_markup=admin_keyboard
                 )
                 
@@ -1327,7 +1005,7 @@ async def handle_photo(update: Update, context: CallbackContext) -> None:
     Обрабатывает фотографии, отправленные пользователем
     """
     user_id = update.message.from_user.id
-    language = get_user_language(user_id)
+    language = storage.get_user_language(user_id)
     
     logging.info(f"Получена фотография от пользователя {user_id}")
     
@@ -1335,29 +1013,27 @@ async def handle_photo(update: Update, context: CallbackContext) -> None:
     username = update.message.from_user.username or ""
     first_name = update.message.from_user.first_name or ""
     
-    # Создаем директорию для скриншотов, если она не существует
-    os.makedirs("data/screenshots", exist_ok=True)
-    
     # Получаем фото с наилучшим качеством
     photo = update.message.photo[-1]
     file_id = photo.file_id
     
-    # Скачиваем фото
+    # Проверяем заявленный размер фото до загрузки
     try:
-        file = await context.bot.get_file(file_id)
-        # Используем нашу новую функцию для получения абсолютного пути
-        relative_path = f"data/screenshots/{user_id}_{int(time.time())}.jpg"
-        file_path = get_absolute_path(relative_path)
-        await file.download_to_drive(file_path)
-        
-        logging.info(f"Сохранен скриншот от пользователя {user_id}: {file_path}")
+        check_declared("image/jpeg", photo.file_size, MAX_SCREENSHOT_BYTES)
+    except ImageRejected as e:
+        await reply_screenshot_rejected(update, language, e)
+        return WAITING_FOR_SECOND_TEST
+    
+    try:
+        # Сохраняем скриншот на диск в фоне (если включено)
+        schedule_screenshot_archive(context, user_id, file_id)
         
         # Обновляем статус теста
         update_test_status(user_id, "completed")
         logging.info(f"Обновлен статус теста для пользователя {user_id}: completed")
         
         # Отправляем сообщение пользователю
-        message_text = format_test_results_message(user_id, language)
+        message_text = await db_executor.read(format_test_results_message, user_id, language)
         await update.message.reply_text(
             message_text,
             parse_mode=ParseMode.HTML
@@ -1376,78 +1052,8 @@ async def handle_photo(update: Update, context: CallbackContext) -> None:
             admin_keyboard = InlineKeyboardMarkup(keyboard)
             
             # Получаем статистику ответов пользователя
-            conn = get_db_connection()
-            cursor = conn.cursor()
-            cursor.execute("SELECT answers, answer_stats FROM test_results WHERE user_id = ?", (user_id,))
-            result = cursor.fetchone()
-            conn.close()
+            stats_text = await db_executor.read(get_first_test_stats_text, user_id)
             
-            # Логируем полученные данные из базы данных
-            logging.info(f"SQL-запрос в handle_photo: SELECT answers, answer_stats FROM test_results WHERE user_id = {user_id}")
-            logging.info(f"Результат SQL-запроса в handle_photo для пользователя {user_id}: {result}")
-            
-            stats_text = ""
-            if result:
-                logging.info(f"Результат в handle_photo найден для пользователя {user_id}")
-                answer_stats = json.loads(result[1])
-                
-                # Проверяем, что все ответы учтены в статистике
-                answers = json.loads(result[0])
-                logging.info(f"Ответы пользователя {user_id}: {answers}")
-                logging.info(f"Статистика ответов до проверки: {answer_stats}")
-                
-                # Убеждаемся, что каждый ответ учтен в статистике
-                for answer in answers:
-                    if answer not in answer_stats:
-                        answer_stats[answer] = 0
-                    
-                # Проверяем, что сумма значений в статистике равна количеству ответов
-                total_answers = sum(answer_stats.values())
-                if total_answers != len(answers):
-                    logging.warning(f"Количество ответов в статистике ({total_answers}) не соответствует количеству ответов пользователя ({len(answers)})")
-                    
-                    # Пересчитываем статистику на основе ответов
-                    answer_stats = {"1": 0, "2": 0, "3": 0, "4": 0}
-                    for answer in answers:
-                        # Убеждаемся, что ответ - это строка, содержащая только цифру
-                        if isinstance(answer, str) and answer.isdigit() and answer in answer_stats:
-                            answer_stats[answer] += 1
-                        elif isinstance(answer, int) or (isinstance(answer, str) and answer.isdigit()):
-                            # Преобразуем числовой ответ в строковый ключ
-                            answer_key = str(answer)
-                            if answer_key in answer_stats:
-                                answer_stats[answer_key] += 1
-                            else:
-                                logging.warning(f"Неизвестный тип ответа: {answer}")
-                        else:
-                            logging.warning(f"Неизвестный формат ответа: {answer}, тип: {type(answer)}")
-                    
-                    logging.info(f"Статистика ответов после пересчета: {answer_stats}")
-                    
-                    # Обновляем статистику в базе данных
-                    conn = get_db_connection()
-                    cursor = conn.cursor()
-                    cursor.execute(
-                        "UPDATE test_results SET answer_stats = ? WHERE user_id = ?",
-                        (json.dumps(answer_stats), user_id)
-                    )
-                    conn.commit()
-                    conn.close()
-                
-                total_answers = sum(answer_stats.values())
-                
-                # Формируем статистику в нужном формате
-                for answer_type in sorted(answer_stats.keys()):
-                    count = answer_stats[answer_type]
-                    percentage = (count / total_answers) * 100 if total_answers > 0 else 0
-                    stats_text += f"{answer_type}) {count} ({percentage:.0f}%)\n"
-                    
-                # Логируем сформированную статистику в handle_photo    
-                logging.info(f"Сформированная статистика в handle_photo для сообщения: {stats_text}")
-            else:
-                logging.warning(f"В handle_photo не найдены данные в таблице test_results для пользователя {user_id}")
-                logging.error(f"Невозможно сформировать статистику - ответы пользователя не найдены в базе данных")
-                
             # Создаем сообщение для администратора
             admin_message = f"📊 Новые результаты тестов!\n\nПользователь: {first_name} (@{username})\nID: {user_id}\n\nРезультаты первого теста:\n{stats_text}"
             
@@ -1455,7 +1061,7 @@ async def handle_photo(update: Update, context: CallbackContext) -> None:
             await send_admin_notification(
                 context=context,
                 message_text=admin_message,
-                photo_path=file_path,
+                file_id=file_id,
                 reply_markup=admin_keyboard
             )
                 
@@ -1476,7 +1082,7 @@ async def handle_document(update: Update, context: CallbackContext) -> None:
     Обрабатывает документы, отправленные пользователем
     """
     user_id = update.message.from_user.id
-    language = get_user_language(user_id)
+    language = storage.get_user_language(user_id)
     
     logging.info(f"Получен документ от пользователя {user_id}")
     
@@ -1484,38 +1090,27 @@ async def handle_document(update: Update, context: CallbackContext) -> None:
     username = update.message.from_user.username or ""
     first_name = update.message.from_user.first_name or ""
     
-    # Проверяем, что это изображение
+    # Проверяем заявленные тип и размер документа до загрузки
     document = update.message.document
-    mime_type = document.mime_type
-    
-    if not mime_type or not mime_type.startswith("image/"):
-        logging.info(f"Пользователь {user_id} отправил документ, который не является изображением")
-        await update.message.reply_text(
-            escape_markdown_v2(get_text("not_image", language)),
-            parse_mode=ParseMode.MARKDOWN_V2
-        )
+    try:
+        check_declared(document.mime_type or "", document.file_size, MAX_SCREENSHOT_BYTES)
+        await check_document_content(context.bot, document.file_id)
+    except ImageRejected as e:
+        await reply_screenshot_rejected(update, language, e)
         return WAITING_FOR_SECOND_TEST
     
-    # Создаем директорию для скриншотов, если она не существует
-    os.makedirs("data/screenshots", exist_ok=True)
-    
-    # Скачиваем документ
     try:
         file_id = document.file_id
-        file = await context.bot.get_file(file_id)
-        # Используем нашу новую функцию для получения абсолютного пути
-        relative_path = f"data/screenshots/{user_id}_{int(time.time())}.jpg"
-        file_path = get_absolute_path(relative_path)
-        await file.download_to_drive(file_path)
         
-        logging.info(f"Сохранен скриншот от пользователя {user_id}: {file_path}")
+        # Сохраняем скриншот на диск в фоне (если включено)
+        schedule_screenshot_archive(context, user_id, file_id)
         
         # Обновляем статус теста
         update_test_status(user_id, "completed")
         logging.info(f"Обновлен статус теста для пользователя {user_id}: completed")
         
         # Отправляем сообщение пользователю
-        message_text = format_test_results_message(user_id, language)
+        message_text = await db_executor.read(format_test_results_message, user_id, language)
         await update.message.reply_text(
             message_text,
             parse_mode=ParseMode.HTML
@@ -1534,78 +1129,8 @@ async def handle_document(update: Update, context: CallbackContext) -> None:
             admin_keyboard = InlineKeyboardMarkup(keyboard)
             
             # Получаем статистику ответов пользователя
-            conn = get_db_connection()
-            cursor = conn.cursor()
-            cursor.execute("SELECT answers, answer_stats FROM test_results WHERE user_id = ?", (user_id,))
-            result = cursor.fetchone()
-            conn.close()
-            
-            # Логируем полученные данные из базы данных
-            logging.info(f"SQL-запрос в handle_document: SELECT answers, answer_stats FROM test_results WHERE user_id = {user_id}")
-            logging.info(f"Результат SQL-запроса в handle_document для пользователя {user_id}: {result}")
+            stats_text = await db_executor.read(get_first_test_stats_text, user_id)
             
-            stats_text = ""
-            if result:
-                logging.info(f"Результат в handle_document найден для пользователя {user_id}")
-                answer_stats = json.loads(result[1])
-                
-                # Проверяем, что все ответы учтены в статистике
-                answers = json.loads(result[0])
-                logging.info(f"Ответы пользователя {user_id}: {answers}")
-                logging.info(f"Статистика ответов до проверки: {answer_stats}")
-                
-                # Убеждаемся, что каждый ответ учтен в статистике
-                for answer in answers:
-                    if answer not in answer_stats:
-                        answer_stats[answer] = 0
-                    
-                # Проверяем, что сумма значений в статистике равна количеству ответов
-                total_answers = sum(answer_stats.values())
-                if total_answers != len(answers):
-                    logging.warning(f"Количество ответов в статистике ({total_answers}) не соответствует количеству ответов пользователя ({len(answers)})")
-                    
-                    # Пересчитываем статистику на основе ответов
-                    answer_stats = {"1": 0, "2": 0, "3": 0, "4": 0}
-                    for answer in answers:
-                        # Убеждаемся, что ответ - это строка, содержащая только цифру
-                        if isinstance(answer, str) and answer.isdigit() and answer in answer_stats:
-                            answer_stats[answer] += 1
-                        elif isinstance(answer, int) or (isinstance(answer, str) and answer.isdigit()):
-                            # Преобразуем числовой ответ в строковый ключ
-                            answer_key = str(answer)
-                            if answer_key in answer_stats:
-                                answer_stats[answer_key] += 1
-                            else:
-                                logging.warning(f"Неизвестный тип ответа: {answer}")
-                        else:
-                            logging.warning(f"Неизвестный формат ответа: {answer}, тип: {type(answer)}")
-                    
-                    logging.info(f"Статистика ответов после пересчета: {answer_stats}")
-                    
-                    # Обновляем статистику в базе данных
-                    conn = get_db_connection()
-                    cursor = conn.cursor()
-                    cursor.execute(
-                        "UPDATE test_results SET answer_stats = ? WHERE user_id = ?",
-                        (json.dumps(answer_stats), user_id)
-                    )
-                    conn.commit()
-                    conn.close()
-                
-                total_answers = sum(answer_stats.values())
-                
-                # Формируем статистику в нужном формате
-                for answer_type in sorted(answer_stats.keys()):
-                    count = answer_stats[answer_type]
-                    percentage = (count / total_answers) * 100 if total_answers > 0 else 0
-                    stats_text += f"{answer_type}) {count} ({percentage:.0f}%)\n"
-                
-                # Логируем сформированную статистику
-                logging.info(f"Сформированная статистика в handle_document для сообщения: {stats_text}")
-            else:
-                logging.warning(f"В handle_document не найдены данные в таблице test_results для пользователя {user_id}")
-                logging.error(f"Невозможно сформировать статистику - ответы пользователя не найдены в базе данных")
-                
             # Создаем сообщение для администратора
             admin_message = f"📊 Новые результаты тестов!\n\nПользователь: {first_name} (@{username})\nID: {user_id}\n\nРезультаты первого теста:\n{stats_text}"
             
@@ -1613,7 +1138,8 @@ async def handle_document(update: Update, context: CallbackContext) -> None:
             await send_admin_notification(
                 context=context,
                 message_text=admin_message,
-                photo_path=file_path,
+                file_id=file_id,
+                is_document=True,
                 reply_markup=admin_keyboard
             )
                 
@@ -1652,17 +1178,19 @@ async def handle_admin_callback(update: Update, context: CallbackContext) -> Non
     user_id = int(user_id_str)
     
     # Получаем язык пользователя
-    language = get_user_language(user_id)
+    language = storage.get_user_language(user_id)
     logging.info(f"Язык пользователя {user_id}: {language}")
     
     # Определяем сообщение в зависимости от действия и языка пользователя
     if action == "accept":
         # Принимаем пользователя
-        message = get_text("accepted_to_program", language).format(calendly_link=escape_markdown_v2(CALENDLY_LINK))
+        message = escape_markdown_v2(
+            get_text("accepted_to_program", language, calendly_link=escape_markdown_v2(CALENDLY_LINK)), trusted=True
+        )
         user_message = f"✅ Пользователь {user_id} принят в программу"
     else:
         # Отклоняем пользователя
-        message = get_text("rejected_from_program", language)
+        message = escape_markdown_v2(get_text("rejected_from_program", language), trusted=True)
         user_message = f"❌ Пользователю {user_id} отказано в участии"
     
     # Отправляем сообщение пользователю
@@ -1670,7 +1198,8 @@ async def handle_admin_callback(update: Update, context: CallbackContext) -> Non
         await context.bot.send_message(
             chat_id=user_id,
             text=message,
-            parse_mode=ParseMode.MARKDOWN_V2
+            parse_mode=ParseMode.MARKDOWN_V2,
+            rate_limit_args=PRIORITY_CRITICAL
         )
         
         # Удаляем кнопки из сообщения администратора
@@ -1725,7 +1254,7 @@ async def handle_language_callback(update: Update, context: CallbackContext) ->
     
     try:
         # Сохраняем выбранный язык
-        save_user_language(user_id, language)
+        storage.save_user_language(user_id, language)
         logging.info(f"Сохранен язык пользователя {user_id}: {language}")
         
         # Отправляем сообщение о выбранном языке
@@ -1735,7 +1264,7 @@ async def handle_language_callback(update: Update, context: CallbackContext) ->
         logging.info(f"Отправлено сообщение о выбранном языке")
         
         # Отправляем приветственное сообщение
-        welcome_message = get_text("welcome", language)
+        welcome_message = escape_markdown_v2(get_text("welcome", language), trusted=True)
         logging.info(f"Подготовлено приветственное сообщение")
         
         # Отправляем приветственное сообщение
@@ -1755,7 +1284,7 @@ async def handle_language_callback(update: Update, context: CallbackContext) ->
         
         # Отправляем сообщение о необходимости пройти тест
         await query.message.reply_text(
-            get_text("test_intro", language),
+            escape_markdown_v2(get_text("test_intro", language), trusted=True),
             reply_markup=reply_markup,
             parse_mode=ParseMode.MARKDOWN_V2
         )
@@ -1779,7 +1308,7 @@ async def handle_choice_callback(update: Update, context: CallbackContext) -> in
     
     user_id = query.from_user.id
     callback_data = query.data
-    language = get_user_language(user_id)
+    language = storage.get_user_language(user_id)
     
     logging.info(f"Получен выбор от пользователя {user_id}: {callback_data}")
     
@@ -1787,53 +1316,40 @@ async def handle_choice_callback(update: Update, context: CallbackContext) -> in
         # Пользователь выбрал "Пройти тест"
         logging.info(f"Пользователь выбрал 'Пройти тест'")
         
-        # Удаляем предыдущее сообщение с кнопками
-        try:
-            await query.edit_message_reply_markup(reply_markup=None)
-        except Exception as e:
-            logging.warning(f"Не удалось удалить кнопки: {e}")
-        
         # Очищаем прогресс пользователя перед началом теста
-        clear_user_progress(user_id)
+        await db_executor.write(clear_user_progress, user_id)
+        attempt_id = await db_executor.write(storage.start_attempt, user_id)
         
         # Загружаем первый вопрос
         current_question = 0
-        questions = get_questions_by_language(language)
-        question = questions[current_question]
+        progress = {"current_question": current_question, "attempt_id": attempt_id}
         
-        # Форматируем вопрос и получаем маппинг ответов
-        formatted_text, letter_to_number, keyboard_letters, shuffled_options = format_question_with_options(
-            question, 
-            current_question, 
-            user_id=user_id
-        )
+        if SINGLE_MESSAGE_FLOW:
+            # Первый вопрос показываем вместо сообщения с предложением пройти тест
+            await db_executor.write(save_user_progress, user_id, progress)
+            await show_question_in_place(query, user_id, progress, current_question, language)
+            return ANSWERING_QUESTIONS
         
-        # Создаем инлайн-клавиатуру с вариантами ответов по 2 в ряд
-        keyboard = []
-        for i in range(0, len(keyboard_letters), 2):
-            row = []
-            for j in range(i, min(i+2, len(keyboard_letters))):
-                letter = keyboard_letters[j]
-                row.append(InlineKeyboardButton(letter, callback_data=f"answer_{letter}"))
-            keyboard.append(row)
+        # Удаляем предыдущее сообщение с кнопками
+        try:
+            await query.edit_message_reply_markup(reply_markup=None)
+        except Exception as e:
+            logging.warning(f"Не удалось удалить кнопки: {e}")
+        
+        # Форматируем вопрос в случайном порядке вариантов
+        formatted_text = format_question_with_options(current_question, question_permutation(user_id, progress, current_question), language=language)
         
         # Отправляем первый вопрос
         message = await query.message.reply_text(
             formatted_text,
             parse_mode=ParseMode.MARKDOWN_V2,
-            reply_markup=InlineKeyboardMarkup(keyboard)
+            reply_markup=question_keyboard(language),
+            rate_limit_args=PRIORITY_HIGH
         )
         
-        # Сохраняем начальное состояние с маппингом и ID сообщения с первым вопросом
-        save_user_progress(user_id, {
-            "current_question": 0,
-            "answers": [],
-            "answer_stats": {"1": 0, "2": 0, "3": 0, "4": 0},
-            "current_mapping": letter_to_number,
-            "shuffled_options": shuffled_options,
-            "question_options": {"0": shuffled_options},  # Сохраняем порядок вариантов для первого вопроса
-            "previous_question_message_id": {"0": message.message_id}  # Сохраняем ID сообщения с первым вопросом
-        })
+        # Сохраняем начальное состояние с номером попытки и ID сообщения с первым вопросом
+        progress["previous_question_message_id"] = {"0": message.message_id}
+        await db_executor.write(save_user_progress, user_id, progress)
         
         return ANSWERING_QUESTIONS
     
@@ -1859,74 +1375,89 @@ async def finish_test_inline(update: Update, context: CallbackContext) -> int:
     """
     query = update.callback_query
     user_id = query.from_user.id
-    language = get_user_language(user_id)
+    language = storage.get_user_language(user_id)
     
-    # Загружаем прогресс пользователя
-    progress = load_user_progress(user_id)
-    answers = progress.get("answers", [])
-    answer_stats = progress.get("answer_stats", {"1": 0, "2": 0, "3": 0, "4": 0})
+    # Восстанавливаем ответы пользователя из журнала ответов
+    answers, answer_stats = await db_executor.write(storage.get_answer_state, user_id)
     
     # Сохраняем результаты теста в базу данных
     username = query.from_user.username or ""
     first_name = query.from_user.first_name or ""
-    save_test_results(user_id, username, first_name, answers, answer_stats)
-    logging.info(f"Сохранены результаты теста для пользователя {user_id} в базу данных")
+    try:
+        # Дожидаемся записи: результаты понадобятся сразу после второго теста
+        await asyncio.wrap_future(save_test_results(user_id, username, first_name, answers))
+        logging.info(f"Сохранены результаты теста для пользователя {user_id} в базу данных")
+    except Exception as e:
+        logging.error(f"Ошибка при сохранении результатов теста в базу данных: {e}")
     
-    # Сохраняем статистику ответов для использования после прохождения второго теста
-    save_user_progress(user_id, {
-        "current_question": len(answers),
-        "answers": answers,
-        "answer_stats": answer_stats
-    })
+    # Ответы и статистика уже в результатах теста, в прогрессе остается только номер вопроса
+    await db_executor.write(save_user_progress, user_id, {"current_question": len(answers)})
     
     # Используем локализованную строку для сообщения о втором тесте
-    results_message = get_text("first_test_completed", language)
+    results_message = escape_markdown_v2(get_text("first_test_completed", language), trusted=True)
     
     # Отправляем сообщение с результатами пользователю
-    await query.message.reply_text(
-        results_message,
-        parse_mode=ParseMode.MARKDOWN_V2,
-        disable_web_page_preview=True
-    )
+    if SINGLE_MESSAGE_FLOW:
+        await query.edit_message_text(
+            results_message,
+            parse_mode=ParseMode.MARKDOWN_V2,
+            disable_web_page_preview=True
+        )
+    else:
+        await query.message.reply_text(
+            results_message,
+            parse_mode=ParseMode.MARKDOWN_V2,
+            disable_web_page_preview=True
+        )
     
     # Обновляем статус теста
     update_test_status(user_id, "completed_first_test")
     
     return WAITING_FOR_SECOND_TEST
 
-async def send_admin_notification(context, message_text, photo_path=None, reply_markup=None):
+async def send_admin_notification(context, message_text, file_id=None, is_document=False, reply_markup=None):
     """
     Надежная функция для отправки уведомлений администратору.
-    Пытается отправить сообщение различными способами в зависимости от доступности файла и других факторов.
+    Скриншот пересылается по file_id исходного сообщения: Telegram отправляет уже
+    загруженный файл, и бот не скачивает и не загружает его заново.
     
     Args:
         context: Контекст для доступа к методам бота
         message_text: Текст сообщения для администратора
-        photo_path: Путь к фото для отправки (опционально)
+        file_id: file_id скриншота для отправки (опционально)
+        is_document: Скриншот отправлен документом (такой file_id отправляется через send_document)
         reply_markup: Разметка для инлайн-клавиатуры (опционально)
     """
     # Логируем детали отправки
     logging.info(f"Попытка отправки уведомления администратору (ID: {ADMIN_ID})")
     logging.info(f"Текст сообщения: {message_text}")
-    logging.info(f"Путь к фото: {photo_path}")
+    logging.info(f"file_id скриншота: {file_id}")
     
     try:
-        # Пытаемся отправить фото с текстом, если путь к фото указан и файл существует
-        if photo_path and os.path.exists(photo_path):
-            logging.info(f"Файл {photo_path} существует. Отправляем фото с текстом администратору.")
+        # Пытаемся отправить скриншот с текстом, если он есть
+        if file_id:
             try:
-                with open(photo_path, "rb") as photo_file:
+                if is_document:
+                    await context.bot.send_document(
+                        chat_id=ADMIN_ID,
+                        document=file_id,
+                        caption=message_text,
+                        reply_markup=reply_markup,
+                        rate_limit_args=PRIORITY_LOW
+                    )
+                else:
                     await context.bot.send_photo(
                         chat_id=ADMIN_ID,
-                        photo=photo_file,
+                        photo=file_id,
                         caption=message_text,
-                        reply_markup=reply_markup
+                        reply_markup=reply_markup,
+                        rate_limit_args=PRIORITY_LOW
                     )
-                logging.info(f"Успешно отправлено фото с текстом администратору.")
+                logging.info(f"Успешно отправлен скриншот с текстом администратору.")
                 return True
             except Exception as e:
-                logging.error(f"Ошибка при отправке фото администратору: {e}")
-                # Если не удалось отправить фото, пробуем отправить обычное сообщение
+                logging.error(f"Ошибка при отправке скриншота администратору: {e}")
+                # Если не удалось отправить скриншот, пробуем отправить обычное сообщение
         
         # Отправляем только текстовое сообщение с разметкой
         logging.info("Отправляем только текстовое сообщение администратору.")
@@ -1934,7 +1465,8 @@ async def send_admin_notification(context, message_text, photo_path=None, reply_
             await context.bot.send_message(
                 chat_id=ADMIN_ID,
                 text=message_text,
-                reply_markup=reply_markup
+                reply_markup=reply_markup,
+                rate_limit_args=PRIORITY_LOW
             )
             logging.info("Успешно отправлено текстовое сообщение администратору.")
             return True
@@ -1945,7 +1477,8 @@ async def send_admin_notification(context, message_text, photo_path=None, reply_
             try:
                 await context.bot.send_message(
                     chat_id=ADMIN_ID,
-                    text=message_text
+                    text=message_text,
+                    rate_limit_args=PRIORITY_LOW
                 )
                 logging.info("Успешно отправлено простое текстовое сообщение администратору.")
                 return True
@@ -1956,6 +1489,129 @@ async def send_admin_notification(context, message_text, photo_path=None, reply_
         logging.error(f"Критическая ошибка при отправке уведомления администратору: {e}")
         return False
 
+async def reply_screenshot_rejected(update: Update, language: str, rejection: ImageRejected) -> None:
+    """
+    Сообщает пользователю, что скриншот отклонен (не изображение или слишком большой)
+    """
+    logging.info(f"Скриншот пользователя {update.message.from_user.id} отклонен: {rejection}")
+    if rejection.reason == REJECT_TOO_LARGE:
+        text = get_text("file_too_large", language, max_mb=f"{MAX_SCREENSHOT_MB:g}")
+    else:
+        text = get_text("not_image", language)
+    await update.message.reply_text(
+        escape_markdown_v2(text),
+        parse_mode=ParseMode.MARKDOWN_V2
+    )
+
+# Клиент для загрузки скриншотов: один на процесс, чтобы соединения с сервером файлов
+# переиспользовались (создается при первой загрузке в цикле событий бота)
+download_client: Optional[httpx.AsyncClient] = None
+
+def get_download_client() -> httpx.AsyncClient:
+    """
+    Возвращает общий клиент для загрузки файлов с теми же таймаутами, что и у запросов бота
+    (прокси, как и у бота, берется из переменных окружения)
+    """
+    global download_client
+    if download_client is None:
+        download_client = httpx.AsyncClient(timeout=httpx.Timeout(REQUEST_TIMEOUT))
+    return download_client
+
+async def close_download_client(application: Optional[Application] = None) -> None:
+    """
+    Закрывает общий клиент для загрузки файлов
+    """
+    global download_client
+    if download_client is not None:
+        await download_client.aclose()
+        download_client = None
+
+async def check_document_content(bot, file_id: str) -> None:
+    """
+    Проверяет по первым байтам, что документ действительно изображение (загружаются
+    только первые байты файла). Фото не проверяются: Telegram сам пережимает их в JPEG.
+    Если файл не удалось загрузить, проверка пропускается (заявленные тип и размер уже проверены).
+
+    Raises:
+        ImageRejected: Содержимое файла не является изображением
+    """
+    try:
+        file = await bot.get_file(file_id)
+        async with get_download_client().stream("GET", file.file_path) as response:
+            response.raise_for_status()
+            await sniff_image(response.aiter_bytes())
+    except ImageRejected:
+        raise
+    except Exception as e:
+        metrics.inc("screenshot_sniff_errors")
+        logging.warning(f"Не удалось проверить содержимое документа {file_id}: {e}")
+
+async def archive_screenshot(bot, user_id: int, file_id: str) -> None:
+    """
+    Скачивает скриншот и сохраняет его в хранилище скриншотов (выполняется в фоне).
+    Тип файла определяется по его первым байтам, а загрузка прерывается, как только
+    выясняется, что это не изображение или размер больше MAX_SCREENSHOT_BYTES.
+    """
+    try:
+        file = await bot.get_file(file_id)
+        check_declared(None, file.file_size, MAX_SCREENSHOT_BYTES)
+        async with get_download_client().stream("GET", file.file_path) as response:
+            response.raise_for_status()
+            data, mime_type = await read_image(response.aiter_bytes(), MAX_SCREENSHOT_BYTES)
+        # Запись на диск и очистка хранилища - вне цикла событий
+        digest, path, created = await asyncio.to_thread(screenshot_store.put, data, mime_type)
+        metrics.inc("screenshots_archived")
+        logging.info(f"Сохранен скриншот от пользователя {user_id}: {path} (sha256 {digest}{'' if created else ', уже был сохранен'})")
+    except ImageRejected as e:
+        logging.warning(f"Скриншот пользователя {user_id} не сохранен: {e}")
+    except Exception as e:
+        metrics.inc("screenshot_archive_errors")
+        logging.error(f"Ошибка при сохранении скриншота пользователя {user_id}: {e}")
+
+def schedule_screenshot_archive(context, user_id: int, file_id: str) -> None:
+    """
+    Ставит сохранение скриншота на диск в фон, если оно включено (ARCHIVE_SCREENSHOTS):
+    ни пользователь, ни администратор не ждут загрузки файла
+    """
+    if ARCHIVE_SCREENSHOTS:
+        context.application.create_task(archive_screenshot(context.bot, user_id, file_id))
+
+async def run_webhook(application: Application) -> None:
+    """
+    Запускает бота в режиме вебхука: обновления принимает встроенный HTTP-сервер
+    и ставит в очередь приложения. Работает до SIGINT/SIGTERM.
+    """
+    if not WEBHOOK_SECRET:
+        raise ValueError("Для режима webhook нужно задать WEBHOOK_SECRET")
+
+    async def handle_update(data: Dict[str, Any]) -> None:
+        await application.update_queue.put(Update.de_json(data, application.bot))
+
+    server = WebhookServer(handle_update, WEBHOOK_SECRET, WEBHOOK_HOST, WEBHOOK_PORT, WEBHOOK_PATH)
+
+    stop_event = asyncio.Event()
+    loop = asyncio.get_running_loop()
+    for sig in (signal.SIGINT, signal.SIGTERM):
+        loop.add_signal_handler(sig, stop_event.set)
+
+    async with application:
+        if WEBHOOK_URL:
+            # Несколько процессов за балансировщиком регистрируют один и тот же адрес, это безопасно
+            await application.bot.set_webhook(
+                url=WEBHOOK_URL,
+                secret_token=WEBHOOK_SECRET,
+                allowed_updates=Update.ALL_TYPES,
+            )
+            logging.info(f"Вебхук зарегистрирован: {WEBHOOK_URL}")
+        await application.start()
+        await server.start()
+        try:
+            await stop_event.wait()
+        finally:
+            await server.stop()
+            await application.stop()
+            await close_download_client()
+
 def main() -> None:
     """
     Основная функция для запуска бота
@@ -1968,8 +1624,13 @@ def main() -> None:
         #     logging.error("Бот уже запущен. Завершение работы.")
         #     return
         
-        # Инициализируем базу данных
-        init_database()
+        # Открываем хранилище: соединения с базами, миграции, языки пользователей, журнал прогресса
+        storage.open()
+        if ARCHIVE_SCREENSHOTS:
+            screenshot_store.open()
+
+        # Компилируем тексты всех языков (отсутствующие тексты сообщаются сразу при запуске)
+        load_locales()
         
         # Логируем переменные окружения
         logging.info(f"ADMIN_ID: {ADMIN_ID}")
@@ -1980,12 +1641,23 @@ def main() -> None:
         application = (
             Application.builder()
             .token(TELEGRAM_BOT_TOKEN)
-            .connect_timeout(30.0)  # Увеличиваем таймаут соединения до 30 секунд
-            .read_timeout(30.0)     # Увеличиваем таймаут чтения до 30 секунд
-            .write_timeout(30.0)    # Увеличиваем таймаут записи до 30 секунд
-            .get_updates_read_timeout(30.0)  # Устанавливаем таймаут для getUpdates
-            .get_updates_write_timeout(30.0) # Устанавливаем таймаут для getUpdates
-            .get_updates_connect_timeout(30.0) # Устанавливаем таймаут для getUpdates
+            .connect_timeout(REQUEST_TIMEOUT)  # Увеличиваем таймаут соединения до 30 секунд
+            .read_timeout(REQUEST_TIMEOUT)     # Увеличиваем таймаут чтения до 30 секунд
+            .write_timeout(REQUEST_TIMEOUT)    # Увеличиваем таймаут записи до 30 секунд
+            .get_updates_read_timeout(REQUEST_TIMEOUT)  # Устанавливаем таймаут для getUpdates
+            .get_updates_write_timeout(REQUEST_TIMEOUT) # Устанавливаем таймаут для getUpdates
+            .get_updates_connect_timeout(REQUEST_TIMEOUT) # Устанавливаем таймаут для getUpdates
+            # Закрываем клиент загрузки скриншотов при остановке бота (режим polling)
+            .post_shutdown(close_download_client)
+            # Все исходящие запросы проходят через очередь с ограничениями Telegram и приоритетами
+            .rate_limiter(PriorityRateLimiter(SendScheduler(
+                global_rate=SEND_RATE_GLOBAL,
+                global_burst=SEND_RATE_GLOBAL,
+                chat_rate=SEND_RATE_PER_CHAT,
+                chat_burst=SEND_CHAT_BURST,
+            )))
+            # Обновления разных пользователей обрабатываются параллельно, одного - по очереди
+            .concurrent_updates(PerUserUpdateProcessor(max(1, CONCURRENT_UPDATES)))
             .build()
         )
 
@@ -2015,6 +1687,7 @@ def main() -> None:
         application.add_handler(conv_handler)
         application.add_handler(CommandHandler("respond", handle_admin_response))
         application.add_handler(CommandHandler("test", test_message))
+        application.add_handler(CommandHandler("metrics", show_metrics))
         
         # Добавляем обработчик для инлайн-кнопок администратора
         application.add_handler(CallbackQueryHandler(handle_admin_callback, pattern=r"^(accept|reject)_\d+$"))
@@ -2057,11 +1730,21 @@ def main() -> None:
         application.add_handler(MessageHandler(filters.Document.IMAGE, handle_document))
         
         # Запускаем бота
-        application.run_polling(allowed_updates=Update.ALL_TYPES)
+        if BOT_MODE == "webhook":
+            asyncio.run(run_webhook(application))
+        else:
+            if BOT_MODE != "polling":
+                logging.warning(f"Неизвестный режим BOT_MODE={BOT_MODE}, используется polling")
+            application.run_polling(allowed_updates=Update.ALL_TYPES)
         
         logging.info("Бот запущен")
     except Exception as e:
         logging.error(f"Ошибка при запуске бота: {e}")
+    finally:
+        # Сбрасываем несохраненный прогресс в базу
+        db_executor.shutdown()
+        storage.close()
+        screenshot_store.close()
 
 if __name__ == "__main__":
     lock_file = None
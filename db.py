@@ -0,0 +1,294 @@
+"""
+Модуль для работы с базами данных: пулы соединений и выполнение запросов вне цикла событий
+"""
+import asyncio
+import functools
+import logging
+import queue
+import sqlite3
+import threading
+import time
+from concurrent.futures import Future, ThreadPoolExecutor
+from contextlib import contextmanager
+from pathlib import Path
+from typing import Any, Callable, Iterator, List, Optional, Sequence, Tuple, Union
+
+import metrics
+
+# Настройки соединений по умолчанию
+DEFAULT_POOL_SIZE = 5
+DEFAULT_MMAP_SIZE = 64 * 1024 * 1024  # 64 МБ
+DEFAULT_BUSY_TIMEOUT = 5.0  # секунды
+DEFAULT_CACHED_STATEMENTS = 256
+
+class ConnectionPool:
+    """
+    Пул долгоживущих соединений с одной базой данных SQLite.
+
+    Соединения открываются один раз, сразу настраиваются (WAL, synchronous=NORMAL,
+    mmap, busy timeout) и переиспользуются вместе с кэшем подготовленных выражений.
+    Каждое соединение в каждый момент времени используется только одним потоком.
+    """
+
+    def __init__(
+        self,
+        path: Union[str, Path],
+        size: int = DEFAULT_POOL_SIZE,
+        mmap_size: int = DEFAULT_MMAP_SIZE,
+        busy_timeout: float = DEFAULT_BUSY_TIMEOUT,
+        cached_statements: int = DEFAULT_CACHED_STATEMENTS
+    ):
+        """
+        Args:
+            path: Путь к файлу базы данных
+            size: Количество соединений в пуле
+            mmap_size: Размер области памяти для чтения файла базы через mmap (в байтах)
+            busy_timeout: Сколько секунд ждать освобождения блокировки базы
+            cached_statements: Размер кэша подготовленных выражений для каждого соединения
+        """
+        self.path = Path(path)
+        self.size = size
+        self.mmap_size = mmap_size
+        self.busy_timeout = busy_timeout
+        self.cached_statements = cached_statements
+        self._queue: "queue.Queue[sqlite3.Connection]" = queue.Queue()
+        self._connections = []
+        self._open_lock = threading.Lock()
+
+    def _connect(self) -> sqlite3.Connection:
+        """
+        Открывает и настраивает новое соединение
+        """
+        conn = sqlite3.connect(
+            self.path,
+            timeout=self.busy_timeout,
+            check_same_thread=False,
+            cached_statements=self.cached_statements
+        )
+        conn.execute("PRAGMA journal_mode=WAL")
+        conn.execute("PRAGMA synchronous=NORMAL")
+        conn.execute(f"PRAGMA mmap_size={int(self.mmap_size)}")
+        conn.execute(f"PRAGMA busy_timeout={int(self.busy_timeout * 1000)}")
+        return conn
+
+    def open(self) -> None:
+        """
+        Открывает все соединения пула
+        """
+        with self._open_lock:
+            if self._connections:
+                return
+            self.path.parent.mkdir(parents=True, exist_ok=True)
+            for _ in range(self.size):
+                conn = self._connect()
+                self._connections.append(conn)
+                self._queue.put(conn)
+        logging.info(f"Открыто {self.size} соединений с базой данных {self.path}")
+
+    @contextmanager
+    def connection(self) -> Iterator[sqlite3.Connection]:
+        """
+        Выдает свободное соединение из пула и возвращает его обратно после использования
+        """
+        if not self._connections:
+            self.open()
+        conn = self._queue.get()
+        try:
+            yield conn
+        finally:
+            if conn.in_transaction:
+                # Незавершенная транзакция не должна достаться следующему пользователю соединения
+                conn.rollback()
+            self._queue.put(conn)
+
+    @contextmanager
+    def transaction(self) -> Iterator[sqlite3.Connection]:
+        """
+        Выдает соединение из пула внутри транзакции (commit при успехе, rollback при ошибке)
+        """
+        with self.connection() as conn:
+            with conn:
+                yield conn
+
+    def close(self) -> None:
+        """
+        Закрывает все соединения пула
+        """
+        for conn in self._connections:
+            try:
+                conn.close()
+            except Exception as e:
+                logging.error(f"Ошибка при закрытии соединения с базой данных {self.path}: {e}")
+        self._connections = []
+        self._queue = queue.Queue()
+
+
+class BatchWriter:
+    """
+    Фоновая запись с групповым коммитом.
+
+    Записи от всех обработчиков накапливаются в очереди и выполняются одной
+    транзакцией раз в несколько миллисекунд или при накоплении пачки из max_batch
+    записей. Каждая запись выполняется внутри своей точки сохранения (SAVEPOINT),
+    поэтому ошибка в одной записи не отменяет остальные записи пачки.
+    """
+
+    def __init__(self, pool: ConnectionPool, name: str, max_batch: int = 100, max_delay: float = 0.005):
+        """
+        Args:
+            pool: Пул соединений с базой данных
+            name: Имя для потока и метрик
+            max_batch: Максимальное количество записей в одной транзакции
+            max_delay: Сколько секунд ждать остальные записи пачки после первой
+        """
+        self.pool = pool
+        self.name = name
+        self.max_batch = max_batch
+        self.max_delay = max_delay
+        self._queue: "queue.Queue[Optional[Tuple[List[Tuple[str, Sequence]], str, Future]]]" = queue.Queue()
+        self._thread: Optional[threading.Thread] = None
+
+    def start(self) -> None:
+        """
+        Запускает фоновый поток записи
+        """
+        if self._thread is None:
+            self._thread = threading.Thread(target=self._run, name=f"batch-writer-{self.name}", daemon=True)
+            self._thread.start()
+
+    def submit(self, sql: str, params: Sequence = (), description: str = "") -> Future:
+        """
+        Ставит в очередь одну запись
+
+        Returns:
+            Future: Завершается после коммита транзакции, в которую попала запись
+        """
+        return self.submit_group([(sql, params)], description)
+
+    def submit_group(self, statements: List[Tuple[str, Sequence]], description: str = "") -> Future:
+        """
+        Ставит в очередь несколько выражений, которые должны примениться вместе
+
+        Returns:
+            Future: Завершается после коммита транзакции, в которую попала группа
+        """
+        future: Future = Future()
+        self._queue.put((statements, description, future))
+        metrics.set_gauge(f"db_{self.name}_write_queue", self._queue.qsize())
+        return future
+
+    def _collect_batch(self, first) -> list:
+        """
+        Собирает пачку записей, ожидая остальные не дольше max_delay
+        """
+        batch = [first]
+        deadline = time.monotonic() + self.max_delay
+        while len(batch) < self.max_batch:
+            timeout = deadline - time.monotonic()
+            if timeout <= 0:
+                break
+            try:
+                item = self._queue.get(timeout=timeout)
+            except queue.Empty:
+                break
+            if item is None:
+                # Сигнал остановки возвращаем в очередь, чтобы завершиться после этой пачки
+                self._queue.put(None)
+                break
+            batch.append(item)
+        return batch
+
+    def _commit_batch(self, batch: list) -> None:
+        """
+        Выполняет пачку записей одной транзакцией
+        """
+        started = time.monotonic()
+        results = []
+        try:
+            with self.pool.connection() as conn:
+                conn.execute("BEGIN")
+                for statements, description, future in batch:
+                    conn.execute("SAVEPOINT batch_item")
+                    try:
+                        for sql, params in statements:
+                            conn.execute(sql, params)
+                        conn.execute("RELEASE batch_item")
+                        results.append((future, None))
+                    except Exception as e:
+                        conn.execute("ROLLBACK TO batch_item")
+                        conn.execute("RELEASE batch_item")
+                        logging.error(f"Ошибка при записи в базу данных ({description or statements[0][0]}): {e}")
+                        results.append((future, e))
+                conn.commit()
+        except Exception as e:
+            logging.error(f"Ошибка при групповой записи в базу данных {self.pool.path}: {e}")
+            results = [(future, e) for _, _, future in batch]
+
+        metrics.observe(f"db_{self.name}_batch_size", len(batch))
+        metrics.observe(f"db_{self.name}_commit_ms", (time.monotonic() - started) * 1000)
+        metrics.set_gauge(f"db_{self.name}_write_queue", self._queue.qsize())
+
+        for future, error in results:
+            if error is None:
+                future.set_result(None)
+            else:
+                future.set_exception(error)
+
+    def _run(self) -> None:
+        while True:
+            item = self._queue.get()
+            if item is None:
+                return
+            self._commit_batch(self._collect_batch(item))
+
+    def stop(self) -> None:
+        """
+        Записывает все накопленные записи и останавливает фоновый поток
+        """
+        if self._thread is not None:
+            self._queue.put(None)
+            self._thread.join()
+            self._thread = None
+
+
+class DatabaseExecutor:
+    """
+    Выполняет блокирующие операции с базами данных вне цикла событий asyncio.
+
+    Запись идет через один поток, поэтому записи выполняются строго по очереди,
+    а чтение - через небольшой пул потоков, чтобы медленная запись на диск
+    не задерживала обработку остальных пользователей.
+    """
+
+    def __init__(self, reader_threads: int = 4):
+        """
+        Args:
+            reader_threads: Количество потоков для чтения
+        """
+        self._writer = ThreadPoolExecutor(max_workers=1, thread_name_prefix="db-writer")
+        self._readers = ThreadPoolExecutor(max_workers=reader_threads, thread_name_prefix="db-reader")
+
+    @staticmethod
+    async def _run(executor: ThreadPoolExecutor, func: Callable[..., Any], *args, **kwargs) -> Any:
+        loop = asyncio.get_running_loop()
+        return await loop.run_in_executor(executor, functools.partial(func, *args, **kwargs))
+
+    async def read(self, func: Callable[..., Any], *args, **kwargs) -> Any:
+        """
+        Выполняет функцию, которая только читает данные, в пуле потоков для чтения
+        """
+        return await self._run(self._readers, func, *args, **kwargs)
+
+    async def write(self, func: Callable[..., Any], *args, **kwargs) -> Any:
+        """
+        Выполняет функцию, которая изменяет данные, в потоке для записи
+        """
+        return await self._run(self._writer, func, *args, **kwargs)
+
+    def shutdown(self) -> None:
+        """
+        Дожидается завершения запущенных операций и останавливает потоки
+        """
+        self._writer.shutdown(wait=True)
+        self._readers.shutdown(wait=True)
+        logging.info("Потоки для работы с базами данных остановлены")
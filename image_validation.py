@@ -0,0 +1,170 @@
+"""
+Модуль с проверкой изображений (скриншотов второго теста) до и во время загрузки.
+
+Проверка идет в два этапа:
+1. До загрузки - по данным из сообщения: заявленный MIME-тип и размер файла.
+2. Во время загрузки - по первому фрагменту потока: тип изображения
+   определяется по сигнатуре (первым байтам файла), а не по заявленному
+   MIME-типу. Принятый файл собирается в буфер ограниченного размера,
+   загрузка прерывается, как только размер превышен. Чтобы только проверить
+   содержимое, достаточно загрузить первые SNIFF_BYTES байт (sniff_image).
+
+Отклоненные файлы учитываются в метриках images_rejected_<причина>.
+Модуль не зависит от telegram.
+"""
+from typing import AsyncIterable, Optional, Tuple
+
+import metrics
+
+# Максимальный размер скриншота по умолчанию (Bot API отдает файлы до 20 МБ)
+DEFAULT_MAX_IMAGE_BYTES = 10 * 1024 * 1024
+
+# Сколько первых байт нужно для определения типа изображения
+SNIFF_BYTES = 32
+
+# Причины отклонения
+REJECT_NOT_IMAGE = "not_image"
+REJECT_TOO_LARGE = "too_large"
+
+# Сигнатуры изображений: (смещение, байты, MIME-тип)
+IMAGE_SIGNATURES = (
+    (0, b"\xff\xd8\xff", "image/jpeg"),
+    (0, b"\x89PNG\r\n\x1a\n", "image/png"),
+    (0, b"GIF87a", "image/gif"),
+    (0, b"GIF89a", "image/gif"),
+    (0, b"BM", "image/bmp"),
+    (0, b"II*\x00", "image/tiff"),
+    (0, b"MM\x00*", "image/tiff"),
+)
+
+# Бренды контейнера ISO BMFF (байты 8-12 после "ftyp"), которые означают HEIC/HEIF/AVIF
+HEIF_BRANDS = {
+    b"heic": "image/heic",
+    b"heix": "image/heic",
+    b"hevc": "image/heic",
+    b"heif": "image/heif",
+    b"mif1": "image/heif",
+    b"msf1": "image/heif",
+    b"avif": "image/avif",
+}
+
+
+class ImageRejected(Exception):
+    """
+    Файл не прошел проверку
+    """
+
+    def __init__(self, reason: str, message: str = ""):
+        super().__init__(message or reason)
+        self.reason = reason
+
+
+def reject(reason: str, message: str = "") -> ImageRejected:
+    """
+    Учитывает отклонение в метриках и возвращает исключение для него
+    """
+    metrics.inc(f"images_rejected_{reason}")
+    return ImageRejected(reason, message)
+
+
+def sniff_image_type(head: bytes) -> Optional[str]:
+    """
+    Определяет MIME-тип изображения по первым байтам файла
+
+    Returns:
+        Optional[str]: MIME-тип или None, если это не известный формат изображения
+    """
+    for offset, signature, mime_type in IMAGE_SIGNATURES:
+        if head[offset:offset + len(signature)] == signature:
+            return mime_type
+    if head[:4] == b"RIFF" and head[8:12] == b"WEBP":
+        return "image/webp"
+    if head[4:8] == b"ftyp":
+        return HEIF_BRANDS.get(head[8:12])
+    return None
+
+
+def check_declared(mime_type: Optional[str], file_size: Optional[int], max_bytes: int = DEFAULT_MAX_IMAGE_BYTES) -> None:
+    """
+    Проверяет заявленные в сообщении MIME-тип и размер файла (до загрузки)
+
+    Raises:
+        ImageRejected: Файл не является изображением или слишком большой
+    """
+    if mime_type is not None and not mime_type.startswith("image/"):
+        raise reject(REJECT_NOT_IMAGE, f"Заявленный тип {mime_type} не является изображением")
+    if file_size is not None and file_size > max_bytes:
+        raise reject(REJECT_TOO_LARGE, f"Заявленный размер {file_size} больше {max_bytes} байт")
+
+
+class BoundedBuffer:
+    """
+    Буфер, который не растет больше max_bytes
+    """
+
+    def __init__(self, max_bytes: int):
+        self.max_bytes = max_bytes
+        self._data = bytearray()
+
+    def __len__(self) -> int:
+        return len(self._data)
+
+    def append(self, chunk: bytes) -> None:
+        if len(self._data) + len(chunk) > self.max_bytes:
+            raise reject(REJECT_TOO_LARGE, f"Файл больше {self.max_bytes} байт")
+        self._data += chunk
+
+    def head(self, size: int) -> bytes:
+        return bytes(self._data[:size])
+
+    def getvalue(self) -> bytes:
+        return bytes(self._data)
+
+
+async def read_image(chunks: AsyncIterable[bytes], max_bytes: int = DEFAULT_MAX_IMAGE_BYTES) -> Tuple[bytes, str]:
+    """
+    Читает изображение из потока фрагментов: тип определяется по первым байтам,
+    и чтение прерывается сразу, если это не изображение или размер превышен
+
+    Returns:
+        Tuple[bytes, str]: (содержимое файла, MIME-тип по сигнатуре)
+
+    Raises:
+        ImageRejected: Файл не является изображением или слишком большой
+    """
+    buffer = BoundedBuffer(max_bytes)
+    mime_type = None
+    async for chunk in chunks:
+        buffer.append(chunk)
+        if mime_type is None and len(buffer) >= SNIFF_BYTES:
+            mime_type = sniff_image_type(buffer.head(SNIFF_BYTES))
+            if mime_type is None:
+                raise reject(REJECT_NOT_IMAGE, "Содержимое файла не является изображением")
+
+    if mime_type is None:
+        # Файл короче SNIFF_BYTES
+        mime_type = sniff_image_type(buffer.head(SNIFF_BYTES))
+        if mime_type is None:
+            raise reject(REJECT_NOT_IMAGE, "Содержимое файла не является изображением")
+    return buffer.getvalue(), mime_type
+
+
+async def sniff_image(chunks: AsyncIterable[bytes]) -> str:
+    """
+    Определяет тип изображения по первым SNIFF_BYTES байт потока; остальной поток не читается
+
+    Returns:
+        str: MIME-тип по сигнатуре
+
+    Raises:
+        ImageRejected: Файл не является изображением
+    """
+    head = bytearray()
+    async for chunk in chunks:
+        head += chunk
+        if len(head) >= SNIFF_BYTES:
+            break
+    mime_type = sniff_image_type(bytes(head[:SNIFF_BYTES]))
+    if mime_type is None:
+        raise reject(REJECT_NOT_IMAGE, "Содержимое файла не является изображением")
+    return mime_type
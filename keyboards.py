@@ -0,0 +1,46 @@
+"""
+Модуль с инлайн-клавиатурами теста.
+
+Клавиатуры вопросов одинаковы для всех пользователей с одним языком, поэтому
+каждая собирается один раз и затем переиспользуется. Объекты telegram
+неизменяемы, так что одну клавиатуру можно отправлять разным пользователям.
+"""
+from functools import lru_cache
+from typing import Optional
+
+from telegram import InlineKeyboardButton, InlineKeyboardMarkup
+
+from localization import get_text
+from question_catalog import OPTION_LETTERS
+
+
+@lru_cache(maxsize=None)
+def question_keyboard(
+    language: str, has_back: bool = False, is_last: bool = False, question: Optional[int] = None
+) -> InlineKeyboardMarkup:
+    """
+    Возвращает клавиатуру вопроса теста
+
+    Args:
+        language: Код языка (ru, en)
+        has_back: Добавить кнопку возврата к предыдущему вопросу
+        is_last: Клавиатура после ответа на последний вопрос: вместо вариантов
+            ответа кнопка завершения теста
+        question: Номер вопроса (с нуля), который добавляется в callback_data вариантов
+            ответа (answer_A_5), чтобы отличать нажатия на уже замененный вопрос в режиме
+            одного сообщения
+
+    Returns:
+        InlineKeyboardMarkup: Общая для всех пользователей клавиатура
+    """
+    keyboard = []
+    if not is_last:
+        # Варианты ответов по 2 в ряд
+        suffix = "" if question is None else f"_{question}"
+        buttons = [InlineKeyboardButton(letter, callback_data=f"answer_{letter}{suffix}") for letter in OPTION_LETTERS]
+        keyboard.extend(buttons[i:i + 2] for i in range(0, len(buttons), 2))
+    if has_back:
+        keyboard.append([InlineKeyboardButton(get_text("back_to_previous", language), callback_data="back_to_previous")])
+    if is_last:
+        keyboard.append([InlineKeyboardButton(get_text("finish_test", language), callback_data="finish_test")])
+    return InlineKeyboardMarkup(keyboard)
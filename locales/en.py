@@ -50,29 +50,31 @@ The program is free, but we reserve the right to refuse if we believe you're not
     # Second test
     "send_screenshot": "Please send a screenshot with the results of the second test as an image.",
     "thanks_for_tests": "Thank you for completing the tests! We have received your results and will contact you soon.",
+    # Answer stats inserted before the phase name in results_received
+    "results_phase_stats": "Answers {count} ({percent}%) ",
     "results_received": """Thank you for completing the tests.
 
 <b>🌟 First test result: Phases in the Green stage</b>
 
-<b>Early phase</b> (excitement from discoveries, search for harmony)
+<b>{phase_1}Early phase</b> (excitement from discoveries, search for harmony)
 • Discovering the value of empathy, unity, and deep connection with people.
 • Excitement about new practices: meditation, mindfulness, spiritual teachings.
 • Belief in the power of collective intelligence, horizontal structures, freedom of expression.
 • Active participation in communities, ecology, activism.
 
-<b>Middle phase</b> (idealism and community fanaticism)
+<b>{phase_2}Middle phase</b> (idealism and community fanaticism)
 • Desire to create a "right" society where everyone lives in harmony.
 • Dividing the world into "conscious" and "unconscious," criticizing "not spiritual enough" people.
 • Striving to convince others of the value of love, kindness, and acceptance, but often intolerant of different viewpoints.
 • Avoiding conflicts, even when they are necessary.
 
-<b>Late phase</b> (disappointment and crisis, beginning of the gamma phase)
+<b>{phase_3}Late phase</b> (disappointment and crisis, beginning of the gamma phase)
 • Realization that emotions, love, and mindfulness alone are not enough to solve complex problems.
 • Disappointment in "spiritual" and "ecological" communities, recognizing their double standards.
 • Seeing the inefficiency of horizontal structures and endless conversations without action.
 • Feeling of stagnation, the sense that "we are treading water."
 
-<b>Transition to Yellow</b> (breakthrough to integration and strategy)
+<b>{phase_4}Transition to Yellow</b> (breakthrough to integration and strategy)
 • Accepting the complexity of the world, understanding that emotions and mindfulness are only part of the picture.
 • Seeking efficiency, strategic thinking, wanting to build working systems.
 • Ability to see the value of all levels, not just "conscious" people.
@@ -127,6 +129,7 @@ At Tier 2, there is no rigid division into "right" and "wrong" paths - each leve
 
 <b>⚠️ The number of places for participation in the program is limited, we will contact you soon with a decision.</b>""",
     "not_image": "Please send the screenshot as an image.",
+    "file_too_large": "The file is too large. Please send a screenshot up to {max_mb} MB.",
     
     # Messages to administrator
     "new_test_results": "📊 New test results!\n\nUser: {name} (@{username})\nID: {user_id}\n\nFirst test results:\n{stats}\nSecond test screenshot is attached above.",
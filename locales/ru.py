@@ -54,29 +54,31 @@ TEXTS = {
     # Второй тест
     "send_screenshot": "Пожалуйста, отправьте скриншот с результатами второго теста в виде изображения.",
     "thanks_for_tests": "Спасибо за прохождение тестов! Мы получили ваши результаты и свяжемся в ближайшее время.",
+    # Статистика ответов, подставляемая перед названием фазы в results_received
+    "results_phase_stats": "Ответов {count} ({percent}%) ",
     "results_received": """Спасибо за прохождение тестов.
 
 <b>🌟 Результат первого теста: Фазы в Зеленой стадии</b>
 
-<b>Ранняя фаза</b> (восторг от открытий, поиск гармонии)
+<b>{phase_1}Ранняя фаза</b> (восторг от открытий, поиск гармонии)
 • Открытие ценности эмпатии, единства и глубокой связи с людьми.
 • Восторг от новых практик: медитации, осознанности, духовных учений.
 • Вера в силу коллективного разума, горизонтальных структур, свободы самовыражения.
 • Активное участие в сообществах, экологии, активизме.
 
-<b>Средняя фаза</b> (идеализм и фанатизм сообщества)
+<b>{phase_2}Средняя фаза</b> (идеализм и фанатизм сообщества)
 • Стремление создать "правильное" общество, где все живут в гармонии.
 • Разделение мира на «осознанных» и «неосознанных», критика «недостаточно духовных» людей.
 • Стремление убедить других в ценности любви, добра и принятия, но при этом часто нетерпимость к иным точкам зрения.
 • Избегание конфликтов, даже если они необходимы.
 
-<b>Поздняя фаза</b> (разочарование и кризис, начало гамма-фазы)
+<b>{phase_3}Поздняя фаза</b> (разочарование и кризис, начало гамма-фазы)
 • Осознание, что одних эмоций, любви и осознанности недостаточно для решения сложных проблем.
 • Разочарование в «духовных» и «экологичных» сообществах, осознание их двойных стандартов.
 • Видение неэффективности горизонтальных структур и бесконечных разговоров без действий.
 • Чувство застоя, ощущение, что "мы топчемся на месте".
 
-<b>Переход к жёлтому</b> (прорыв к интеграции и стратегии)
+<b>{phase_4}Переход к жёлтому</b> (прорыв к интеграции и стратегии)
 • Принятие сложности мира, понимание, что эмоции и осознанность — это только часть картины.
 • Поиск эффективности, стратегического мышления, желание строить работающие системы.
 • Умение видеть ценность всех уровней, а не только «осознанных» людей.
@@ -131,6 +133,7 @@ TEXTS = {
 
 <b>⚠️ Количество мест для участия в программе ограничено, мы свяжемся с вами в ближайшее время с решением.</b>""",
     "not_image": "Пожалуйста, отправьте скриншот в виде изображения.",
+    "file_too_large": "Файл слишком большой. Пожалуйста, отправьте скриншот размером до {max_mb} МБ.",
     
     # Сообщения администратору
     "new_test_results": "📊 Новые результаты тестов!\n\nПользователь: {name} (@{username})\nID: {user_id}\n\nРезультаты первого теста:\n{stats}\nСкриншот второго теста прикреплен выше.",
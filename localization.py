@@ -1,109 +1,144 @@
 """
 Модуль для работы с локализацией
+
+Тексты каждого языка компилируются один раз при загрузке: в таблицу языка
+сразу подставляются русские тексты для отсутствующих ключей, а шаблоны
+с параметрами заранее переводятся в формат, который подставляет значения
+без повторного разбора фигурных скобок. Отсутствующие ключи сообщаются
+один раз при загрузке, а не при каждом обращении.
 """
 import importlib
 import logging
-from typing import Dict, Any, Optional
+import pkgutil
+import string
+import threading
+from typing import Callable, Dict, Any, Optional, Set
+
+import locales
+
+# Язык пользователей, которые его еще не выбрали
+DEFAULT_LANGUAGE = "ru"
+
+# Язык, тексты которого подставляются вместо отсутствующих
+FALLBACK_LANGUAGE = "ru"
+
+# Скомпилированные тексты: язык -> ключ -> текст (с уже подставленными русскими текстами)
+_tables: Dict[str, Dict[str, str]] = {}
+# Шаблоны с параметрами: язык -> ключ -> функция, подставляющая параметры
+_formatters: Dict[str, Dict[str, Callable[[Dict[str, Any]], str]]] = {}
+_compile_lock = threading.RLock()
+# Уже сообщенные отсутствующие ключи и языки (чтобы не писать в лог при каждом обращении)
+_reported_missing: Set[str] = set()
+
+
+def _compile_template(text: str) -> Optional[Callable[[Dict[str, Any]], str]]:
+    """
+    Переводит шаблон str.format в шаблон с %-подстановкой по имени, которая
+    выполняется без повторного разбора шаблона
+
+    Returns:
+        Optional[Callable]: Функция, подставляющая параметры, или None, если параметров в шаблоне нет
+    """
+    parts = list(string.Formatter().parse(text))
+    fields = [field for _, field, _, _ in parts if field is not None]
+    if not fields:
+        return None
+
+    # Сложные поля (с форматом, преобразованием или обращением к атрибутам) подставляет str.format
+    if any(spec or conversion for _, field, spec, conversion in parts if field is not None) \
+            or not all(field.isidentifier() for field in fields):
+        return text.format_map
+
+    template = "".join(
+        literal.replace("%", "%%") + (f"%({field})s" if field is not None else "")
+        for literal, field, _, _ in parts
+    )
+    return template.__mod__
+
+
+def _compile_language(language: str) -> Dict[str, str]:
+    """
+    Загружает и компилирует тексты языка
+    """
+    with _compile_lock:
+        table = _tables.get(language)
+        if table is not None:
+            return table
+
+        texts = importlib.import_module(f"locales.{language}").TEXTS
+        if language == FALLBACK_LANGUAGE:
+            table = dict(texts)
+        else:
+            fallback = _compile_language(FALLBACK_LANGUAGE)
+            missing = sorted(set(fallback) - set(texts))
+            if missing:
+                logging.warning(
+                    f"Missing texts for language {language}, using {FALLBACK_LANGUAGE}: {', '.join(missing)}"
+                )
+            table = {**fallback, **texts}
+
+        formatters = {}
+        for key, text in table.items():
+            formatter = _compile_template(text)
+            if formatter is not None:
+                formatters[key] = formatter
+
+        _formatters[language] = formatters
+        _tables[language] = table
+        return table
+
+
+def load_locales() -> None:
+    """
+    Компилирует тексты всех языков из пакета locales (вызывается при запуске,
+    чтобы отсутствующие тексты были сообщены сразу)
+    """
+    for module in pkgutil.iter_modules(locales.__path__):
+        _compile_language(module.name)
+    logging.info(f"Загружены тексты для языков: {', '.join(sorted(_tables))}")
+
+
+def _report_once(message: str) -> None:
+    if message not in _reported_missing:
+        _reported_missing.add(message)
+        logging.warning(message)
 
-# Словарь для кэширования загруженных модулей локализации
-_locale_cache = {}
 
 def get_text(key: str, language: str = "ru", **kwargs) -> str:
     """
     Получает текст по ключу на нужном языке
-    
+
     Args:
         key: Ключ текста
         language: Код языка (ru, en)
         **kwargs: Параметры для форматирования текста
-        
+
     Returns:
         str: Текст на выбранном языке
     """
-    try:
-        # Проверяем, загружен ли уже модуль локализации
-        if language not in _locale_cache:
-            # Загружаем модуль локализации
-            _locale_cache[language] = importlib.import_module(f"locales.{language}")
-        
-        # Получаем текст из модуля
-        text = _locale_cache[language].TEXTS.get(key)
-        
-        if text is None:
-            # Если текст не найден на нужном языке, пробуем на русском
-            if language != "ru":
-                if "ru" not in _locale_cache:
-                    _locale_cache["ru"] = importlib.import_module("locales.ru")
-                text = _locale_cache["ru"].TEXTS.get(key)
-            
-            if text is None:
-                # Если текст не найден и на русском, возвращаем ключ
-                logging.warning(f"Missing text for key: {key}, language: {language}")
-                return f"[{key}]"
-        
-        # Форматируем текст с переданными параметрами
-        if kwargs:
-            try:
-                return text.format(**kwargs)
-            except KeyError as e:
-                logging.error(f"Error formatting text for key: {key}, missing parameter: {e}")
-                return text
-        
-        return text
-    except Exception as e:
-        logging.error(f"Error getting text for key: {key}, language: {language}, error: {e}")
+    table = _tables.get(language)
+    if table is None:
+        try:
+            table = _compile_language(language)
+        except ImportError:
+            _report_once(f"Unknown language: {language}, using {FALLBACK_LANGUAGE}")
+            language = FALLBACK_LANGUAGE
+            table = _tables.get(language) or _compile_language(language)
+
+    text = table.get(key)
+    if text is None:
+        # Если текст не найден и на русском, возвращаем ключ
+        _report_once(f"Missing text for key: {key}")
         return f"[{key}]"
 
-def save_user_language(user_id: int, language: str) -> None:
-    """
-    Сохраняет выбранный пользователем язык
-    
-    Args:
-        user_id: ID пользователя
-        language: Код языка (ru, en)
-    """
-    import sqlite3
-    
-    conn = sqlite3.connect('data/bot.db')
-    cursor = conn.cursor()
-    
-    cursor.execute(
-        "CREATE TABLE IF NOT EXISTS user_languages (user_id INTEGER PRIMARY KEY, language TEXT)"
-    )
-    
-    cursor.execute(
-        "INSERT OR REPLACE INTO user_languages (user_id, language) VALUES (?, ?)",
-        (user_id, language)
-    )
-    
-    conn.commit()
-    conn.close()
+    if kwargs:
+        formatter = _formatters[language].get(key)
+        if formatter is None:
+            return text
+        try:
+            return formatter(kwargs)
+        except KeyError as e:
+            logging.error(f"Error formatting text for key: {key}, missing parameter: {e}")
+            return text
 
-def get_user_language(user_id: int) -> str:
-    """
-    Получает выбранный пользователем язык
-    
-    Args:
-        user_id: ID пользователя
-        
-    Returns:
-        str: Код языка (ru, en)
-    """
-    import sqlite3
-    
-    conn = sqlite3.connect('data/bot.db')
-    cursor = conn.cursor()
-    
-    cursor.execute(
-        "CREATE TABLE IF NOT EXISTS user_languages (user_id INTEGER PRIMARY KEY, language TEXT)"
-    )
-    
-    cursor.execute(
-        "SELECT language FROM user_languages WHERE user_id = ?",
-        (user_id,)
-    )
-    result = cursor.fetchone()
-    
-    conn.close()
-    
-    return result[0] if result else "ru" 
\ No newline at end of file
+    return text
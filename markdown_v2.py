@@ -0,0 +1,32 @@
+"""
+Модуль для подготовки текста к отправке в формате Telegram MarkdownV2
+"""
+import re
+
+# Символы, которые в MarkdownV2 нужно экранировать обратной косой чертой
+SPECIAL_CHARS = "_*[]()~`>#+-=|{}.!"
+
+# Все специальные символы находятся и экранируются за один проход по тексту.
+# str.translate здесь медленнее: для текста не в ASCII (вопросы на русском) он
+# обрабатывает каждый символ по отдельности (см. benchmarks/bench_markdown.py)
+_SPECIAL_CHARS_RE = re.compile(f"[{re.escape(SPECIAL_CHARS)}]")
+
+
+def _escape_match(match: "re.Match") -> str:
+    return "\\" + match.group()
+
+
+def escape_markdown_v2(text, trusted: bool = False):
+    """
+    Экранирует специальные символы для Markdown V2
+
+    Args:
+        text: Исходный текст
+        trusted: Текст уже размечен для MarkdownV2 (тексты из locales с форматированием)
+            и отправляется без изменений; так вызовы с готовой разметкой видны явно
+    """
+    if not text:
+        return ""
+    if trusted:
+        return text
+    return _SPECIAL_CHARS_RE.sub(_escape_match, text)
@@ -0,0 +1,107 @@
+"""
+Модуль с простыми метриками работы бота (счетчики, текущие значения и распределения)
+"""
+import threading
+from collections import deque
+from typing import Dict, Any
+
+# Сколько последних наблюдений хранить для расчета перцентилей
+SUMMARY_WINDOW = 1000
+
+_lock = threading.Lock()
+_counters: Dict[str, float] = {}
+_gauges: Dict[str, float] = {}
+_summaries: Dict[str, "Summary"] = {}
+
+
+class Summary:
+    """
+    Распределение значений: количество, сумма, максимум и перцентили по последним наблюдениям
+    """
+
+    def __init__(self, window: int = SUMMARY_WINDOW):
+        self.count = 0
+        self.total = 0.0
+        self.max = 0.0
+        self._recent = deque(maxlen=window)
+
+    def observe(self, value: float) -> None:
+        self.count += 1
+        self.total += value
+        self.max = max(self.max, value)
+        self._recent.append(value)
+
+    def percentile(self, q: float) -> float:
+        """
+        Возвращает перцентиль q (от 0 до 1) по последним наблюдениям
+        """
+        if not self._recent:
+            return 0.0
+        values = sorted(self._recent)
+        return values[min(len(values) - 1, int(q * len(values)))]
+
+    def as_dict(self) -> Dict[str, float]:
+        return {
+            "count": self.count,
+            "avg": self.total / self.count if self.count else 0.0,
+            "p50": self.percentile(0.5),
+            "p95": self.percentile(0.95),
+            "max": self.max,
+        }
+
+
+def inc(name: str, value: float = 1) -> None:
+    """
+    Увеличивает счетчик
+    """
+    with _lock:
+        _counters[name] = _counters.get(name, 0) + value
+
+
+def set_gauge(name: str, value: float) -> None:
+    """
+    Устанавливает текущее значение показателя
+    """
+    with _lock:
+        _gauges[name] = value
+
+
+def observe(name: str, value: float) -> None:
+    """
+    Добавляет наблюдение в распределение
+    """
+    with _lock:
+        summary = _summaries.get(name)
+        if summary is None:
+            summary = _summaries[name] = Summary()
+        summary.observe(value)
+
+
+def snapshot() -> Dict[str, Any]:
+    """
+    Возвращает текущие значения всех метрик
+    """
+    with _lock:
+        return {
+            "counters": dict(_counters),
+            "gauges": dict(_gauges),
+            "summaries": {name: summary.as_dict() for name, summary in _summaries.items()},
+        }
+
+
+def format_snapshot() -> str:
+    """
+    Форматирует текущие значения метрик в виде текста
+    """
+    data = snapshot()
+    lines = []
+    for name, value in sorted(data["counters"].items()):
+        lines.append(f"{name}: {value:g}")
+    for name, value in sorted(data["gauges"].items()):
+        lines.append(f"{name}: {value:g}")
+    for name, stats in sorted(data["summaries"].items()):
+        lines.append(
+            f"{name}: count={stats['count']} avg={stats['avg']:.2f} "
+            f"p50={stats['p50']:.2f} p95={stats['p95']:.2f} max={stats['max']:.2f}"
+        )
+    return "\n".join(lines) if lines else "Метрик пока нет"
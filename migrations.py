@@ -0,0 +1,271 @@
+"""
+Модуль с миграциями схем баз данных.
+
+Версия схемы каждой базы хранится в PRAGMA user_version. При запуске
+выполняются только миграции с номером больше текущей версии, каждая
+в своей транзакции вместе с обновлением версии.
+"""
+import json
+import logging
+import sqlite3
+import time
+from typing import Callable, Dict, List, Tuple
+
+from db import ConnectionPool
+
+# Миграция: (версия, описание, функция, применяющая изменения к соединению)
+Migration = Tuple[int, str, Callable[[sqlite3.Connection], None]]
+
+
+def _results_base_schema(conn: sqlite3.Connection) -> None:
+    """
+    Базовая схема базы результатов (повторяет прежний init_database, включая
+    добавление столбцов в test_results из старых версий бота)
+    """
+    conn.execute('''
+        CREATE TABLE IF NOT EXISTS answers (
+            user_id INTEGER,
+            question_number INTEGER,
+            answer TEXT,
+            timestamp INTEGER,
+            PRIMARY KEY (user_id, question_number)
+        )
+    ''')
+    conn.execute('''
+        CREATE TABLE IF NOT EXISTS test_results (
+            user_id INTEGER PRIMARY KEY,
+            dominant_type TEXT,
+            username TEXT,
+            first_name TEXT,
+            answers TEXT,
+            answer_stats TEXT,
+            timestamp INTEGER
+        )
+    ''')
+
+    columns = [column[1] for column in conn.execute("PRAGMA table_info(test_results)").fetchall()]
+    for column in ["dominant_type", "username", "first_name", "answers", "answer_stats"]:
+        if column not in columns:
+            logging.info(f"Добавляем столбец {column} в таблицу test_results")
+            conn.execute(f"ALTER TABLE test_results ADD COLUMN {column} TEXT")
+
+    conn.execute('''
+        CREATE TABLE IF NOT EXISTS full_test_results (
+            user_id INTEGER PRIMARY KEY,
+            username TEXT,
+            first_name TEXT,
+            answers TEXT,
+            answer_stats TEXT,
+            timestamp INTEGER
+        )
+    ''')
+    conn.execute('''
+        CREATE TABLE IF NOT EXISTS test_status (
+            user_id INTEGER PRIMARY KEY,
+            status TEXT,
+            timestamp INTEGER
+        )
+    ''')
+    conn.execute('''
+        CREATE TABLE IF NOT EXISTS user_language (
+            user_id INTEGER PRIMARY KEY,
+            language TEXT
+        )
+    ''')
+
+
+def _results_unify_answers(conn: sqlite3.Connection) -> None:
+    """
+    Приводит таблицу answers к единой схеме: раньше save_answer_to_db мог создать ее
+    без первичного ключа и с временем в виде строки DATETIME
+    """
+    conn.execute('''
+        CREATE TABLE answers_unified (
+            user_id INTEGER,
+            question_number INTEGER,
+            answer TEXT,
+            timestamp INTEGER,
+            PRIMARY KEY (user_id, question_number)
+        )
+    ''')
+    # Для повторных ответов на один вопрос остается последний
+    conn.execute('''
+        INSERT OR REPLACE INTO answers_unified (user_id, question_number, answer, timestamp)
+        SELECT user_id, question_number, answer,
+               CASE WHEN typeof(timestamp) = 'text' THEN CAST(strftime('%s', timestamp) AS INTEGER) ELSE timestamp END
+        FROM answers
+        ORDER BY rowid
+    ''')
+    conn.execute("DROP TABLE answers")
+    conn.execute("ALTER TABLE answers_unified RENAME TO answers")
+
+
+def _results_user_languages(conn: sqlite3.Connection) -> None:
+    """
+    Единая таблица языков пользователей вместо неиспользуемой user_language
+    (данные из старой базы data/bot.db переносит SQLiteStorage при запуске)
+    """
+    conn.execute(
+        "CREATE TABLE IF NOT EXISTS user_languages (user_id INTEGER PRIMARY KEY, language TEXT NOT NULL)"
+    )
+    conn.execute('''
+        INSERT OR IGNORE INTO user_languages (user_id, language)
+        SELECT user_id, language FROM user_language WHERE language IS NOT NULL
+    ''')
+    conn.execute("DROP TABLE user_language")
+
+
+def _results_normalized_answers(conn: sqlite3.Connection) -> None:
+    """
+    Переносит итоговые ответы из JSON-столбцов test_results в таблицу test_answers
+    (строка на вопрос) и счетчики вариантов в таблицу answer_stats, затем
+    пересоздает test_results без JSON-столбцов
+    """
+    conn.execute('''
+        CREATE TABLE test_answers (
+            user_id INTEGER NOT NULL,
+            question_index INTEGER NOT NULL,
+            option INTEGER NOT NULL,
+            PRIMARY KEY (user_id, question_index)
+        ) WITHOUT ROWID
+    ''')
+    conn.execute("CREATE INDEX idx_test_answers_user_option ON test_answers (user_id, option)")
+    conn.execute('''
+        CREATE TABLE answer_stats (
+            user_id INTEGER PRIMARY KEY,
+            option_1 INTEGER NOT NULL DEFAULT 0,
+            option_2 INTEGER NOT NULL DEFAULT 0,
+            option_3 INTEGER NOT NULL DEFAULT 0,
+            option_4 INTEGER NOT NULL DEFAULT 0,
+            total INTEGER NOT NULL DEFAULT 0
+        )
+    ''')
+
+    rows = []
+    for user_id, answers_json in conn.execute("SELECT user_id, answers FROM test_results WHERE answers IS NOT NULL"):
+        try:
+            answers = json.loads(answers_json)
+        except ValueError:
+            logging.warning(f"Пропущены ответы пользователя {user_id}: некорректный JSON")
+            continue
+        for question_index, answer in enumerate(answers):
+            if str(answer).isdigit():
+                rows.append((user_id, question_index, int(answer)))
+            else:
+                logging.warning(f"Пропущен ответ пользователя {user_id} на вопрос {question_index}: {answer!r}")
+    conn.executemany("INSERT INTO test_answers (user_id, question_index, option) VALUES (?, ?, ?)", rows)
+
+    # Статистика пересчитывается по самим ответам, а не копируется из answer_stats
+    conn.execute('''
+        INSERT INTO answer_stats (user_id, option_1, option_2, option_3, option_4, total)
+        SELECT user_id, SUM(option = 1), SUM(option = 2), SUM(option = 3), SUM(option = 4), COUNT(*)
+        FROM test_answers
+        GROUP BY user_id
+    ''')
+
+    conn.execute('''
+        CREATE TABLE test_results_normalized (
+            user_id INTEGER PRIMARY KEY,
+            dominant_type TEXT,
+            username TEXT,
+            first_name TEXT,
+            timestamp INTEGER
+        )
+    ''')
+    conn.execute('''
+        INSERT INTO test_results_normalized (user_id, dominant_type, username, first_name, timestamp)
+        SELECT user_id, dominant_type, username, first_name, timestamp FROM test_results
+    ''')
+    conn.execute("DROP TABLE test_results")
+    conn.execute("ALTER TABLE test_results_normalized RENAME TO test_results")
+
+
+def _progress_base_schema(conn: sqlite3.Connection) -> None:
+    conn.execute('''
+        CREATE TABLE IF NOT EXISTS user_progress (
+            user_id INTEGER PRIMARY KEY,
+            data TEXT NOT NULL,
+            updated_at INTEGER
+        )
+    ''')
+
+
+def _progress_answer_log(conn: sqlite3.Connection) -> None:
+    conn.execute('''
+        CREATE TABLE IF NOT EXISTS answer_events (
+            id INTEGER PRIMARY KEY AUTOINCREMENT,
+            user_id INTEGER NOT NULL,
+            kind TEXT NOT NULL,
+            question_index INTEGER,
+            option TEXT,
+            timestamp INTEGER NOT NULL
+        )
+    ''')
+    conn.execute("CREATE INDEX IF NOT EXISTS idx_answer_events_user ON answer_events (user_id, id)")
+    conn.execute('''
+        CREATE TABLE IF NOT EXISTS answer_snapshots (
+            user_id INTEGER PRIMARY KEY,
+            last_event_id INTEGER NOT NULL,
+            answers TEXT NOT NULL,
+            timestamp INTEGER NOT NULL
+        )
+    ''')
+
+
+# Миграции для каждой зарегистрированной базы данных (в порядке возрастания версий)
+MIGRATIONS: Dict[str, List[Migration]] = {
+    "results": [
+        (1, "базовая схема результатов тестов", _results_base_schema),
+        (2, "единая схема таблицы answers", _results_unify_answers),
+        (3, "единая таблица языков пользователей", _results_user_languages),
+        (4, "ответы и статистика ответов в отдельных таблицах", _results_normalized_answers),
+    ],
+    "progress": [
+        (1, "таблица прогресса", _progress_base_schema),
+        (2, "журнал ответов", _progress_answer_log),
+    ],
+}
+
+
+def migrate(pool: ConnectionPool, migrations: List[Migration]) -> int:
+    """
+    Применяет к базе данных миграции, которые еще не были применены
+
+    Returns:
+        int: Версия схемы после миграций
+    """
+    with pool.connection() as conn:
+        version = conn.execute("PRAGMA user_version").fetchone()[0]
+        pending = [migration for migration in migrations if migration[0] > version]
+        if not pending:
+            logging.info(f"Схема базы данных {pool.path.name} актуальна (версия {version})")
+            return version
+
+        for target, description, apply in pending:
+            started = time.monotonic()
+            conn.execute("BEGIN IMMEDIATE")
+            try:
+                apply(conn)
+                conn.execute(f"PRAGMA user_version = {int(target)}")
+                conn.commit()
+            except Exception:
+                conn.rollback()
+                logging.error(f"Ошибка в миграции {pool.path.name} до версии {target} ({description})")
+                raise
+            version = target
+            logging.info(
+                f"Миграция {pool.path.name} до версии {target} ({description}) "
+                f"выполнена за {(time.monotonic() - started) * 1000:.1f} мс"
+            )
+    return version
+
+
+def migrate_all(pools: Dict[str, ConnectionPool]) -> None:
+    """
+    Применяет миграции к базам данных
+
+    Args:
+        pools: Пулы соединений с базами данных по именам из MIGRATIONS ("results", "progress")
+    """
+    for name, migrations in MIGRATIONS.items():
+        migrate(pools[name], migrations)
@@ -0,0 +1,401 @@
+"""
+Модуль для хранения прогресса прохождения теста
+"""
+import json
+import logging
+import os
+import threading
+import time
+from collections import OrderedDict
+from pathlib import Path
+from typing import Dict, Any, Optional, Union
+
+from db import ConnectionPool
+
+
+class ProgressStore:
+    """
+    Хранилище прогресса пользователей в SQLite (режим WAL).
+
+    Каждый пользователь хранится отдельной строкой с ключом user_id, поэтому
+    чтение и запись прогресса одного пользователя не затрагивают остальных.
+    """
+
+    def __init__(self, pool: ConnectionPool, legacy_file: Optional[Union[str, Path]] = None):
+        """
+        Args:
+            pool: Пул соединений с базой данных прогресса
+            legacy_file: Путь к старому JSON-файлу с прогрессом всех пользователей (для переноса данных)
+        """
+        self.pool = pool
+        self.legacy_file = Path(legacy_file) if legacy_file else None
+
+    def open(self) -> None:
+        """
+        Переносит данные из старого файла с прогрессом (таблицы создаются миграциями)
+        """
+        self._import_legacy_file()
+
+    def _import_legacy_file(self) -> None:
+        """
+        Переносит прогресс из старого файла user_progress.json и переименовывает файл
+        """
+        if not self.legacy_file or not self.legacy_file.exists():
+            return
+
+        try:
+            with open(self.legacy_file, 'r') as f:
+                all_progress = json.load(f)
+
+            now = int(time.time())
+            with self.pool.transaction() as conn:
+                conn.executemany(
+                    "INSERT OR IGNORE INTO user_progress (user_id, data, updated_at) VALUES (?, ?, ?)",
+                    [(int(user_id), json.dumps(data), now) for user_id, data in all_progress.items()]
+                )
+
+            os.replace(self.legacy_file, self.legacy_file.with_suffix(".json.migrated"))
+            logging.info(f"Перенесен прогресс {len(all_progress)} пользователей из {self.legacy_file}")
+        except Exception as e:
+            logging.error(f"Ошибка при переносе прогресса из {self.legacy_file}: {e}")
+
+    def load_raw(self, user_id: int) -> Optional[str]:
+        """
+        Загружает прогресс пользователя в виде JSON-строки
+
+        Returns:
+            Optional[str]: JSON-строка с прогрессом или None, если прогресса нет
+        """
+        with self.pool.connection() as conn:
+            row = conn.execute(
+                "SELECT data FROM user_progress WHERE user_id = ?",
+                (user_id,)
+            ).fetchone()
+        return row[0] if row else None
+
+    def load(self, user_id: int) -> Dict[str, Any]:
+        """
+        Загружает прогресс пользователя
+
+        Returns:
+            Dict[str, Any]: Прогресс пользователя или пустой словарь
+        """
+        payload = self.load_raw(user_id)
+        return json.loads(payload) if payload else {}
+
+    def save(self, user_id: int, data: Dict[str, Any]) -> None:
+        """
+        Сохраняет прогресс пользователя
+        """
+        with self.pool.transaction() as conn:
+            conn.execute(
+                "INSERT OR REPLACE INTO user_progress (user_id, data, updated_at) VALUES (?, ?, ?)",
+                (user_id, json.dumps(data), int(time.time()))
+            )
+
+    def clear(self, user_id: int) -> None:
+        """
+        Удаляет прогресс пользователя
+        """
+        with self.pool.transaction() as conn:
+            conn.execute("DELETE FROM user_progress WHERE user_id = ?", (user_id,))
+
+    def apply(self, changes: Dict[int, Optional[str]]) -> None:
+        """
+        Применяет пачку изменений одной транзакцией
+
+        Args:
+            changes: Словарь user_id -> JSON-строка с прогрессом (None - удалить прогресс)
+        """
+        if not changes:
+            return
+
+        now = int(time.time())
+        upserts = [(user_id, payload, now) for user_id, payload in changes.items() if payload is not None]
+        deletes = [(user_id,) for user_id, payload in changes.items() if payload is None]
+
+        with self.pool.transaction() as conn:
+            conn.executemany(
+                "INSERT OR REPLACE INTO user_progress (user_id, data, updated_at) VALUES (?, ?, ?)",
+                upserts
+            )
+            conn.executemany("DELETE FROM user_progress WHERE user_id = ?", deletes)
+
+
+class ProgressCache:
+    """
+    Кэш активных сессий теста с отложенной записью в ProgressStore.
+
+    Чтение обслуживается из памяти. Каждое изменение дописывается в журнал
+    (по строке на изменение), а в базу попадает пачкой по таймеру или когда
+    журнал становится слишком большим. При запуске журнал проигрывается заново,
+    так что изменения, не успевшие попасть в базу, не теряются при падении процесса.
+    Журнал сбрасывается на диск (fsync) раз в sync_interval секунд, поэтому при
+    отключении питания или падении ОС теряются изменения не больше чем за это время
+    (sync_interval=0 - fsync после каждого изменения).
+    Давно неактивные сессии вытесняются из памяти (LRU + TTL).
+    """
+
+    def __init__(
+        self,
+        store: ProgressStore,
+        journal_path: Union[str, Path],
+        max_entries: int = 10000,
+        ttl: float = 30 * 60,
+        flush_interval: float = 5.0,
+        max_journal_bytes: int = 1024 * 1024,
+        sync_interval: float = 0.2
+    ):
+        """
+        Args:
+            store: Постоянное хранилище прогресса
+            journal_path: Путь к файлу журнала изменений
+            max_entries: Максимальное количество сессий в памяти
+            ttl: Время (в секундах), после которого неактивная сессия вытесняется из памяти
+            flush_interval: Интервал (в секундах) сброса изменений в базу
+            max_journal_bytes: Размер журнала, при превышении которого изменения сбрасываются сразу
+            sync_interval: Интервал (в секундах) сброса журнала на диск (0 - после каждого изменения)
+        """
+        self.store = store
+        self.journal_path = Path(journal_path)
+        # Журнал изменений, которые записываются в базу прямо сейчас
+        self.flushing_journal_path = self.journal_path.with_name(self.journal_path.name + ".flushing")
+        self.max_entries = max_entries
+        self.ttl = ttl
+        self.flush_interval = flush_interval
+        self.max_journal_bytes = max_journal_bytes
+        self.sync_interval = sync_interval
+
+        # user_id -> (JSON-строка с прогрессом, время последнего обращения)
+        self._entries: "OrderedDict[int, tuple]" = OrderedDict()
+        # Изменения, еще не записанные в базу: user_id -> JSON-строка (None - прогресс удален)
+        self._dirty: Dict[int, Optional[str]] = {}
+        # Изменения, которые записываются в базу прямо сейчас (читаются, пока запись не закончена)
+        self._flushing: Dict[int, Optional[str]] = {}
+        self._journal = None
+        self._journal_bytes = 0
+        # Есть ли в журнале записи, еще не сброшенные на диск
+        self._unsynced = False
+        self._lock = threading.RLock()
+        # Запись в базу выполняется одним потоком за раз
+        self._flush_lock = threading.Lock()
+        self._stop_event = threading.Event()
+        self._flush_thread: Optional[threading.Thread] = None
+
+    def open(self) -> None:
+        """
+        Открывает хранилище, проигрывает журнал, оставшийся после прошлого запуска, и запускает фоновый сброс
+        """
+        self.store.open()
+        with self._lock:
+            self._replay_journal()
+            self.journal_path.parent.mkdir(parents=True, exist_ok=True)
+            self._open_journal()
+
+        self._stop_event.clear()
+        self._flush_thread = threading.Thread(target=self._flush_loop, name="progress-flush", daemon=True)
+        self._flush_thread.start()
+
+    def _open_journal(self) -> None:
+        self._journal = open(self.journal_path, 'a', encoding='utf-8')
+        self._journal_bytes = 0
+        self._unsynced = False
+
+    def _replay_journal(self) -> None:
+        """
+        Применяет к базе изменения из журнала (и из журнала прерванной записи в базу) и очищает их
+        """
+        paths = [path for path in (self.flushing_journal_path, self.journal_path) if path.exists()]
+        if not paths:
+            return
+
+        changes: Dict[int, Optional[str]] = {}
+        for path in paths:
+            with open(path, 'r', encoding='utf-8') as f:
+                for line in f:
+                    # Последняя строка может быть обрезана, если процесс упал во время записи
+                    user_id, sep, payload = line.rstrip("\n").partition("\t")
+                    if not sep or not line.endswith("\n"):
+                        continue
+                    try:
+                        changes[int(user_id)] = None if payload == "null" else payload
+                    except ValueError:
+                        logging.warning(f"Пропущена поврежденная строка журнала прогресса: {line!r}")
+
+        self.store.apply(changes)
+        for path in paths:
+            os.remove(path)
+        logging.info(f"Проигран журнал прогресса: {len(changes)} пользователей")
+
+    def _write_journal(self, user_id: int, payload: Optional[str]) -> bool:
+        """
+        Дописывает изменение в журнал
+
+        Returns:
+            bool: True, если журнал превысил допустимый размер
+        """
+        if self._journal is None:
+            return True
+        line = f"{user_id}\t{payload if payload is not None else 'null'}\n"
+        self._journal.write(line)
+        self._journal.flush()
+        if self.sync_interval <= 0:
+            os.fsync(self._journal.fileno())
+        else:
+            self._unsynced = True
+        self._journal_bytes += len(line.encode('utf-8'))
+        return self._journal_bytes >= self.max_journal_bytes
+
+    def sync_journal(self) -> None:
+        """
+        Сбрасывает журнал на диск (fsync), если в нем есть несброшенные записи
+        """
+        with self._lock:
+            if self._journal is None or not self._unsynced:
+                return
+            self._unsynced = False
+            # fsync выполняется без блокировки, чтобы не задерживать чтение и запись прогресса;
+            # дескриптор не закроется раньше времени: журнал закрывается после остановки фонового потока
+            fd = os.dup(self._journal.fileno())
+        try:
+            os.fsync(fd)
+        finally:
+            os.close(fd)
+
+    def _evict(self, now: float) -> None:
+        """
+        Вытесняет из памяти лишние и давно неактивные сессии
+        """
+        while len(self._entries) > self.max_entries:
+            self._entries.popitem(last=False)
+        while self._entries:
+            user_id, (_, last_access) = next(iter(self._entries.items()))
+            if now - last_access < self.ttl:
+                break
+            del self._entries[user_id]
+
+    def load(self, user_id: int) -> Dict[str, Any]:
+        """
+        Загружает прогресс пользователя (из памяти, если сессия активна)
+        """
+        now = time.monotonic()
+        with self._lock:
+            entry = self._entries.get(user_id)
+            if entry is not None:
+                payload = entry[0]
+                self._entries[user_id] = (payload, now)
+                self._entries.move_to_end(user_id)
+                return json.loads(payload)
+            for pending in (self._dirty, self._flushing):
+                if user_id in pending:
+                    payload = pending[user_id]
+                    return json.loads(payload) if payload is not None else {}
+
+            payload = self.store.load_raw(user_id)
+            if payload is not None:
+                self._entries[user_id] = (payload, now)
+                self._evict(now)
+        return json.loads(payload) if payload is not None else {}
+
+    def save(self, user_id: int, data: Dict[str, Any]) -> None:
+        """
+        Сохраняет прогресс пользователя в памяти и в журнале
+        """
+        payload = json.dumps(data)
+        now = time.monotonic()
+        with self._lock:
+            self._entries[user_id] = (payload, now)
+            self._entries.move_to_end(user_id)
+            self._dirty[user_id] = payload
+            journal_full = self._write_journal(user_id, payload)
+            self._evict(now)
+        if journal_full:
+            self.flush()
+
+    def clear(self, user_id: int) -> None:
+        """
+        Удаляет прогресс пользователя
+        """
+        with self._lock:
+            self._entries.pop(user_id, None)
+            self._dirty[user_id] = None
+            journal_full = self._write_journal(user_id, None)
+        if journal_full:
+            self.flush()
+
+    def flush(self) -> None:
+        """
+        Записывает накопленные изменения в базу одной транзакцией и очищает журнал.
+
+        Под блокировкой изменения только забираются, а журнал переименовывается и
+        начинается заново; запись в базу идет без блокировки, так что чтение и
+        сохранение прогресса ее не ждут. Переименованный журнал удаляется после записи.
+        """
+        with self._flush_lock:
+            with self._lock:
+                changes, self._dirty = self._dirty, {}
+                self._flushing = changes
+                if self._journal is not None and self._journal_bytes:
+                    if self._unsynced:
+                        os.fsync(self._journal.fileno())
+                    self._journal.close()
+                    os.replace(self.journal_path, self.flushing_journal_path)
+                    self._open_journal()
+
+            try:
+                if changes:
+                    self.store.apply(changes)
+            except Exception:
+                # Возвращаем изменения в журнал и в очередь на запись (кроме уже замененных новыми)
+                with self._lock:
+                    for user_id, payload in changes.items():
+                        if user_id not in self._dirty:
+                            self._dirty[user_id] = payload
+                            self._write_journal(user_id, payload)
+                    self.sync_journal()
+                    self._flushing = {}
+                    self._remove_flushing_journal()
+                raise
+
+            with self._lock:
+                self._flushing = {}
+                self._remove_flushing_journal()
+
+    def _remove_flushing_journal(self) -> None:
+        try:
+            os.remove(self.flushing_journal_path)
+        except FileNotFoundError:
+            pass
+
+    def _flush_loop(self) -> None:
+        """
+        Фоновый поток: сбрасывает журнал на диск, периодически записывает изменения в базу
+        и вытесняет неактивные сессии
+        """
+        interval = min(self.sync_interval, self.flush_interval) if self.sync_interval > 0 else self.flush_interval
+        next_flush = time.monotonic() + self.flush_interval
+        while not self._stop_event.wait(interval):
+            try:
+                self.sync_journal()
+                if time.monotonic() >= next_flush:
+                    next_flush = time.monotonic() + self.flush_interval
+                    self.flush()
+                    with self._lock:
+                        self._evict(time.monotonic())
+            except Exception as e:
+                logging.error(f"Ошибка при сбросе прогресса в базу: {e}")
+
+    def close(self) -> None:
+        """
+        Останавливает фоновый сброс, записывает изменения и закрывает журнал
+        """
+        self._stop_event.set()
+        if self._flush_thread is not None:
+            self._flush_thread.join()
+            self._flush_thread = None
+
+        self.flush()
+        with self._lock:
+            if self._journal is not None:
+                self._journal.close()
+                self._journal = None
@@ -0,0 +1,162 @@
+"""
+Модуль с каталогом вопросов, подготовленных к отправке.
+
+Текст вопросов не меняется во время работы бота, поэтому заголовок, тело
+вопроса и варианты ответов экранируются для MarkdownV2 один раз на каждый
+язык (при первом обращении к нему). При показе вопроса остается только склеить готовые фрагменты в порядке
+перемешанных вариантов.
+"""
+import hashlib
+import itertools
+import logging
+import threading
+from typing import Dict, Any, List, Optional, Sequence
+
+from localization import get_text
+from markdown_v2 import escape_markdown_v2
+from questions import DEFAULT_LANGUAGE, get_questions_by_language, has_language
+
+# Буквы вариантов ответа в порядке показа
+OPTION_LETTERS = ("A", "B", "C", "D")
+
+# Номера вариантов ответа в файлах с вопросами
+OPTION_NUMBERS = ("1", "2", "3", "4")
+
+# Все порядки показа вариантов ответа (24 перестановки для четырех вариантов)
+PERMUTATIONS = tuple(itertools.permutations(OPTION_NUMBERS))
+
+# Префикс, с которого начинается текст вопроса в файлах с вопросами
+QUESTION_PREFIXES = {
+    "ru": "*Вопрос:*\n",
+    "en": "*Question:*\n",
+}
+
+_catalogs: Dict[str, "QuestionCatalog"] = {}
+_catalogs_lock = threading.Lock()
+
+
+class CatalogQuestion:
+    """
+    Вопрос с заранее подготовленными фрагментами сообщения
+    """
+
+    __slots__ = ("head", "options", "fragments")
+
+    def __init__(self, head: str, options: Dict[str, str], fragments: List[Dict[str, str]]):
+        """
+        Args:
+            head: Заголовок и экранированный текст вопроса
+            options: Исходный текст вариантов ответа по номерам ("1"-"4")
+            fragments: Для каждой позиции (A-D) экранированная строка варианта по его номеру
+        """
+        self.head = head
+        self.options = options
+        self.fragments = fragments
+
+    def render(self, order: Sequence[str]) -> str:
+        """
+        Собирает текст вопроса с вариантами в заданном порядке
+
+        Args:
+            order: Номера вариантов ответа в порядке показа
+        """
+        return self.head + "".join(self.fragments[position][number] for position, number in enumerate(order))
+
+
+class QuestionCatalog:
+    """
+    Вопросы одного языка, подготовленные к отправке
+    """
+
+    def __init__(self, language: str, questions: List[Dict[str, Any]]):
+        self.language = language
+        # Вопросы, из которых собран каталог (после перезагрузки вопросов каталог собирается заново)
+        self.source = questions
+        prefix = QUESTION_PREFIXES.get(language, QUESTION_PREFIXES["en"])
+
+        self.questions: List[CatalogQuestion] = []
+        for index, question in enumerate(questions):
+            header = get_text("question_header", language, current=index + 1, total=len(questions))
+            body = escape_markdown_v2(question.get("question", "").replace(prefix, ""))
+            options = question.get("options", {})
+            option_texts = {number: options.get(number, "") for number in OPTION_NUMBERS}
+            escaped = {number: escape_markdown_v2(text) for number, text in option_texts.items()}
+            fragments = [
+                {number: f"*{letter}\\)* {text}\n\n" for number, text in escaped.items()}
+                for letter in OPTION_LETTERS
+            ]
+            self.questions.append(CatalogQuestion(f"🔷 *{header}*\n*{body}*\n\n", option_texts, fragments))
+
+    def __len__(self) -> int:
+        return len(self.questions)
+
+    def __getitem__(self, index: int) -> CatalogQuestion:
+        return self.questions[index]
+
+
+def seeded_permutation(user_id: int, attempt_id: int, question_index: int) -> int:
+    """
+    Возвращает порядок показа вариантов ответа для вопроса в попытке пользователя.
+
+    Порядок вычисляется из хэша (user_id, attempt_id, question_index), поэтому
+    при повторном показе вопроса он получается тем же самым, и его не нужно хранить.
+    """
+    digest = hashlib.blake2b(f"{user_id}:{attempt_id}:{question_index}".encode(), digest_size=8).digest()
+    return int.from_bytes(digest, "big") % len(PERMUTATIONS)
+
+
+def option_for_letter(permutation: int, letter: str) -> Optional[str]:
+    """
+    Возвращает номер варианта ответа, показанного под буквой letter
+    """
+    try:
+        return PERMUTATIONS[permutation][OPTION_LETTERS.index(letter)]
+    except (IndexError, ValueError):
+        return None
+
+
+def question_permutation(user_id: int, progress: Dict[str, Any], question_number: int) -> int:
+    """
+    Возвращает порядок вариантов ответа для вопроса: он вычисляется из user_id,
+    номера попытки и номера вопроса и не хранится в прогрессе
+    """
+    return seeded_permutation(user_id, progress.get("attempt_id", 0), question_number)
+
+
+def answer_for_letter(user_id: int, progress: Dict[str, Any], question_number: int, letter: str) -> Optional[str]:
+    """
+    Возвращает номер варианта ответа, выбранного буквой letter на вопросе question_number.
+
+    В прогрессе, сохраненном до перехода на вычисляемый порядок вариантов, нет
+    attempt_id, а порядок вариантов показанного вопроса хранится в current_mapping.
+    По нему определяется только этот ответ: после него прогресс переводится на
+    попытку 0, с порядком которой показываются следующие вопросы (прогресс изменяется на месте).
+    """
+    if "attempt_id" in progress:
+        return option_for_letter(question_permutation(user_id, progress, question_number), letter)
+
+    answer_number = progress.get("current_mapping", {}).get(letter)
+    progress["attempt_id"] = 0
+    progress.pop("current_mapping", None)
+    return answer_number
+
+
+def get_catalog(language: str) -> QuestionCatalog:
+    """
+    Возвращает каталог вопросов на нужном языке (для неизвестного языка - на русском).
+    Каталог языка собирается при первом обращении к нему.
+    """
+    catalog = _catalogs.get(language)
+    if catalog is not None and catalog.source is get_questions_by_language(language):
+        return catalog
+
+    if not has_language(language):
+        logging.warning(f"Unknown language: {language}, using Russian questions")
+        return get_catalog(DEFAULT_LANGUAGE)
+
+    with _catalogs_lock:
+        questions = get_questions_by_language(language)
+        catalog = _catalogs.get(language)
+        if catalog is None or catalog.source is not questions:
+            catalog = _catalogs[language] = QuestionCatalog(language, questions)
+    return catalog
@@ -1,49 +1,118 @@
-"""Модуль с вопросами для теста и функциями для работы с ними."""
+"""Модуль с вопросами для теста и функциями для работы с ними.
 
+Вопросы каждого языка хранятся в файле question_bank/<язык>.json и загружаются
+при первом обращении к этому языку. Для каждого языка запоминается хэш
+содержимого файла и разобранные вопросы, поэтому повторная загрузка неизменного
+файла не разбирает и не проверяет его заново, а вопросы из прежней версии
+измененного файла не остаются в памяти.
+"""
+
+import hashlib
+import json
 import logging
-from typing import List, Dict, Any
+import threading
+from pathlib import Path
+from typing import List, Dict, Any, Optional, Tuple
 
-# Import questions from language-specific modules
-from questions_ru import ALL_QUESTIONS as RU_QUESTIONS
-from questions_en import ALL_QUESTIONS as EN_QUESTIONS
+# Каталог с файлами вопросов
+QUESTION_BANK_DIR = Path(__file__).resolve().parent / "question_bank"
 
-# Default questions (Russian)
-ALL_QUESTIONS = RU_QUESTIONS
+# Язык, вопросы которого используются для неизвестного языка
+DEFAULT_LANGUAGE = "ru"
 
-def get_questions_by_language(language: str) -> List[Dict[str, Any]]:
+_lock = threading.Lock()
+# Язык -> вопросы, загруженные при первом обращении
+_loaded: Dict[str, List[Dict[str, Any]]] = {}
+# Язык -> (хэш содержимого файла, разобранные и проверенные вопросы) последней версии файла
+_parsed: Dict[str, Tuple[str, List[Dict[str, Any]]]] = {}
+
+
+def available_languages() -> List[str]:
     """
-    Returns questions based on the selected language
-    
-    Args:
-        language: Language code (ru, en)
-        
-    Returns:
-        List of questions in the selected language
+    Returns codes of languages that have a question file
     """
-    if language == "ru":
-        return RU_QUESTIONS
-    elif language == "en":
-        return EN_QUESTIONS
-    else:
-        logging.warning(f"Unknown language: {language}, using Russian questions")
-        return RU_QUESTIONS
+    return sorted(path.stem for path in QUESTION_BANK_DIR.glob("*.json"))
+
+
+def has_language(language: str) -> bool:
+    """
+    Checks whether there is a question file for the language
+    """
+    return language in _loaded or (QUESTION_BANK_DIR / f"{language}.json").exists()
+
 
 def validate_question(question):
     """Проверяет корректность формата вопроса."""
     required_keys = {"question", "options"}
     required_options = {"1", "2", "3", "4"}
-    
+
     if not all(key in question for key in required_keys):
         return False
     if not all(option in question["options"] for option in required_options):
         return False
     return True
 
-def validate_all_questions():
-    """Проверяет корректность всех вопросов."""
-    for i, question in enumerate(ALL_QUESTIONS, 1):
+
+def validate_all_questions(questions: List[Dict[str, Any]], language: str) -> None:
+    """Проверяет корректность всех вопросов одного языка."""
+    if not questions:
+        raise ValueError(f"Нет вопросов для языка {language}")
+    for i, question in enumerate(questions, 1):
         if not validate_question(question):
-            raise ValueError(f"Некорректный формат вопроса {i}")
+            raise ValueError(f"Некорректный формат вопроса {i} для языка {language}")
+
+
+def _load_language(language: str) -> List[Dict[str, Any]]:
+    """
+    Читает файл вопросов языка; разбирает и проверяет его, только если файл изменился с прошлой загрузки
+    """
+    data = (QUESTION_BANK_DIR / f"{language}.json").read_bytes()
+    digest = hashlib.sha256(data).hexdigest()
 
-# Проверяем корректность вопросов при импорте модуля
-validate_all_questions()
\ No newline at end of file
+    parsed = _parsed.get(language)
+    if parsed is not None and parsed[0] == digest:
+        return parsed[1]
+
+    questions = json.loads(data)
+    validate_all_questions(questions, language)
+    # Заменяет вопросы прежней версии файла
+    _parsed[language] = (digest, questions)
+    logging.info(f"Загружено {len(questions)} вопросов для языка {language}")
+    return questions
+
+
+def get_questions_by_language(language: str) -> List[Dict[str, Any]]:
+    """
+    Returns questions based on the selected language
+
+    Args:
+        language: Language code (ru, en)
+
+    Returns:
+        List of questions in the selected language
+    """
+    questions = _loaded.get(language)
+    if questions is not None:
+        return questions
+
+    if not has_language(language):
+        logging.warning(f"Unknown language: {language}, using Russian questions")
+        return get_questions_by_language(DEFAULT_LANGUAGE)
+
+    with _lock:
+        questions = _loaded.get(language)
+        if questions is None:
+            questions = _loaded[language] = _load_language(language)
+    return questions
+
+
+def reload_questions(language: Optional[str] = None) -> None:
+    """
+    Сбрасывает загруженные вопросы (одного языка или всех), чтобы при следующем
+    обращении файлы были прочитаны заново. Неизменные файлы повторно не разбираются.
+    """
+    with _lock:
+        if language is None:
+            _loaded.clear()
+        else:
+            _loaded.pop(language, None)
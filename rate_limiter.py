@@ -0,0 +1,111 @@
+"""
+Модуль с ограничителем частоты запросов бота к Telegram Bot API.
+
+Все запросы бота (reply_text, send_message, send_photo, edit_message_* и т.д.)
+проходят через PriorityRateLimiter, который берет разрешение на отправку
+в очереди send_scheduler.SendScheduler. Приоритет запроса задается через
+rate_limit_args (например, context.bot.send_message(..., rate_limit_args=PRIORITY_CRITICAL)),
+а для запросов без него выбирается по методу API.
+
+Ответ 429 (RetryAfter) не превращается в ошибку: отправка в этот чат (или, если
+запрос не к чату, вызовы этого метода) приостанавливается на retry_after секунд,
+после чего запрос повторяется.
+"""
+import logging
+from typing import Any, Callable, Coroutine, Dict, List, Optional, Union
+
+from telegram.error import RetryAfter
+from telegram.ext import BaseRateLimiter
+
+import metrics
+from send_scheduler import SendScheduler, PRIORITY_HIGH, PRIORITY_NORMAL
+
+# Методы, которые не ограничиваются (служебные запросы, не сообщения)
+UNLIMITED_ENDPOINTS = frozenset({
+    "getUpdates",
+    "getMe",
+    "setWebhook",
+    "deleteWebhook",
+    "getWebhookInfo",
+    "getFile",
+    "logOut",
+    "close",
+})
+
+# Методы, которые не расходуют ограничение чата (около одного сообщения в секунду относится
+# к новым сообщениям): иначе каждое нажатие на ответ тратило бы на редактирование и ответ
+# на нажатие токены, нужные для отправки следующего вопроса. Общее ограничение и запрет
+# после ответа 429 на них действуют
+CHAT_EXEMPT_ENDPOINTS = frozenset({
+    "answerCallbackQuery",
+    "editMessageText",
+    "editMessageReplyMarkup",
+    "editMessageCaption",
+})
+
+# Приоритет по умолчанию для методов, от которых зависит отзывчивость теста
+ENDPOINT_PRIORITIES = {
+    "answerCallbackQuery": PRIORITY_HIGH,
+    "editMessageText": PRIORITY_HIGH,
+    "editMessageReplyMarkup": PRIORITY_HIGH,
+}
+
+
+class PriorityRateLimiter(BaseRateLimiter[int]):
+    """
+    Ограничитель частоты запросов с общим ограничением, ограничением на чат и приоритетами
+    """
+
+    def __init__(self, scheduler: Optional[SendScheduler] = None, max_retries: int = 3):
+        """
+        Args:
+            scheduler: Очередь исходящих запросов (по умолчанию - с ограничениями Telegram)
+            max_retries: Сколько раз повторять запрос после ответа 429
+        """
+        self.scheduler = scheduler or SendScheduler()
+        self.max_retries = max_retries
+
+    async def initialize(self) -> None:
+        await self.scheduler.start()
+
+    async def shutdown(self) -> None:
+        await self.scheduler.stop()
+
+    async def process_request(
+        self,
+        callback: Callable[..., Coroutine[Any, Any, Union[bool, Dict[str, Any], List[Dict[str, Any]]]]],
+        args: Any,
+        kwargs: Dict[str, Any],
+        endpoint: str,
+        data: Dict[str, Any],
+        rate_limit_args: Optional[int],
+    ) -> Union[bool, Dict[str, Any], List[Dict[str, Any]]]:
+        if endpoint in UNLIMITED_ENDPOINTS:
+            return await callback(*args, **kwargs)
+
+        chat_id = data.get("chat_id")
+        if rate_limit_args is not None:
+            priority = rate_limit_args
+        else:
+            priority = ENDPOINT_PRIORITIES.get(endpoint, PRIORITY_NORMAL)
+
+        attempt = 0
+        while True:
+            await self.scheduler.acquire(
+                chat_id, priority, chat_limited=endpoint not in CHAT_EXEMPT_ENDPOINTS, endpoint=endpoint
+            )
+            try:
+                return await callback(*args, **kwargs)
+            except RetryAfter as e:
+                metrics.inc("send_retry_after")
+                if attempt >= self.max_retries:
+                    raise
+                attempt += 1
+                retry_after = float(e.retry_after)
+                logging.warning(
+                    f"Telegram ограничил частоту запросов ({endpoint}, чат {chat_id}): "
+                    f"повтор через {retry_after:g} с (попытка {attempt}/{self.max_retries})"
+                )
+                # Запрет только для этого чата или, для запросов не к чату (например,
+                # answerCallbackQuery), только для этого метода - остальные чаты не ждут
+                self.scheduler.block(retry_after, chat_id, endpoint=endpoint)
@@ -0,0 +1,55 @@
+"""
+Модуль для формирования сообщения с результатами теста.
+
+Шаблон results_received в текстах каждого языка содержит именованные места
+{phase_1}-{phase_4} перед названиями фаз. Шаблон разбирается один раз на язык
+(при компиляции текстов в localization), а при формировании сообщения все места
+заполняются статистикой ответов за одну подстановку, без веток по языкам.
+"""
+from typing import Dict, List, Mapping, Optional, Tuple
+
+from localization import get_text
+from question_catalog import OPTION_NUMBERS
+
+# Место в шаблоне results_received для каждого номера варианта ответа (фазы)
+PHASE_SLOTS = {number: f"phase_{number}" for number in OPTION_NUMBERS}
+
+# Пустые места: шаблон без статистики
+_EMPTY_SLOTS = dict.fromkeys(PHASE_SLOTS.values(), "")
+
+
+def phase_shares(answer_stats: Mapping[str, int]) -> List[Tuple[str, int, float]]:
+    """
+    Возвращает для каждого варианта ответа (фазы) количество ответов и их долю в процентах
+
+    Returns:
+        List[Tuple[str, int, float]]: (номер варианта, количество ответов, процент)
+    """
+    counts = [(number, answer_stats.get(number, 0)) for number in OPTION_NUMBERS]
+    total_answers = sum(count for _, count in counts)
+    return [
+        (number, count, count / total_answers * 100 if total_answers > 0 else 0)
+        for number, count in counts
+    ]
+
+
+def render_results_message(answer_stats: Optional[Mapping[str, int]], language: str) -> str:
+    """
+    Заполняет шаблон результатов статистикой ответов
+
+    Args:
+        answer_stats: Количество ответов по номерам вариантов ("1"-"4") или None, если статистики нет
+        language: Код языка (ru, en)
+
+    Returns:
+        str: Сообщение с результатами (HTML)
+    """
+    if not answer_stats:
+        return get_text("results_received", language, **_EMPTY_SLOTS)
+
+    slots: Dict[str, str] = {}
+    for number, count, percentage in phase_shares(answer_stats):
+        slots[PHASE_SLOTS[number]] = get_text(
+            "results_phase_stats", language, count=count, percent=f"{percentage:.0f}"
+        )
+    return get_text("results_received", language, **slots)
@@ -0,0 +1,227 @@
+"""
+Модуль с хранилищем скриншотов второго теста.
+
+Файлы хранятся по SHA-256 содержимого: путь <каталог>/ab/cd/<хэш><расширение>,
+где ab и cd - первые байты хэша. Благодаря такому разбиению в одном каталоге
+остается не больше нескольких файлов даже при сотнях тысяч скриншотов, а
+повторно отправленный скриншот не занимает место второй раз. Расширение
+берется из MIME-типа файла.
+
+Фоновая очистка удаляет файлы старше срока хранения и, если общий размер
+превышает квоту, самые старые файлы. Повторная отправка уже сохраненного
+скриншота продлевает срок его хранения.
+"""
+import hashlib
+import logging
+import mimetypes
+import os
+import threading
+import time
+from pathlib import Path
+from typing import List, Optional, Tuple, Union
+
+import metrics
+
+# Расширения для MIME-типов изображений (mimetypes для некоторых из них дает неудобные варианты, например .jpe)
+MIME_EXTENSIONS = {
+    "image/jpeg": ".jpg",
+    "image/jpg": ".jpg",
+    "image/pjpeg": ".jpg",
+    "image/png": ".png",
+    "image/webp": ".webp",
+    "image/gif": ".gif",
+    "image/bmp": ".bmp",
+    "image/tiff": ".tiff",
+    "image/heic": ".heic",
+    "image/heif": ".heif",
+    "image/avif": ".avif",
+}
+
+# Расширение файла неизвестного типа
+UNKNOWN_EXTENSION = ".bin"
+
+# Через сколько секунд недописанный временный файл считается брошенным
+STALE_TEMP_SECONDS = 3600
+
+# После превышения квоты файлы удаляются, пока размер не станет меньше этой доли квоты
+QUOTA_LOW_WATERMARK = 0.9
+
+
+def extension_for_mime(mime_type: Optional[str]) -> str:
+    """
+    Возвращает расширение файла для MIME-типа
+    """
+    mime = (mime_type or "").split(";", 1)[0].strip().lower()
+    return MIME_EXTENSIONS.get(mime) or mimetypes.guess_extension(mime) or UNKNOWN_EXTENSION
+
+
+class ScreenshotStore:
+    """
+    Хранилище файлов с адресацией по содержимому, сроком хранения и квотой
+    """
+
+    def __init__(
+        self,
+        root: Union[str, Path],
+        retention_days: float = 0,
+        max_bytes: int = 0,
+        fanout_levels: int = 2,
+        cleanup_interval: float = 3600,
+    ):
+        """
+        Args:
+            root: Каталог хранилища
+            retention_days: Сколько дней хранить файл после последней отправки (0 - бессрочно)
+            max_bytes: Максимальный общий размер файлов (0 - без ограничения)
+            fanout_levels: Количество уровней подкаталогов (по два шестнадцатеричных символа хэша на уровень)
+            cleanup_interval: Как часто (в секундах) запускать очистку
+        """
+        self.root = Path(root)
+        self.retention_seconds = retention_days * 86400
+        self.max_bytes = max_bytes
+        self.fanout_levels = fanout_levels
+        self.cleanup_interval = cleanup_interval
+        self._lock = threading.Lock()
+        # Общий размер файлов (известен после первой очистки)
+        self._total_bytes: Optional[int] = None
+        self._wakeup = threading.Event()
+        self._stopped = False
+        self._cleanup_thread: Optional[threading.Thread] = None
+
+    def open(self) -> None:
+        """
+        Создает каталог хранилища и запускает фоновую очистку (первая очистка - сразу)
+        """
+        self.root.mkdir(parents=True, exist_ok=True)
+        self._stopped = False
+        self._cleanup_thread = threading.Thread(target=self._cleanup_loop, name="screenshot-cleanup", daemon=True)
+        self._cleanup_thread.start()
+
+    def close(self) -> None:
+        self._stopped = True
+        self._wakeup.set()
+        if self._cleanup_thread is not None:
+            self._cleanup_thread.join()
+            self._cleanup_thread = None
+
+    def path_for(self, digest: str, extension: str) -> Path:
+        """
+        Возвращает путь файла с хэшем digest
+        """
+        parts = [digest[2 * level:2 * level + 2] for level in range(self.fanout_levels)]
+        return self.root.joinpath(*parts, f"{digest}{extension}")
+
+    def put(self, data: bytes, mime_type: Optional[str]) -> Tuple[str, Path, bool]:
+        """
+        Сохраняет файл (если файла с таким содержимым еще нет)
+
+        Returns:
+            Tuple[str, Path, bool]: (SHA-256 содержимого, путь к файлу, был ли файл записан)
+        """
+        digest = hashlib.sha256(data).hexdigest()
+        path = self.path_for(digest, extension_for_mime(mime_type))
+
+        if path.exists():
+            # Тот же скриншот уже сохранен - продлеваем срок его хранения
+            os.utime(path)
+            metrics.inc("screenshots_deduplicated")
+            return digest, path, False
+
+        path.parent.mkdir(parents=True, exist_ok=True)
+        # Пишем во временный файл и переименовываем, чтобы файл с именем-хэшем всегда был полным
+        temp_path = path.with_name(f".{digest}.{os.getpid()}.{threading.get_ident()}.tmp")
+        with open(temp_path, "wb") as f:
+            f.write(data)
+        os.replace(temp_path, path)
+
+        metrics.inc("screenshots_stored")
+        with self._lock:
+            if self._total_bytes is not None:
+                self._total_bytes += len(data)
+                metrics.set_gauge("screenshot_store_bytes", self._total_bytes)
+                if self.max_bytes and self._total_bytes > self.max_bytes:
+                    # Квота превышена - запускаем очистку, не дожидаясь расписания
+                    self._wakeup.set()
+        return digest, path, True
+
+    def _list_files(self) -> List[Tuple[float, int, str]]:
+        """
+        Возвращает (время изменения, размер, путь) всех файлов хранилища; удаляет брошенные временные файлы
+        """
+        files = []
+        now = time.time()
+        for directory, _, names in os.walk(self.root):
+            for name in names:
+                path = os.path.join(directory, name)
+                try:
+                    stat = os.stat(path)
+                except FileNotFoundError:
+                    continue
+                if name.endswith(".tmp"):
+                    if now - stat.st_mtime > STALE_TEMP_SECONDS:
+                        _remove(path)
+                    continue
+                files.append((stat.st_mtime, stat.st_size, path))
+        return files
+
+    def cleanup(self) -> Tuple[int, int]:
+        """
+        Удаляет файлы старше срока хранения и самые старые файлы сверх квоты
+
+        Returns:
+            Tuple[int, int]: (количество удаленных файлов, их общий размер)
+        """
+        files = self._list_files()
+        removed_files = 0
+        removed_bytes = 0
+
+        if self.retention_seconds:
+            expire_before = time.time() - self.retention_seconds
+            kept = []
+            for mtime, size, path in files:
+                if mtime < expire_before and _remove(path):
+                    removed_files += 1
+                    removed_bytes += size
+                else:
+                    kept.append((mtime, size, path))
+            files = kept
+
+        total = sum(size for _, size, _ in files)
+        if self.max_bytes and total > self.max_bytes:
+            target = self.max_bytes * QUOTA_LOW_WATERMARK
+            files.sort()
+            for mtime, size, path in files:
+                if total <= target:
+                    break
+                if _remove(path):
+                    total -= size
+                    removed_files += 1
+                    removed_bytes += size
+
+        with self._lock:
+            self._total_bytes = total
+        metrics.set_gauge("screenshot_store_bytes", total)
+        if removed_files:
+            metrics.inc("screenshots_removed", removed_files)
+            logging.info(f"Очистка скриншотов: удалено {removed_files} файлов ({removed_bytes} байт), осталось {total} байт")
+        return removed_files, removed_bytes
+
+    def _cleanup_loop(self) -> None:
+        while not self._stopped:
+            try:
+                self.cleanup()
+            except Exception as e:
+                logging.error(f"Ошибка при очистке хранилища скриншотов: {e}")
+            self._wakeup.wait(self.cleanup_interval)
+            self._wakeup.clear()
+
+
+def _remove(path: str) -> bool:
+    try:
+        os.remove(path)
+        return True
+    except FileNotFoundError:
+        return False
+    except OSError as e:
+        logging.error(f"Не удалось удалить файл {path}: {e}")
+        return False
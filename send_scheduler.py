@@ -0,0 +1,284 @@
+"""
+Модуль с очередью исходящих запросов к Telegram Bot API.
+
+Очередь выдает разрешения на отправку с учетом ограничений Telegram: общего
+(около 30 сообщений в секунду на бота) и для каждого чата (около одного
+сообщения в секунду в личном чате и 20 сообщений в минуту в группе).
+Ограничения реализованы корзинами токенов, а ожидающие запросы выпускаются
+в порядке приоритета: среди запросов, которые уже можно отправить в свой чат,
+первым уходит запрос с меньшим номером приоритета, при равных - пришедший раньше.
+
+Модуль не зависит от telegram; подключение к боту - в rate_limiter.py.
+"""
+import asyncio
+import bisect
+import itertools
+import time
+from collections import OrderedDict
+from typing import Dict, List, Optional, Tuple, Union
+
+import metrics
+
+# Классы приоритета (меньше - важнее)
+PRIORITY_CRITICAL = 0  # решения администратора
+PRIORITY_HIGH = 1      # доставка вопросов и ответы на нажатия кнопок
+PRIORITY_NORMAL = 2    # остальные сообщения
+PRIORITY_LOW = 3       # некритичные уведомления
+
+PRIORITY_NAMES = {
+    PRIORITY_CRITICAL: "critical",
+    PRIORITY_HIGH: "high",
+    PRIORITY_NORMAL: "normal",
+    PRIORITY_LOW: "low",
+}
+
+# Сколько корзин чатов хранить (давно неактивные чаты вытесняются, их корзины все равно полные)
+MAX_CHAT_BUCKETS = 10000
+
+ChatId = Union[int, str, None]
+
+
+class TokenBucket:
+    """
+    Корзина токенов: rate токенов в секунду, не больше burst токенов про запас
+    """
+
+    __slots__ = ("rate", "burst", "tokens", "updated", "blocked_until")
+
+    def __init__(self, rate: float, burst: float):
+        self.rate = rate
+        self.burst = burst
+        self.tokens = burst
+        self.updated = time.monotonic()
+        # До этого момента отправка запрещена (после ответа 429 с retry_after)
+        self.blocked_until = 0.0
+
+    def _refill(self, now: float) -> None:
+        if now > self.updated:
+            self.tokens = min(self.burst, self.tokens + (now - self.updated) * self.rate)
+            self.updated = now
+
+    def delay(self, now: float) -> float:
+        """
+        Возвращает, через сколько секунд появится токен (0, если он есть сейчас)
+        """
+        if now < self.blocked_until:
+            return self.blocked_until - now
+        self._refill(now)
+        if self.tokens >= 1:
+            return 0.0
+        return (1 - self.tokens) / self.rate
+
+    def blocked_delay(self, now: float) -> float:
+        """
+        Возвращает, сколько секунд еще действует запрет отправки после ответа 429
+        """
+        return max(0.0, self.blocked_until - now)
+
+    def take(self, now: float) -> None:
+        self._refill(now)
+        self.tokens -= 1
+
+    def block(self, until: float) -> None:
+        self.blocked_until = max(self.blocked_until, until)
+
+
+class SendScheduler:
+    """
+    Очередь с приоритетами, выдающая разрешения на отправку запросов
+    """
+
+    def __init__(
+        self,
+        global_rate: float = 30.0,
+        global_burst: float = 30.0,
+        chat_rate: float = 1.0,
+        chat_burst: float = 3.0,
+        group_rate: float = 20 / 60,
+        group_burst: float = 3.0,
+    ):
+        """
+        Args:
+            global_rate: Общее ограничение, запросов в секунду
+            global_burst: Сколько запросов можно отправить разом сверх общего ограничения
+            chat_rate: Ограничение для личного чата, запросов в секунду
+            chat_burst: Сколько запросов в личный чат можно отправить разом
+            group_rate: Ограничение для группы или канала, запросов в секунду
+            group_burst: Сколько запросов в группу можно отправить разом
+        """
+        self.chat_rate = chat_rate
+        self.chat_burst = chat_burst
+        self.group_rate = group_rate
+        self.group_burst = group_burst
+        self._global = TokenBucket(global_rate, global_burst)
+        self._chats: "OrderedDict[Union[int, str], TokenBucket]" = OrderedDict()
+        # Ожидающие запросы, отсортированные по (приоритет, номер поступления); остальные
+        # элементы - чат, расходует ли запрос токены чата и метод API
+        self._waiting: List[Tuple[int, int, ChatId, bool, Optional[str], asyncio.Future]] = []
+        # Методы API, вызовы которых запрещены до указанного момента (после ответа 429 на запрос не к чату)
+        self._blocked_endpoints: Dict[str, float] = {}
+        self._sequence = itertools.count()
+        self._wakeup: Optional[asyncio.Event] = None
+        self._task: Optional[asyncio.Task] = None
+
+    async def start(self) -> None:
+        if self._task is None:
+            self._wakeup = asyncio.Event()
+            self._task = asyncio.create_task(self._run())
+
+    async def stop(self) -> None:
+        if self._task is not None:
+            self._task.cancel()
+            try:
+                await self._task
+            except asyncio.CancelledError:
+                pass
+            self._task = None
+        # Выпускаем оставшиеся запросы без ожидания, чтобы не зависли вызывающие
+        for *_, future in self._waiting:
+            if not future.done():
+                future.set_result(None)
+        self._waiting.clear()
+        metrics.set_gauge("send_queue_depth", 0)
+
+    async def acquire(
+        self,
+        chat_id: ChatId,
+        priority: int = PRIORITY_NORMAL,
+        chat_limited: bool = True,
+        endpoint: Optional[str] = None,
+    ) -> None:
+        """
+        Ждет разрешения на отправку запроса в чат chat_id (None - запрос не к чату)
+
+        Args:
+            chat_id: Чат, к которому относится запрос
+            priority: Приоритет запроса
+            chat_limited: Расходует ли запрос токены чата (False - только общее ограничение
+                и запрет после ответа 429 для этого чата; например, для редактирования сообщений)
+            endpoint: Метод API (для запрета вызовов метода после ответа 429 на запрос не к чату)
+        """
+        if self._task is None:
+            await self.start()
+
+        started = time.monotonic()
+        future = asyncio.get_running_loop().create_future()
+        bisect.insort(self._waiting, (priority, next(self._sequence), chat_id, chat_limited, endpoint, future))
+        metrics.set_gauge("send_queue_depth", len(self._waiting))
+        self._wakeup.set()
+        try:
+            await future
+        finally:
+            if not future.done():
+                # Вызывающий отменен - убираем запрос из очереди
+                future.cancel()
+                self._wakeup.set()
+        wait_ms = (time.monotonic() - started) * 1000
+        metrics.observe("send_wait_ms", wait_ms)
+        metrics.observe(f"send_wait_ms_{PRIORITY_NAMES.get(priority, priority)}", wait_ms)
+
+    def block(self, seconds: float, chat_id: ChatId = None, endpoint: Optional[str] = None) -> None:
+        """
+        Запрещает отправку на seconds секунд: в чат chat_id, иначе вызовы метода endpoint,
+        а если не указано ни то, ни другое, - все запросы
+        """
+        until = time.monotonic() + seconds
+        if chat_id is not None:
+            self._chat_bucket(chat_id).block(until)
+        elif endpoint is not None:
+            self._blocked_endpoints[endpoint] = max(self._blocked_endpoints.get(endpoint, 0.0), until)
+        else:
+            self._global.block(until)
+        if self._wakeup is not None:
+            self._wakeup.set()
+
+    def _chat_bucket(self, chat_id: Union[int, str]) -> TokenBucket:
+        bucket = self._chats.get(chat_id)
+        if bucket is None:
+            # Личные чаты имеют положительный id, группы и каналы - отрицательный или @username
+            if isinstance(chat_id, int) and chat_id > 0:
+                bucket = TokenBucket(self.chat_rate, self.chat_burst)
+            else:
+                bucket = TokenBucket(self.group_rate, self.group_burst)
+            self._chats[chat_id] = bucket
+            if len(self._chats) > MAX_CHAT_BUCKETS:
+                self._chats.popitem(last=False)
+        else:
+            self._chats.move_to_end(chat_id)
+        return bucket
+
+    def _endpoint_delay(self, endpoint: Optional[str], now: float) -> float:
+        """
+        Возвращает, сколько секунд еще запрещены вызовы метода endpoint
+        """
+        if endpoint is None or endpoint not in self._blocked_endpoints:
+            return 0.0
+        delay = self._blocked_endpoints[endpoint] - now
+        if delay <= 0:
+            del self._blocked_endpoints[endpoint]
+            return 0.0
+        return delay
+
+    def _dispatch(self) -> Optional[float]:
+        """
+        Выпускает все запросы, которые можно отправить сейчас
+
+        Returns:
+            Optional[float]: Через сколько секунд можно будет выпустить следующий запрос
+                или None, если очередь пуста
+        """
+        while self._waiting:
+            now = time.monotonic()
+            global_delay = self._global.delay(now)
+            if global_delay > 0:
+                return global_delay
+
+            chosen = None
+            next_delay: Optional[float] = None
+            for index, (_, _, chat_id, chat_limited, endpoint, future) in enumerate(self._waiting):
+                if future.done():
+                    # Запрос отменен вызывающим
+                    chosen = index
+                    break
+                endpoint_delay = self._endpoint_delay(endpoint, now)
+                if endpoint_delay > 0:
+                    next_delay = endpoint_delay if next_delay is None else min(next_delay, endpoint_delay)
+                    continue
+                if chat_id is None:
+                    chosen = index
+                    break
+                if chat_limited:
+                    chat_delay = self._chat_bucket(chat_id).delay(now)
+                else:
+                    bucket = self._chats.get(chat_id)
+                    chat_delay = bucket.blocked_delay(now) if bucket is not None else 0.0
+                if chat_delay <= 0:
+                    chosen = index
+                    break
+                next_delay = chat_delay if next_delay is None else min(next_delay, chat_delay)
+
+            if chosen is None:
+                return next_delay
+
+            _, _, chat_id, chat_limited, _, future = self._waiting.pop(chosen)
+            if future.done():
+                continue
+            self._global.take(now)
+            if chat_id is not None and chat_limited:
+                self._chat_bucket(chat_id).take(now)
+            future.set_result(None)
+
+        return None
+
+    async def _run(self) -> None:
+        while True:
+            delay = self._dispatch()
+            metrics.set_gauge("send_queue_depth", len(self._waiting))
+            self._wakeup.clear()
+            if delay is None:
+                await self._wakeup.wait()
+            else:
+                try:
+                    await asyncio.wait_for(self._wakeup.wait(), delay)
+                except asyncio.TimeoutError:
+                    pass
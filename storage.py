@@ -0,0 +1,545 @@
+"""
+Модуль с хранилищами данных бота: прогресс прохождения теста, журнал ответов,
+результаты тестов, статусы и языки пользователей.
+
+Обработчики работают только с интерфейсом Storage, поэтому хранилище можно
+заменить, не меняя обработчиков: InMemoryStorage держит все в памяти (для
+замеров и отладки), SQLiteStorage - рабочее хранилище на SQLite. Новое
+хранилище (например, сетевое) достаточно унаследовать от Storage.
+"""
+import json
+import logging
+import os
+import sqlite3
+import threading
+import time
+from abc import ABC, abstractmethod
+from concurrent.futures import Future
+from contextlib import closing
+from pathlib import Path
+from typing import Dict, Any, List, Optional, Tuple, Union
+
+from answer_log import AnswerLog, apply_event, count_answers, EVENT_ANSWER, EVENT_BACK, EVENT_START
+from db import BatchWriter, ConnectionPool, DEFAULT_POOL_SIZE
+from localization import DEFAULT_LANGUAGE
+from migrations import migrate_all
+from progress_store import ProgressStore, ProgressCache
+
+# Пересчитывает статистику ответов пользователя по таблице test_answers (параметры: user_id, user_id)
+REFRESH_ANSWER_STATS_SQL = '''
+    INSERT INTO answer_stats (user_id, option_1, option_2, option_3, option_4, total)
+    SELECT ?, COALESCE(SUM(option = 1), 0), COALESCE(SUM(option = 2), 0),
+           COALESCE(SUM(option = 3), 0), COALESCE(SUM(option = 4), 0), COUNT(*)
+    FROM test_answers WHERE user_id = ?
+    ON CONFLICT(user_id) DO UPDATE SET
+        option_1 = excluded.option_1,
+        option_2 = excluded.option_2,
+        option_3 = excluded.option_3,
+        option_4 = excluded.option_4,
+        total = excluded.total
+'''
+
+# Пользователи, у которых счетчики статистики не сходятся с количеством ответов
+MISMATCHED_ANSWER_STATS_SQL = '''
+    SELECT s.user_id FROM answer_stats s
+    WHERE s.total != (SELECT COUNT(*) FROM test_answers a WHERE a.user_id = s.user_id)
+'''
+
+
+def _completed_future() -> Future:
+    """
+    Возвращает уже завершенный Future (для хранилищ, которые пишут сразу)
+    """
+    future: Future = Future()
+    future.set_result(None)
+    return future
+
+
+class Storage(ABC):
+    """
+    Интерфейс хранилища данных бота.
+
+    Методы прогресса, журнала ответов и статистики блокирующие: обработчики
+    вызывают их через DatabaseExecutor (read - для методов, которые только читают,
+    write - для остальных). Методы записи результатов, статусов и языков только
+    ставят запись в очередь и возвращают Future, который завершается, когда запись
+    стала постоянной; их, как и get_user_language (язык читается из памяти), можно
+    вызывать прямо из цикла событий.
+    """
+
+    def open(self) -> None:
+        """
+        Подготавливает хранилище к работе
+        """
+
+    def close(self) -> None:
+        """
+        Записывает накопленные изменения и освобождает ресурсы
+        """
+
+    # Прогресс прохождения теста
+
+    @abstractmethod
+    def load_progress(self, user_id: int) -> Dict[str, Any]:
+        """
+        Загружает прогресс пользователя (пустой словарь, если прогресса нет)
+        """
+
+    @abstractmethod
+    def save_progress(self, user_id: int, data: Dict[str, Any]) -> None:
+        """
+        Сохраняет прогресс пользователя
+        """
+
+    @abstractmethod
+    def clear_progress(self, user_id: int) -> None:
+        """
+        Удаляет прогресс пользователя
+        """
+
+    # Журнал ответов
+
+    @abstractmethod
+    def start_attempt(self, user_id: int) -> int:
+        """
+        Отмечает начало новой попытки прохождения теста
+
+        Returns:
+            int: Номер попытки, уникальный для пользователя
+        """
+
+    @abstractmethod
+    def append_answer(self, user_id: int, question_index: int, option: str) -> None:
+        """
+        Записывает ответ пользователя на вопрос
+        """
+
+    @abstractmethod
+    def append_back(self, user_id: int, question_index: int) -> None:
+        """
+        Записывает возврат пользователя к вопросу question_index
+        """
+
+    @abstractmethod
+    def get_answer_state(self, user_id: int) -> Tuple[List[str], Dict[str, int]]:
+        """
+        Возвращает текущие ответы пользователя и статистику по ним
+        """
+
+    # Результаты тестов и статусы
+
+    @abstractmethod
+    def save_answer(self, user_id: int, question_number: int, answer: str) -> Future:
+        """
+        Сохраняет отдельный ответ пользователя
+        """
+
+    @abstractmethod
+    def save_dominant_type(self, user_id: int, dominant_type: str) -> Future:
+        """
+        Сохраняет доминирующий тип пользователя
+        """
+
+    @abstractmethod
+    def save_test_results(self, user_id: int, username: str, first_name: str, answers: List[str]) -> Future:
+        """
+        Сохраняет итоговые ответы первого теста и статистику по ним
+        """
+
+    @abstractmethod
+    def get_answer_stats(self, user_id: int) -> Optional[Dict[str, int]]:
+        """
+        Возвращает статистику итоговых ответов по вариантам "1"-"4" (None, если результатов нет)
+        """
+
+    @abstractmethod
+    def update_test_status(self, user_id: int, status: str) -> Future:
+        """
+        Обновляет статус теста пользователя
+        """
+
+    # Языки пользователей
+
+    @abstractmethod
+    def get_user_language(self, user_id: int) -> str:
+        """
+        Возвращает выбранный пользователем язык
+        """
+
+    @abstractmethod
+    def save_user_language(self, user_id: int, language: str) -> Future:
+        """
+        Сохраняет выбранный пользователем язык
+        """
+
+
+class InMemoryStorage(Storage):
+    """
+    Хранилище в памяти процесса: данные теряются при перезапуске.
+
+    Прогресс хранится в виде JSON-строк, как и в SQLite, чтобы обработчики
+    получали копии данных и вели себя так же, как с рабочим хранилищем.
+    """
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        self._progress: Dict[int, str] = {}
+        self._answer_logs: Dict[int, List[str]] = {}
+        self._attempts = 0
+        self._answers: Dict[Tuple[int, int], str] = {}
+        self._results: Dict[int, Dict[str, Any]] = {}
+        self._statuses: Dict[int, str] = {}
+        self._languages: Dict[int, str] = {}
+
+    def load_progress(self, user_id: int) -> Dict[str, Any]:
+        with self._lock:
+            payload = self._progress.get(user_id)
+        return json.loads(payload) if payload is not None else {}
+
+    def save_progress(self, user_id: int, data: Dict[str, Any]) -> None:
+        payload = json.dumps(data)
+        with self._lock:
+            self._progress[user_id] = payload
+
+    def clear_progress(self, user_id: int) -> None:
+        with self._lock:
+            self._progress.pop(user_id, None)
+
+    def _apply(self, user_id: int, kind: str, question_index: Optional[int] = None, option: Optional[str] = None) -> None:
+        with self._lock:
+            self._answer_logs[user_id] = apply_event(self._answer_logs.get(user_id, []), kind, question_index, option)
+
+    def start_attempt(self, user_id: int) -> int:
+        self._apply(user_id, EVENT_START)
+        with self._lock:
+            self._attempts += 1
+            return self._attempts
+
+    def append_answer(self, user_id: int, question_index: int, option: str) -> None:
+        self._apply(user_id, EVENT_ANSWER, question_index, str(option))
+
+    def append_back(self, user_id: int, question_index: int) -> None:
+        self._apply(user_id, EVENT_BACK, question_index)
+
+    def get_answer_state(self, user_id: int) -> Tuple[List[str], Dict[str, int]]:
+        with self._lock:
+            answers = list(self._answer_logs.get(user_id, []))
+        return answers, count_answers(answers)
+
+    def save_answer(self, user_id: int, question_number: int, answer: str) -> Future:
+        with self._lock:
+            self._answers[(user_id, question_number)] = answer
+        return _completed_future()
+
+    def save_dominant_type(self, user_id: int, dominant_type: str) -> Future:
+        with self._lock:
+            self._results.setdefault(user_id, {})["dominant_type"] = dominant_type
+        return _completed_future()
+
+    def save_test_results(self, user_id: int, username: str, first_name: str, answers: List[str]) -> Future:
+        with self._lock:
+            self._results.setdefault(user_id, {}).update(
+                username=username,
+                first_name=first_name,
+                answers=[str(answer) for answer in answers],
+                timestamp=int(time.time())
+            )
+        return _completed_future()
+
+    def get_answer_stats(self, user_id: int) -> Optional[Dict[str, int]]:
+        with self._lock:
+            answers = self._results.get(user_id, {}).get("answers")
+        return count_answers(answers) if answers is not None else None
+
+    def update_test_status(self, user_id: int, status: str) -> Future:
+        with self._lock:
+            self._statuses[user_id] = status
+        return _completed_future()
+
+    def get_user_language(self, user_id: int) -> str:
+        return self._languages.get(user_id, DEFAULT_LANGUAGE)
+
+    def save_user_language(self, user_id: int, language: str) -> Future:
+        self._languages[user_id] = language
+        return _completed_future()
+
+
+class SQLiteStorage(Storage):
+    """
+    Рабочее хранилище на SQLite.
+
+    Результаты, статусы и языки хранятся в базе результатов и записываются
+    групповыми коммитами. Прогресс и журнал ответов хранятся в отдельной базе,
+    прогресс активных сессий кэшируется в памяти. Языки всех пользователей
+    загружаются в память при запуске, поэтому их чтение не обращается к диску.
+    """
+
+    def __init__(
+        self,
+        results_path: Union[str, Path],
+        progress_path: Union[str, Path],
+        progress_journal_path: Union[str, Path],
+        pool_size: int = DEFAULT_POOL_SIZE,
+        legacy_progress_file: Optional[Union[str, Path]] = None,
+        legacy_language_file: Optional[Union[str, Path]] = None,
+        batch_max_size: int = 100,
+        batch_max_delay: float = 0.005,
+        progress_cache_size: int = 10000,
+        progress_cache_ttl: float = 30 * 60,
+        progress_flush_interval: float = 5.0
+    ):
+        """
+        Args:
+            results_path: Путь к базе результатов тестов
+            progress_path: Путь к базе прогресса и журнала ответов
+            progress_journal_path: Путь к журналу изменений прогресса
+            pool_size: Количество соединений в пуле каждой базы
+            legacy_progress_file: Старый JSON-файл с прогрессом (для переноса данных)
+            legacy_language_file: Старая база data/bot.db с языками пользователей (для переноса данных)
+            batch_max_size: Максимальное количество записей в одном групповом коммите
+            batch_max_delay: Сколько секунд ждать остальные записи группового коммита
+            progress_cache_size: Максимальное количество сессий в кэше прогресса
+            progress_cache_ttl: Через сколько секунд неактивная сессия вытесняется из кэша
+            progress_flush_interval: Интервал (в секундах) сброса прогресса в базу
+        """
+        # Пулы соединений принадлежат хранилищу: несколько хранилищ в одном процессе не мешают друг другу
+        self.results_pool = ConnectionPool(results_path, size=pool_size)
+        self.progress_pool = ConnectionPool(progress_path, size=pool_size)
+        self.legacy_language_file = Path(legacy_language_file) if legacy_language_file else None
+
+        self.results_writer = BatchWriter(
+            self.results_pool,
+            name="results",
+            max_batch=batch_max_size,
+            max_delay=batch_max_delay
+        )
+        self.progress = ProgressCache(
+            ProgressStore(self.progress_pool, legacy_file=legacy_progress_file),
+            journal_path=progress_journal_path,
+            max_entries=progress_cache_size,
+            ttl=progress_cache_ttl,
+            flush_interval=progress_flush_interval
+        )
+        self.answer_log = AnswerLog(self.progress_pool)
+
+        # Языки всех пользователей (user_id -> код языка)
+        self._languages: Dict[int, str] = {}
+
+    def open(self) -> None:
+        """
+        Открывает соединения, применяет миграции, загружает языки пользователей
+        и проигрывает журнал прогресса
+        """
+        self.results_pool.open()
+        self.progress_pool.open()
+        try:
+            migrate_all({"results": self.results_pool, "progress": self.progress_pool})
+            logging.info("База данных инициализирована успешно")
+        except Exception as e:
+            logging.error(f"Ошибка при инициализации базы данных: {e}")
+        self.results_writer.start()
+        self._load_languages()
+        self._repair_answer_stats()
+        self.progress.open()
+        self._seed_answer_log()
+
+    def close(self) -> None:
+        self.results_writer.stop()
+        self.progress.close()
+        self.results_pool.close()
+        self.progress_pool.close()
+
+    # Прогресс прохождения теста
+
+    def load_progress(self, user_id: int) -> Dict[str, Any]:
+        return self.progress.load(user_id)
+
+    def save_progress(self, user_id: int, data: Dict[str, Any]) -> None:
+        self.progress.save(user_id, data)
+
+    def clear_progress(self, user_id: int) -> None:
+        self.progress.clear(user_id)
+
+    # Журнал ответов
+
+    def start_attempt(self, user_id: int) -> int:
+        return self.answer_log.start_attempt(user_id)
+
+    def append_answer(self, user_id: int, question_index: int, option: str) -> None:
+        self.answer_log.append_answer(user_id, question_index, option)
+
+    def append_back(self, user_id: int, question_index: int) -> None:
+        self.answer_log.append_back(user_id, question_index)
+
+    def get_answer_state(self, user_id: int) -> Tuple[List[str], Dict[str, int]]:
+        return self.answer_log.get_state(user_id)
+
+    def _seed_answer_log(self) -> None:
+        """
+        Переносит в журнал ответы из прогресса, сохраненного до появления журнала
+        (выполняется при запуске, после проигрывания журнала прогресса и переноса старого файла):
+        иначе следующий ответ такой сессии попал бы в журнал не на свое место
+        """
+        with self.progress_pool.connection() as conn:
+            rows = conn.execute(
+                "SELECT user_id, data FROM user_progress WHERE data LIKE '%\"answers\"%'"
+            ).fetchall()
+
+        changes: Dict[int, Optional[str]] = {}
+        for user_id, payload in rows:
+            data = json.loads(payload)
+            if "answers" not in data:
+                continue
+            self.answer_log.seed(user_id, data.pop("answers"))
+            data.pop("answer_stats", None)
+            changes[user_id] = json.dumps(data)
+
+        if changes:
+            self.progress.store.apply(changes)
+            logging.info(f"Ответы {len(changes)} незавершенных сессий перенесены из прогресса в журнал ответов")
+
+    # Результаты тестов и статусы
+
+    def save_answer(self, user_id: int, question_number: int, answer: str) -> Future:
+        return self.results_writer.submit(
+            'INSERT OR REPLACE INTO answers (user_id, question_number, answer, timestamp) VALUES (?, ?, ?, ?)',
+            (user_id, question_number, answer, int(time.time())),
+            description=f"ответ пользователя {user_id} на вопрос {question_number}"
+        )
+
+    def save_dominant_type(self, user_id: int, dominant_type: str) -> Future:
+        return self.results_writer.submit(
+            "INSERT INTO test_results (user_id, dominant_type, timestamp) VALUES (?, ?, ?) "
+            "ON CONFLICT(user_id) DO UPDATE SET dominant_type = excluded.dominant_type, timestamp = excluded.timestamp",
+            (user_id, dominant_type, int(time.time())),
+            description=f"доминирующий тип пользователя {user_id}"
+        )
+
+    def save_test_results(self, user_id: int, username: str, first_name: str, answers: List[str]) -> Future:
+        """
+        Сохраняет результаты теста одной группой записей: строку результата,
+        ответы по строке на вопрос и пересчитанную статистику
+        """
+        statements = [
+            (
+                '''
+                    INSERT INTO test_results (user_id, username, first_name, timestamp)
+                    VALUES (?, ?, ?, ?)
+                    ON CONFLICT(user_id) DO UPDATE SET
+                        username = excluded.username,
+                        first_name = excluded.first_name,
+                        timestamp = excluded.timestamp
+                ''',
+                (user_id, username, first_name, int(time.time()))
+            ),
+            ("DELETE FROM test_answers WHERE user_id = ?", (user_id,)),
+        ]
+        statements.extend(
+            ("INSERT INTO test_answers (user_id, question_index, option) VALUES (?, ?, ?)", (user_id, question_index, int(answer)))
+            for question_index, answer in enumerate(answers)
+        )
+        statements.append((REFRESH_ANSWER_STATS_SQL, (user_id, user_id)))
+        return self.results_writer.submit_group(statements, description=f"результаты теста пользователя {user_id}")
+
+    @staticmethod
+    def _load_answer_stats(conn: sqlite3.Connection, user_id: int) -> Optional[Dict[str, int]]:
+        row = conn.execute(
+            "SELECT option_1, option_2, option_3, option_4 FROM answer_stats WHERE user_id = ?",
+            (user_id,)
+        ).fetchone()
+        if row is None:
+            return None
+        return {str(option): count for option, count in enumerate(row, start=1)}
+
+    def _repair_answer_stats(self) -> None:
+        """
+        Пересчитывает счетчики, которые не сходятся с количеством ответов (выполняется при запуске)
+        """
+        with self.results_pool.connection() as conn:
+            user_ids = [row[0] for row in conn.execute(MISMATCHED_ANSWER_STATS_SQL).fetchall()]
+            if user_ids:
+                with conn:
+                    conn.executemany(REFRESH_ANSWER_STATS_SQL, [(user_id, user_id) for user_id in user_ids])
+                logging.warning(f"Пересчитана статистика ответов {len(user_ids)} пользователей")
+
+    def get_answer_stats(self, user_id: int) -> Optional[Dict[str, int]]:
+        """
+        Возвращает статистику итоговых ответов. Если счетчики не сходятся
+        с количеством ответов, статистика считается по самим ответам
+        (счетчики пересчитываются при следующем запуске).
+        """
+        with self.results_pool.connection() as conn:
+            row = conn.execute(
+                "SELECT total, (SELECT COUNT(*) FROM test_answers WHERE user_id = ?) FROM answer_stats WHERE user_id = ?",
+                (user_id, user_id)
+            ).fetchone()
+            if row is None:
+                return None
+
+            total, answers_count = row
+            if total != answers_count:
+                logging.warning(
+                    f"Количество ответов в статистике ({total}) не соответствует количеству ответов пользователя ({answers_count})"
+                )
+                counts = dict(conn.execute(
+                    "SELECT option, COUNT(*) FROM test_answers WHERE user_id = ? GROUP BY option",
+                    (user_id,)
+                ).fetchall())
+                return {str(option): counts.get(option, 0) for option in range(1, 5)}
+
+            return self._load_answer_stats(conn, user_id)
+
+    def update_test_status(self, user_id: int, status: str) -> Future:
+        return self.results_writer.submit(
+            "INSERT OR REPLACE INTO test_status (user_id, status, timestamp) VALUES (?, ?, ?)",
+            (user_id, status, int(time.time())),
+            description=f"статус теста пользователя {user_id}"
+        )
+
+    # Языки пользователей
+
+    def _load_languages(self) -> None:
+        """
+        Загружает языки всех пользователей в память (и переносит их из старой базы data/bot.db)
+        """
+        if self.legacy_language_file and self.legacy_language_file.exists():
+            self._import_legacy_languages()
+
+        with self.results_pool.connection() as conn:
+            rows = conn.execute("SELECT user_id, language FROM user_languages").fetchall()
+
+        self._languages.clear()
+        self._languages.update((user_id, language) for user_id, language in rows if language)
+        logging.info(f"Загружены языки {len(self._languages)} пользователей")
+
+    def _import_legacy_languages(self) -> None:
+        """
+        Переносит языки пользователей из старой базы data/bot.db и переименовывает файл
+        """
+        legacy_file = self.legacy_language_file
+        try:
+            with closing(sqlite3.connect(legacy_file)) as legacy:
+                rows = legacy.execute("SELECT user_id, language FROM user_languages").fetchall()
+
+            # Старая база была единственным местом, куда записывался язык, поэтому ее данные главнее
+            with self.results_pool.transaction() as conn:
+                conn.executemany(
+                    "INSERT OR REPLACE INTO user_languages (user_id, language) VALUES (?, ?)",
+                    rows
+                )
+
+            os.replace(legacy_file, legacy_file.with_suffix(".db.migrated"))
+            logging.info(f"Перенесены языки {len(rows)} пользователей из {legacy_file}")
+        except Exception as e:
+            logging.error(f"Ошибка при переносе языков пользователей из {legacy_file}: {e}")
+
+    def get_user_language(self, user_id: int) -> str:
+        return self._languages.get(user_id, DEFAULT_LANGUAGE)
+
+    def save_user_language(self, user_id: int, language: str) -> Future:
+        self._languages[user_id] = language
+        return self.results_writer.submit(
+            "INSERT OR REPLACE INTO user_languages (user_id, language) VALUES (?, ?)",
+            (user_id, language),
+            description=f"язык пользователя {user_id}"
+        )
@@ -0,0 +1,65 @@
+import asyncio
+import unittest
+from unittest import mock
+
+try:
+    import bot
+except ImportError as e:
+    # bot.py зависит от python-telegram-bot и httpx
+    raise unittest.SkipTest(f"bot.py недоступен: {e}")
+
+
+class SendAdminNotificationTest(unittest.TestCase):
+
+    def setUp(self):
+        self.context = mock.Mock()
+        self.context.bot = mock.AsyncMock()
+
+    def send(self, **kwargs):
+        return asyncio.run(bot.send_admin_notification(self.context, "Новый скриншот", **kwargs))
+
+    def test_photo_is_sent_by_file_id(self):
+        self.assertTrue(self.send(file_id="photo-id"))
+
+        self.context.bot.send_photo.assert_awaited_once()
+        self.assertEqual(self.context.bot.send_photo.await_args.kwargs["photo"], "photo-id")
+        self.assertEqual(self.context.bot.send_photo.await_args.kwargs["chat_id"], bot.ADMIN_ID)
+        # Файл не скачивается и не загружается заново
+        self.context.bot.get_file.assert_not_called()
+        self.context.bot.send_document.assert_not_called()
+
+    def test_document_is_sent_as_document(self):
+        self.assertTrue(self.send(file_id="document-id", is_document=True))
+
+        self.assertEqual(self.context.bot.send_document.await_args.kwargs["document"], "document-id")
+        self.context.bot.send_photo.assert_not_called()
+        self.context.bot.get_file.assert_not_called()
+
+    def test_falls_back_to_text(self):
+        self.context.bot.send_photo.side_effect = RuntimeError("файл недоступен")
+
+        with self.assertLogs(level="ERROR"):
+            self.assertTrue(self.send(file_id="photo-id"))
+        self.assertEqual(self.context.bot.send_message.await_args.kwargs["text"], "Новый скриншот")
+
+
+class ScheduleScreenshotArchiveTest(unittest.TestCase):
+
+    def test_archive_is_disabled(self):
+        context = mock.Mock()
+        with mock.patch.object(bot, "ARCHIVE_SCREENSHOTS", False):
+            bot.schedule_screenshot_archive(context, 1, "photo-id")
+        context.application.create_task.assert_not_called()
+
+    def test_archive_runs_in_background(self):
+        context = mock.Mock()
+        archive = mock.Mock(return_value="archive-coroutine")
+        with mock.patch.object(bot, "ARCHIVE_SCREENSHOTS", True), mock.patch.object(bot, "archive_screenshot", archive):
+            bot.schedule_screenshot_archive(context, 1, "photo-id")
+
+        archive.assert_called_once_with(context.bot, 1, "photo-id")
+        context.application.create_task.assert_called_once_with("archive-coroutine")
+
+
+if __name__ == "__main__":
+    unittest.main()
@@ -0,0 +1,58 @@
+import json
+import tempfile
+import unittest
+from pathlib import Path
+
+from answer_log import EVENT_ANSWER, EVENT_BACK, apply_event
+from storage import SQLiteStorage
+
+
+class ApplyEventTest(unittest.TestCase):
+
+    def test_answer_replaces_later_answers(self):
+        self.assertEqual(apply_event(["1", "2", "3"], EVENT_ANSWER, 1, "4"), ["1", "4"])
+
+    def test_answer_after_gap_is_rejected(self):
+        with self.assertLogs(level="ERROR"):
+            self.assertEqual(apply_event(["1"], EVENT_ANSWER, 3, "2"), ["1"])
+
+    def test_back(self):
+        self.assertEqual(apply_event(["1", "2", "3"], EVENT_BACK, 1, None), ["1"])
+
+
+class LegacyProgressTest(unittest.TestCase):
+    # Прогресс, сохраненный до появления журнала ответов: ответы хранятся в нем самом
+    LEGACY_PROGRESS = {"current_question": 2, "answers": ["3", "1"], "answer_stats": {"1": 1, "2": 0, "3": 1, "4": 0}}
+
+    def open_storage(self, root, **kwargs):
+        storage = SQLiteStorage(root / "results.db", root / "progress.db", root / "progress.journal", **kwargs)
+        storage.open()
+        self.addCleanup(storage.close)
+        return storage
+
+    def test_saved_progress_is_seeded_at_open(self):
+        with tempfile.TemporaryDirectory() as directory:
+            root = Path(directory)
+            storage = self.open_storage(root)
+            storage.save_progress(7, dict(self.LEGACY_PROGRESS))
+            storage.close()
+
+            storage = self.open_storage(root)
+            self.assertEqual(storage.load_progress(7), {"current_question": 2})
+            storage.append_answer(7, 2, "4")
+            answers, stats = storage.get_answer_state(7)
+            self.assertEqual(answers, ["3", "1", "4"])
+            self.assertEqual(stats, {"1": 1, "2": 0, "3": 1, "4": 1})
+
+    def test_legacy_file_is_seeded_at_open(self):
+        with tempfile.TemporaryDirectory() as directory:
+            root = Path(directory)
+            legacy_file = root / "user_progress.json"
+            legacy_file.write_text(json.dumps({"7": self.LEGACY_PROGRESS}))
+            storage = self.open_storage(root, legacy_progress_file=legacy_file)
+            self.assertEqual(storage.get_answer_state(7)[0], ["3", "1"])
+            self.assertEqual(storage.load_progress(7), {"current_question": 2})
+
+
+if __name__ == "__main__":
+    unittest.main()
@@ -0,0 +1,117 @@
+import asyncio
+import unittest
+
+from image_validation import (
+    REJECT_NOT_IMAGE, REJECT_TOO_LARGE, SNIFF_BYTES, BoundedBuffer, ImageRejected,
+    check_declared, read_image, sniff_image, sniff_image_type,
+)
+
+PNG = b"\x89PNG\r\n\x1a\n" + b"\x00" * 40
+JPEG = b"\xff\xd8\xff\xe0" + b"\x00" * 40
+
+
+async def stream(*chunks):
+    for chunk in chunks:
+        yield chunk
+
+
+class SniffImageTypeTest(unittest.TestCase):
+
+    def test_signatures(self):
+        cases = {
+            JPEG: "image/jpeg",
+            PNG: "image/png",
+            b"GIF89a" + b"\x00" * 10: "image/gif",
+            b"RIFF\x00\x00\x00\x00WEBPVP8 ": "image/webp",
+            b"II*\x00": "image/tiff",
+            b"\x00\x00\x00\x18ftypheic": "image/heic",
+            b"\x00\x00\x00\x1cftypavif": "image/avif",
+        }
+        for head, mime_type in cases.items():
+            with self.subTest(mime_type=mime_type):
+                self.assertEqual(sniff_image_type(head), mime_type)
+
+    def test_not_image(self):
+        for head in (b"", b"%PDF-1.7", b"PK\x03\x04", b"\x00\x00\x00\x18ftypisom", b"RIFF\x00\x00\x00\x00WAVE"):
+            with self.subTest(head=head):
+                self.assertIsNone(sniff_image_type(head))
+
+
+class CheckDeclaredTest(unittest.TestCase):
+
+    def test_accepts_image(self):
+        check_declared("image/png", 100, max_bytes=100)
+        check_declared(None, None)
+
+    def test_rejects_declared_type_and_size(self):
+        with self.assertRaises(ImageRejected) as caught:
+            check_declared("application/pdf", 100)
+        self.assertEqual(caught.exception.reason, REJECT_NOT_IMAGE)
+
+        with self.assertRaises(ImageRejected) as caught:
+            check_declared("image/png", 101, max_bytes=100)
+        self.assertEqual(caught.exception.reason, REJECT_TOO_LARGE)
+
+
+class BoundedBufferTest(unittest.TestCase):
+
+    def test_limit(self):
+        buffer = BoundedBuffer(4)
+        buffer.append(b"ab")
+        buffer.append(b"cd")
+        with self.assertRaises(ImageRejected) as caught:
+            buffer.append(b"e")
+        self.assertEqual(caught.exception.reason, REJECT_TOO_LARGE)
+        self.assertEqual(buffer.getvalue(), b"abcd")
+        self.assertEqual(buffer.head(2), b"ab")
+
+
+class ReadImageTest(unittest.TestCase):
+
+    def test_reads_image(self):
+        data, mime_type = asyncio.run(read_image(stream(PNG[:5], PNG[5:])))
+        self.assertEqual((data, mime_type), (PNG, "image/png"))
+
+    def test_short_image(self):
+        self.assertEqual(asyncio.run(read_image(stream(b"GIF89a"))), (b"GIF89a", "image/gif"))
+
+    def test_stops_at_first_chunk_that_is_not_image(self):
+        chunks_read = []
+
+        async def chunks():
+            for chunk in (b"%PDF" + b"\x00" * SNIFF_BYTES, b"\x00" * 1000):
+                chunks_read.append(chunk)
+                yield chunk
+
+        with self.assertRaises(ImageRejected) as caught:
+            asyncio.run(read_image(chunks()))
+        self.assertEqual(caught.exception.reason, REJECT_NOT_IMAGE)
+        self.assertEqual(len(chunks_read), 1)
+
+    def test_too_large(self):
+        with self.assertRaises(ImageRejected) as caught:
+            asyncio.run(read_image(stream(JPEG, JPEG), max_bytes=len(JPEG) + 1))
+        self.assertEqual(caught.exception.reason, REJECT_TOO_LARGE)
+
+
+class SniffImageTest(unittest.TestCase):
+
+    def test_reads_only_head(self):
+        chunks_read = []
+
+        async def chunks():
+            for chunk in (JPEG[:3], JPEG[3:], b"\x00" * 1000):
+                chunks_read.append(chunk)
+                yield chunk
+
+        self.assertEqual(asyncio.run(sniff_image(chunks())), "image/jpeg")
+        self.assertEqual(len(chunks_read), 2)
+
+    def test_not_image(self):
+        with self.assertRaises(ImageRejected) as caught:
+            asyncio.run(sniff_image(stream(b"<html>", b"</html>")))
+        self.assertEqual(caught.exception.reason, REJECT_NOT_IMAGE)
+
+
+if __name__ == "__main__":
+    unittest.main()
@@ -0,0 +1,57 @@
+import unittest
+
+from localization import _compile_template, get_text
+from locales import en, ru
+
+
+class CompileTemplateTest(unittest.TestCase):
+
+    def test_text_without_fields_is_not_compiled(self):
+        self.assertIsNone(_compile_template("Без параметров"))
+
+    def test_fields_are_substituted(self):
+        formatter = _compile_template("Вопрос {current} из {total}")
+        self.assertEqual(formatter({"current": 3, "total": 10}), "Вопрос 3 из 10")
+
+    def test_percent_sign_is_kept(self):
+        formatter = _compile_template("Ответов {count} ({percent}%)")
+        self.assertEqual(formatter({"count": 5, "percent": 50}), "Ответов 5 (50%)")
+
+    def test_escaped_braces_are_kept(self):
+        formatter = _compile_template("{{буквально}} {value}")
+        self.assertEqual(formatter({"value": 1}), "{буквально} 1")
+
+    def test_complex_fields_use_str_format(self):
+        formatter = _compile_template("{value:.1f} {item[0]}")
+        self.assertEqual(formatter({"value": 2.345, "item": ["a"]}), "2.3 a")
+
+
+class GetTextTest(unittest.TestCase):
+
+    def test_formats_with_kwargs(self):
+        self.assertEqual(
+            get_text("question_header", "en", current=2, total=5),
+            en.TEXTS["question_header"].format(current=2, total=5)
+        )
+        self.assertEqual(get_text("question_header", "ru", current=2, total=5), "ВОПРОС 2 из 5")
+
+    def test_without_kwargs_returns_template(self):
+        self.assertEqual(get_text("question_header", "ru"), ru.TEXTS["question_header"])
+
+    def test_missing_parameter_returns_template(self):
+        with self.assertLogs(level="ERROR"):
+            self.assertEqual(get_text("question_header", "ru", current=2), ru.TEXTS["question_header"])
+
+    def test_missing_key_falls_back_to_russian(self):
+        self.assertNotIn("accepted_message", en.TEXTS)
+        self.assertEqual(get_text("accepted_message", "en"), ru.TEXTS["accepted_message"])
+
+    def test_unknown_language_falls_back_to_russian(self):
+        self.assertEqual(get_text("question_header", "xx", current=1, total=2), "ВОПРОС 1 из 2")
+
+    def test_unknown_key(self):
+        self.assertEqual(get_text("no_such_key_for_test", "ru"), "[no_such_key_for_test]")
+
+
+if __name__ == "__main__":
+    unittest.main()
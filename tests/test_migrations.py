@@ -0,0 +1,126 @@
+import json
+import sqlite3
+import tempfile
+import unittest
+from pathlib import Path
+
+from db import ConnectionPool
+from migrations import MIGRATIONS, migrate
+
+
+def create_baseline_database(path):
+    """
+    База результатов в том виде, в каком ее оставляли прежние версии бота:
+    answers создана save_answer_to_db (без первичного ключа, время строкой),
+    в test_results еще нет столбцов, которые init_database добавлял позже
+    """
+    conn = sqlite3.connect(path)
+    conn.executescript('''
+        CREATE TABLE answers (
+            user_id INTEGER,
+            question_number INTEGER,
+            answer TEXT,
+            timestamp DATETIME DEFAULT CURRENT_TIMESTAMP
+        );
+        CREATE TABLE test_results (
+            user_id INTEGER PRIMARY KEY,
+            dominant_type TEXT,
+            timestamp INTEGER
+        );
+        CREATE TABLE user_language (
+            user_id INTEGER PRIMARY KEY,
+            language TEXT
+        );
+    ''')
+    conn.executemany(
+        "INSERT INTO answers (user_id, question_number, answer, timestamp) VALUES (?, ?, ?, ?)",
+        [
+            (1, 1, "2", "2024-01-01 10:00:00"),
+            (1, 1, "3", "2024-01-01 10:05:00"),
+            (1, 2, "1", "2024-01-01 10:06:00"),
+        ]
+    )
+    conn.execute("INSERT INTO test_results (user_id, dominant_type, timestamp) VALUES (1, 'Тип 3', 1700000000)")
+    conn.executemany("INSERT INTO user_language (user_id, language) VALUES (?, ?)", [(1, "en"), (2, None)])
+    conn.commit()
+
+    # Ответы в JSON-столбцах появились в test_results в более поздней версии бота
+    conn.execute("ALTER TABLE test_results ADD COLUMN answers TEXT")
+    conn.execute("ALTER TABLE test_results ADD COLUMN answer_stats TEXT")
+    conn.execute(
+        "UPDATE test_results SET answers = ?, answer_stats = ? WHERE user_id = 1",
+        (json.dumps(["3", "1", "3", "x"]), json.dumps({"1": 5, "2": 0, "3": 0, "4": 0}))
+    )
+    conn.execute(
+        "INSERT INTO test_results (user_id, dominant_type, answers, timestamp) VALUES (2, NULL, 'не JSON', 1700000001)"
+    )
+    conn.commit()
+    conn.close()
+
+
+class ResultsMigrationTest(unittest.TestCase):
+
+    def setUp(self):
+        directory = tempfile.TemporaryDirectory()
+        self.addCleanup(directory.cleanup)
+        self.path = Path(directory.name) / "results.db"
+        create_baseline_database(self.path)
+
+        self.pool = ConnectionPool(self.path, size=1)
+        self.pool.open()
+        self.addCleanup(self.pool.close)
+
+    def query(self, sql):
+        with self.pool.connection() as conn:
+            return conn.execute(sql).fetchall()
+
+    def test_baseline_database_is_migrated_to_latest_version(self):
+        with self.assertLogs(level="WARNING"):
+            self.assertEqual(migrate(self.pool, MIGRATIONS["results"]), 4)
+        self.assertEqual(self.query("PRAGMA user_version"), [(4,)])
+
+        # Для повторных ответов остается последний, время переведено в секунды
+        self.assertEqual(
+            self.query("SELECT user_id, question_number, answer, timestamp FROM answers ORDER BY question_number"),
+            [(1, 1, "3", 1704103500), (1, 2, "1", 1704103560)]
+        )
+        self.assertEqual(self.query("SELECT user_id, language FROM user_languages"), [(1, "en")])
+
+        # Нечисловой ответ и некорректный JSON пропускаются, статистика пересчитана по ответам
+        self.assertEqual(
+            self.query("SELECT user_id, question_index, option FROM test_answers ORDER BY question_index"),
+            [(1, 0, 3), (1, 1, 1), (1, 2, 3)]
+        )
+        self.assertEqual(self.query("SELECT * FROM answer_stats"), [(1, 1, 0, 2, 0, 3)])
+
+        columns = [row[1] for row in self.query("PRAGMA table_info(test_results)")]
+        self.assertEqual(columns, ["user_id", "dominant_type", "username", "first_name", "timestamp"])
+        self.assertEqual(
+            self.query("SELECT user_id, dominant_type, timestamp FROM test_results ORDER BY user_id"),
+            [(1, "Тип 3", 1700000000), (2, None, 1700000001)]
+        )
+        tables = {row[0] for row in self.query("SELECT name FROM sqlite_master WHERE type = 'table'")}
+        self.assertTrue({"full_test_results", "test_status"} <= tables)
+        self.assertNotIn("user_language", tables)
+
+    def test_migrations_are_applied_once(self):
+        with self.assertLogs(level="WARNING"):
+            migrate(self.pool, MIGRATIONS["results"])
+        self.assertEqual(migrate(self.pool, MIGRATIONS["results"]), 4)
+        self.assertEqual(self.query("SELECT COUNT(*) FROM test_answers"), [(3,)])
+
+    def test_failed_migration_is_rolled_back(self):
+        def broken(conn):
+            conn.execute("CREATE TABLE half_done (id INTEGER)")
+            raise sqlite3.OperationalError("ошибка миграции")
+
+        migrations = MIGRATIONS["results"][:1] + [(2, "сломанная миграция", broken)]
+        with self.assertLogs(level="ERROR"), self.assertRaises(sqlite3.OperationalError):
+            migrate(self.pool, migrations)
+
+        self.assertEqual(self.query("PRAGMA user_version"), [(1,)])
+        self.assertEqual(self.query("SELECT name FROM sqlite_master WHERE name = 'half_done'"), [])
+
+
+if __name__ == "__main__":
+    unittest.main()
@@ -0,0 +1,98 @@
+import tempfile
+import unittest
+from pathlib import Path
+from unittest import mock
+
+from db import ConnectionPool
+from migrations import MIGRATIONS, migrate
+from progress_store import ProgressCache, ProgressStore
+
+
+class ProgressCacheJournalTest(unittest.TestCase):
+
+    def setUp(self):
+        directory = tempfile.TemporaryDirectory()
+        self.addCleanup(directory.cleanup)
+        self.root = Path(directory.name)
+        self.journal_path = self.root / "progress.journal"
+
+        self.pool = ConnectionPool(self.root / "progress.db", size=2)
+        self.pool.open()
+        self.addCleanup(self.pool.close)
+        migrate(self.pool, MIGRATIONS["progress"])
+        self.store = ProgressStore(self.pool)
+
+    def open_cache(self, **kwargs):
+        # Большой интервал сброса: в базу изменения попадают только при flush/close
+        cache = ProgressCache(self.store, self.journal_path, flush_interval=3600, **kwargs)
+        cache.open()
+        self.addCleanup(cache.close)
+        return cache
+
+    def test_save_is_journaled_before_flush(self):
+        cache = self.open_cache(sync_interval=0)
+        cache.save(1, {"current_question": 2})
+
+        self.assertEqual(cache.load(1), {"current_question": 2})
+        self.assertIsNone(self.store.load_raw(1))
+        self.assertEqual(self.journal_path.read_text(encoding="utf-8"), '1\t{"current_question": 2}\n')
+
+        cache.flush()
+        self.assertEqual(self.store.load(1), {"current_question": 2})
+        self.assertEqual(self.journal_path.read_text(encoding="utf-8"), "")
+
+    def test_journal_is_replayed_at_open(self):
+        # Журнал, оставшийся после падения процесса: последнее изменение пользователя побеждает
+        self.journal_path.write_text('1\t{"a": 1}\n2\t{"b": 2}\n1\t{"a": 3}\n3\t{"c": 1}\n3\tnull\n', encoding="utf-8")
+
+        cache = self.open_cache()
+
+        self.assertEqual(self.store.load(1), {"a": 3})
+        self.assertEqual(self.store.load(2), {"b": 2})
+        self.assertIsNone(self.store.load_raw(3))
+        self.assertEqual(cache.load(1), {"a": 3})
+
+    def test_truncated_last_line_is_skipped(self):
+        # Процесс упал во время записи последней строки
+        self.journal_path.write_text('1\t{"a": 3}\n2\t{"b": 2}\n1\t{"a": ', encoding="utf-8")
+
+        self.open_cache()
+
+        self.assertEqual(self.store.load(1), {"a": 3})
+        self.assertEqual(self.store.load(2), {"b": 2})
+
+    def test_interrupted_flush_is_replayed(self):
+        # Процесс упал во время записи в базу: журнал уже переименован, новый журнал новее
+        self.journal_path.with_name("progress.journal.flushing").write_text('1\t{"a": 1}\n2\t{"b": 2}\n', encoding="utf-8")
+        self.journal_path.write_text('1\t{"a": 2}\n', encoding="utf-8")
+
+        self.open_cache()
+
+        self.assertEqual(self.store.load(1), {"a": 2})
+        self.assertEqual(self.store.load(2), {"b": 2})
+        self.assertFalse(self.journal_path.with_name("progress.journal.flushing").exists())
+
+    def test_full_journal_is_flushed(self):
+        cache = self.open_cache(max_journal_bytes=64)
+        for question in range(10):
+            cache.save(1, {"current_question": question, "name": "тест"})
+
+        self.assertIsNotNone(self.store.load_raw(1))
+        self.assertLess(self.journal_path.stat().st_size, 64)
+
+    def test_failed_flush_keeps_changes(self):
+        cache = self.open_cache()
+        cache.save(1, {"a": 1})
+
+        with mock.patch.object(self.store, "apply", side_effect=RuntimeError("база недоступна")):
+            with self.assertRaises(RuntimeError):
+                cache.flush()
+
+        self.assertEqual(cache.load(1), {"a": 1})
+        self.assertIn('1\t{"a": 1}\n', self.journal_path.read_text(encoding="utf-8"))
+        cache.flush()
+        self.assertEqual(self.store.load(1), {"a": 1})
+
+
+if __name__ == "__main__":
+    unittest.main()
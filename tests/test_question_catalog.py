@@ -0,0 +1,42 @@
+import unittest
+
+from question_catalog import OPTION_LETTERS, PERMUTATIONS, answer_for_letter, question_permutation
+
+
+class AnswerForLetterTest(unittest.TestCase):
+    USER_ID = 42
+
+    def shown_letter(self, progress, question_number, option):
+        """
+        Буква, под которой вариант option показан пользователю на вопросе question_number
+        """
+        order = PERMUTATIONS[question_permutation(self.USER_ID, progress, question_number)]
+        return OPTION_LETTERS[order.index(option)]
+
+    def test_legacy_progress_migrates_after_first_answer(self):
+        # Прогресс до перехода на вычисляемый порядок: вопрос 3 показан с порядком из current_mapping
+        progress = {"current_question": 3, "current_mapping": {"A": "4", "B": "2", "C": "1", "D": "3"}}
+
+        self.assertEqual(answer_for_letter(self.USER_ID, progress, 3, "A"), "4")
+        self.assertEqual(progress["attempt_id"], 0)
+        self.assertNotIn("current_mapping", progress)
+
+        # Следующие вопросы показываются и разбираются с одним и тем же порядком
+        for question_number in range(4, 8):
+            for option in ("1", "2", "3", "4"):
+                letter = self.shown_letter(progress, question_number, option)
+                self.assertEqual(answer_for_letter(self.USER_ID, progress, question_number, letter), option)
+
+    def test_attempt_progress_uses_seeded_order(self):
+        progress = {"current_question": 0, "attempt_id": 7}
+        for option in ("1", "2", "3", "4"):
+            letter = self.shown_letter(progress, 0, option)
+            self.assertEqual(answer_for_letter(self.USER_ID, progress, 0, letter), option)
+        self.assertEqual(progress["attempt_id"], 7)
+
+    def test_unknown_letter(self):
+        self.assertIsNone(answer_for_letter(self.USER_ID, {"attempt_id": 1}, 0, "E"))
+
+
+if __name__ == "__main__":
+    unittest.main()
@@ -0,0 +1,45 @@
+import json
+import tempfile
+import unittest
+from pathlib import Path
+from unittest import mock
+
+import questions
+
+
+def make_question(text):
+    return {"question": text, "options": {"1": "a", "2": "b", "3": "c", "4": "d"}}
+
+
+class ReloadQuestionsTest(unittest.TestCase):
+
+    def setUp(self):
+        directory = tempfile.TemporaryDirectory()
+        self.addCleanup(directory.cleanup)
+        self.bank = Path(directory.name)
+        for name, value in (("QUESTION_BANK_DIR", self.bank), ("_loaded", {}), ("_parsed", {})):
+            patcher = mock.patch.object(questions, name, value)
+            patcher.start()
+            self.addCleanup(patcher.stop)
+
+    def write_bank(self, *texts):
+        (self.bank / "xx.json").write_text(json.dumps([make_question(text) for text in texts]))
+
+    def test_unchanged_file_is_not_parsed_again(self):
+        self.write_bank("first")
+        loaded = questions.get_questions_by_language("xx")
+        questions.reload_questions("xx")
+        self.assertIs(questions.get_questions_by_language("xx"), loaded)
+
+    def test_changed_file_replaces_previous_version(self):
+        self.write_bank("first")
+        questions.get_questions_by_language("xx")
+
+        self.write_bank("second")
+        questions.reload_questions("xx")
+        self.assertEqual(questions.get_questions_by_language("xx")[0]["question"], "second")
+        self.assertEqual(len(questions._parsed), 1)
+
+
+if __name__ == "__main__":
+    unittest.main()
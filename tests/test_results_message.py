@@ -0,0 +1,44 @@
+import unittest
+
+from results_message import phase_shares, render_results_message
+
+
+class PhaseSharesTest(unittest.TestCase):
+
+    def test_shares(self):
+        self.assertEqual(
+            phase_shares({"1": 1, "2": 3}),
+            [("1", 1, 25.0), ("2", 3, 75.0), ("3", 0, 0.0), ("4", 0, 0.0)]
+        )
+
+    def test_no_answers(self):
+        self.assertEqual(phase_shares({}), [("1", 0, 0), ("2", 0, 0), ("3", 0, 0), ("4", 0, 0)])
+
+
+class RenderResultsMessageTest(unittest.TestCase):
+
+    def test_slots_are_filled_in_phase_order(self):
+        message = render_results_message({"1": 1, "2": 3}, "ru")
+
+        early = message.index("<b>Ответов 1 (25%) Ранняя фаза</b>")
+        middle = message.index("<b>Ответов 3 (75%) Средняя фаза</b>")
+        late = message.index("<b>Ответов 0 (0%) Поздняя фаза</b>")
+        self.assertLess(early, middle)
+        self.assertLess(middle, late)
+        self.assertIn("<b>Ответов 0 (0%) Переход к жёлтому</b>", message)
+
+    def test_percent_is_rounded(self):
+        message = render_results_message({"1": 1, "2": 1, "3": 1}, "en")
+        self.assertEqual(message.count("Answers 1 (33%) "), 3)
+        self.assertIn("<b>Answers 0 (0%) Transition to Yellow</b>", message)
+
+    def test_without_stats_slots_are_empty(self):
+        for answer_stats in (None, {}):
+            message = render_results_message(answer_stats, "en")
+            self.assertIn("<b>Early phase</b>", message)
+            self.assertNotIn("{phase_", message)
+            self.assertNotIn("Answers", message)
+
+
+if __name__ == "__main__":
+    unittest.main()
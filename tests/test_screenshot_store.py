@@ -0,0 +1,93 @@
+import hashlib
+import os
+import tempfile
+import time
+import unittest
+from pathlib import Path
+
+from screenshot_store import ScreenshotStore, extension_for_mime
+
+
+class ExtensionForMimeTest(unittest.TestCase):
+
+    def test_known_types(self):
+        self.assertEqual(extension_for_mime("image/jpeg"), ".jpg")
+        self.assertEqual(extension_for_mime("IMAGE/PNG; charset=binary"), ".png")
+
+    def test_unknown_type(self):
+        self.assertEqual(extension_for_mime(None), ".bin")
+        self.assertEqual(extension_for_mime("application/x-unknown-type"), ".bin")
+
+
+class ScreenshotStoreTest(unittest.TestCase):
+
+    def setUp(self):
+        directory = tempfile.TemporaryDirectory()
+        self.addCleanup(directory.cleanup)
+        self.root = Path(directory.name)
+
+    @staticmethod
+    def set_age(path, seconds):
+        timestamp = time.time() - seconds
+        os.utime(path, (timestamp, timestamp))
+
+    def test_same_content_is_stored_once(self):
+        store = ScreenshotStore(self.root)
+        data = b"\x89PNG\r\n\x1a\n screenshot"
+
+        digest, path, created = store.put(data, "image/png")
+        self.assertTrue(created)
+        self.assertEqual(digest, hashlib.sha256(data).hexdigest())
+        self.assertEqual(path, self.root / digest[:2] / digest[2:4] / f"{digest}.png")
+        self.assertEqual(path.read_bytes(), data)
+
+        # Повторная отправка не пишет файл заново, но продлевает срок хранения
+        self.set_age(path, 3600)
+        self.assertEqual(store.put(data, "image/png"), (digest, path, False))
+        self.assertGreater(path.stat().st_mtime, time.time() - 60)
+        self.assertEqual([name for _, _, names in os.walk(self.root) for name in names], [path.name])
+
+    def test_expired_files_are_removed(self):
+        store = ScreenshotStore(self.root, retention_days=1)
+        _, old_path, _ = store.put(b"old", "image/jpeg")
+        _, new_path, _ = store.put(b"new", "image/jpeg")
+        self.set_age(old_path, 2 * 86400)
+
+        self.assertEqual(store.cleanup(), (1, 3))
+        self.assertFalse(old_path.exists())
+        self.assertTrue(new_path.exists())
+
+    def test_oldest_files_are_evicted_over_quota(self):
+        store = ScreenshotStore(self.root, max_bytes=1000)
+        paths = []
+        for age, fill in enumerate(b"abcd"):
+            _, path, _ = store.put(bytes([fill]) * 300, "image/jpeg")
+            self.set_age(path, 100 - age)
+            paths.append(path)
+
+        # 1200 байт при квоте 1000: удаляются самые старые, пока не останется не больше 90% квоты
+        self.assertEqual(store.cleanup(), (1, 300))
+        self.assertEqual([path.exists() for path in paths], [False, True, True, True])
+
+        # Превышение квоты при записи сразу будит фоновую очистку
+        _, newest, _ = store.put(b"e" * 300, "image/jpeg")
+        self.assertTrue(store._wakeup.is_set())
+        self.assertEqual(store.cleanup(), (1, 300))
+        self.assertEqual([path.exists() for path in paths], [False, False, True, True])
+        self.assertTrue(newest.exists())
+
+    def test_stale_temp_files_are_removed(self):
+        store = ScreenshotStore(self.root)
+        stale = self.root / ".abc.1.1.tmp"
+        fresh = self.root / ".def.1.1.tmp"
+        stale.write_bytes(b"x")
+        fresh.write_bytes(b"x")
+        self.set_age(stale, 2 * 3600)
+
+        self.assertEqual(store.cleanup(), (0, 0))
+        self.assertFalse(stale.exists())
+        self.assertTrue(fresh.exists())
+
+
+if __name__ == "__main__":
+    unittest.main()
@@ -0,0 +1,78 @@
+import asyncio
+import time
+import unittest
+
+from send_scheduler import PRIORITY_HIGH, PRIORITY_NORMAL, SendScheduler
+
+
+class SendSchedulerTest(unittest.TestCase):
+
+    def run_async(self, coroutine):
+        return asyncio.run(coroutine)
+
+    def test_edits_do_not_use_chat_tokens(self):
+        async def scenario():
+            scheduler = SendScheduler(chat_rate=1.0, chat_burst=1.0)
+            started = time.monotonic()
+            # Ответ на нажатие и редактирование не тратят единственный токен чата
+            await scheduler.acquire(5, PRIORITY_HIGH, chat_limited=False)
+            await scheduler.acquire(5, PRIORITY_HIGH, chat_limited=False)
+            await scheduler.acquire(5, PRIORITY_HIGH)
+            elapsed = time.monotonic() - started
+            await scheduler.stop()
+            return elapsed
+
+        self.assertLess(self.run_async(scenario()), 0.5)
+
+    def test_blocked_chat_delays_edits(self):
+        async def scenario():
+            scheduler = SendScheduler()
+            scheduler.block(0.2, 5)
+            started = time.monotonic()
+            await scheduler.acquire(5, PRIORITY_HIGH, chat_limited=False)
+            elapsed = time.monotonic() - started
+            await scheduler.stop()
+            return elapsed
+
+        self.assertGreaterEqual(self.run_async(scenario()), 0.15)
+
+    def test_blocked_endpoint_does_not_delay_other_requests(self):
+        async def scenario():
+            scheduler = SendScheduler()
+            # Ответ 429 на answerCallbackQuery (запрос не к чату)
+            scheduler.block(0.3, None, endpoint="answerCallbackQuery")
+            started = time.monotonic()
+            await scheduler.acquire(5, PRIORITY_HIGH, endpoint="sendMessage")
+            other = time.monotonic() - started
+            await scheduler.acquire(None, PRIORITY_HIGH, chat_limited=False, endpoint="answerCallbackQuery")
+            blocked = time.monotonic() - started
+            await scheduler.stop()
+            return other, blocked
+
+        other, blocked = self.run_async(scenario())
+        self.assertLess(other, 0.1)
+        self.assertGreaterEqual(blocked, 0.25)
+
+    def test_priority_order_within_chat(self):
+        async def scenario():
+            scheduler = SendScheduler(chat_rate=20.0, chat_burst=1.0)
+            await scheduler.acquire(5)
+            order = []
+
+            async def send(name, priority):
+                await scheduler.acquire(5, priority)
+                order.append(name)
+
+            await asyncio.gather(
+                send("normal", PRIORITY_NORMAL),
+                send("answer", PRIORITY_HIGH),
+                send("question", PRIORITY_HIGH),
+            )
+            await scheduler.stop()
+            return order
+
+        self.assertEqual(self.run_async(scenario()), ["answer", "question", "normal"])
+
+
+if __name__ == "__main__":
+    unittest.main()
@@ -0,0 +1,33 @@
+import tempfile
+import unittest
+from pathlib import Path
+
+from storage import SQLiteStorage
+
+
+class SQLiteStorageTest(unittest.TestCase):
+
+    def open_storage(self, root):
+        storage = SQLiteStorage(root / "results.db", root / "progress.db", root / "progress.journal")
+        storage.open()
+        self.addCleanup(storage.close)
+        return storage
+
+    def test_storages_own_their_databases(self):
+        with tempfile.TemporaryDirectory() as first_dir, tempfile.TemporaryDirectory() as second_dir:
+            first = self.open_storage(Path(first_dir))
+            second = self.open_storage(Path(second_dir))
+
+            first.save_progress(1, {"current_question": 3})
+            first.save_user_language(1, "en").result()
+            second.close()
+
+            # Закрытие второго хранилища не затрагивает соединения первого
+            first.progress.flush()
+            self.assertEqual(first.load_progress(1), {"current_question": 3})
+            self.assertEqual(first.get_user_language(1), "en")
+            self.assertEqual(second.load_progress(1), {})
+
+
+if __name__ == "__main__":
+    unittest.main()
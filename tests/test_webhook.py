@@ -0,0 +1,103 @@
+import asyncio
+import json
+import unittest
+
+from webhook import MAX_BODY_SIZE, SECRET_TOKEN_HEADER, WebhookServer
+
+SECRET = "test-secret_1"
+
+
+class WebhookServerTest(unittest.TestCase):
+
+    def run_scenario(self, requests):
+        """
+        Запускает сервер на свободном порту, отправляет запросы по одному соединению на запрос
+
+        Returns:
+            Tuple[List[int], List[dict]]: Статусы ответов и обновления, переданные обработчику
+        """
+        received = []
+
+        async def handle_update(update):
+            received.append(update)
+
+        async def scenario():
+            server = WebhookServer(handle_update, SECRET, host="127.0.0.1", port=0)
+            await server.start()
+            port = server._server.sockets[0].getsockname()[1]
+            statuses = []
+            try:
+                for request in requests:
+                    reader, writer = await asyncio.open_connection("127.0.0.1", port)
+                    writer.write(request)
+                    await writer.drain()
+                    status_line = await reader.readline()
+                    statuses.append(int(status_line.split()[1]))
+                    writer.close()
+            finally:
+                await server.stop()
+            return statuses
+
+        return asyncio.run(scenario()), received
+
+    @staticmethod
+    def request(body, secret=SECRET, path="/telegram", method="POST", content_length=None):
+        headers = [
+            f"{method} {path} HTTP/1.1",
+            "Host: localhost",
+            f"Content-Length: {len(body) if content_length is None else content_length}",
+            "Connection: close",
+        ]
+        if secret is not None:
+            headers.append(f"{SECRET_TOKEN_HEADER}: {secret}")
+        return ("\r\n".join(headers) + "\r\n\r\n").encode("latin-1") + body
+
+    def test_update_is_accepted(self):
+        update = {"update_id": 1, "message": {"text": "привет"}}
+        statuses, received = self.run_scenario([self.request(json.dumps(update).encode())])
+
+        self.assertEqual(statuses, [200])
+        self.assertEqual(received, [update])
+
+    def test_wrong_secret_is_forbidden(self):
+        body = json.dumps({"update_id": 1}).encode()
+        with self.assertLogs(level="WARNING"):
+            statuses, received = self.run_scenario([
+                self.request(body, secret="wrong"),
+                self.request(body, secret=None),
+            ])
+
+        self.assertEqual(statuses, [403, 403])
+        self.assertEqual(received, [])
+
+    def test_oversize_body_is_rejected(self):
+        # Тело не читается: ответ отправляется по одному заголовку Content-Length
+        statuses, received = self.run_scenario([self.request(b"", content_length=MAX_BODY_SIZE + 1)])
+
+        self.assertEqual(statuses, [413])
+        self.assertEqual(received, [])
+
+    def test_bad_json_is_rejected(self):
+        statuses, received = self.run_scenario([
+            self.request(b"{not json"),
+            self.request(b"[1, 2]"),
+        ])
+
+        self.assertEqual(statuses, [400, 400])
+        self.assertEqual(received, [])
+
+    def test_wrong_path_and_method(self):
+        statuses, _ = self.run_scenario([
+            self.request(b"{}", path="/other"),
+            self.request(b"", method="GET"),
+        ])
+
+        self.assertEqual(statuses, [404, 405])
+
+    def test_invalid_secret_token_is_refused(self):
+        with self.assertRaises(ValueError):
+            WebhookServer(lambda update: None, "bad token!")
+
+
+if __name__ == "__main__":
+    unittest.main()
@@ -0,0 +1,87 @@
+"""
+Отправка записанных обновлений Telegram на локальный вебхук бота (BOT_MODE=webhook).
+
+Файл с обновлениями - JSON-массив обновлений или по одному обновлению в строке
+(JSON Lines), например ответы getUpdates или обновления, сохраненные из логов.
+
+Запуск из корня проекта:
+    python tools/replay_updates.py updates.json --url http://127.0.0.1:8443/telegram
+
+Секретный токен по умолчанию берется из переменной окружения WEBHOOK_SECRET.
+"""
+import argparse
+import json
+import os
+import sys
+import time
+import urllib.error
+import urllib.request
+from typing import Any, Dict, List
+
+SECRET_TOKEN_HEADER = "X-Telegram-Bot-Api-Secret-Token"
+
+
+def load_updates(path: str) -> List[Dict[str, Any]]:
+    """
+    Читает обновления из JSON-массива, ответа getUpdates или JSON Lines
+    """
+    with open(path, encoding="utf-8") as f:
+        text = f.read()
+
+    stripped = text.lstrip()
+    if stripped.startswith("["):
+        return json.loads(text)
+    if stripped.startswith("{"):
+        try:
+            data = json.loads(text)
+        except ValueError:
+            data = None
+        if isinstance(data, dict):
+            # Ответ getUpdates: {"ok": true, "result": [...]}
+            return data["result"] if "result" in data else [data]
+    return [json.loads(line) for line in text.splitlines() if line.strip()]
+
+
+def post_update(url: str, secret: str, update: Dict[str, Any]) -> int:
+    """
+    Отправляет одно обновление и возвращает HTTP-статус ответа
+    """
+    request = urllib.request.Request(
+        url,
+        data=json.dumps(update).encode("utf-8"),
+        headers={"Content-Type": "application/json", SECRET_TOKEN_HEADER: secret},
+        method="POST",
+    )
+    try:
+        with urllib.request.urlopen(request, timeout=10) as response:
+            return response.status
+    except urllib.error.HTTPError as e:
+        return e.code
+
+
+def main() -> int:
+    parser = argparse.ArgumentParser(description="Отправка записанных обновлений на вебхук бота")
+    parser.add_argument("file", help="Файл с обновлениями (JSON-массив или JSON Lines)")
+    parser.add_argument("--url", default="http://127.0.0.1:8443/telegram", help="Адрес вебхука")
+    parser.add_argument("--secret", default=os.getenv("WEBHOOK_SECRET", ""), help="Секретный токен вебхука")
+    parser.add_argument("--delay", type=float, default=0.0, help="Пауза между обновлениями в секундах")
+    args = parser.parse_args()
+
+    updates = load_updates(args.file)
+    failed = 0
+    started = time.perf_counter()
+    for update in updates:
+        status = post_update(args.url, args.secret, update)
+        if status != 200:
+            failed += 1
+            print(f"update_id={update.get('update_id')}: HTTP {status}")
+        if args.delay:
+            time.sleep(args.delay)
+
+    elapsed = time.perf_counter() - started
+    print(f"Отправлено обновлений: {len(updates)}, с ошибкой: {failed}, за {elapsed:.2f} с")
+    return 1 if failed else 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,49 @@
+"""
+Модуль с обработчиком обновлений для параллельной обработки (concurrent_updates).
+
+Обновления разных пользователей обрабатываются одновременно (не больше
+max_concurrent_updates сразу), а обновления одного пользователя - по очереди,
+поэтому состояние диалога (ConversationHandler) и прогресс теста не
+перемешиваются. Например, долгая загрузка скриншота одного пользователя
+больше не задерживает ответы на вопросы остальных.
+"""
+from typing import Any, Awaitable, Hashable, Optional
+
+from telegram import Update
+from telegram.ext import BaseUpdateProcessor
+
+from user_serializer import UserSerializer
+
+
+def update_user_key(update: object) -> Optional[Hashable]:
+    """
+    Возвращает ключ очереди обновления: id пользователя, иначе id чата, иначе None
+    """
+    if isinstance(update, Update):
+        if update.effective_user is not None:
+            return update.effective_user.id
+        if update.effective_chat is not None:
+            return update.effective_chat.id
+    return None
+
+
+class PerUserUpdateProcessor(BaseUpdateProcessor):
+    """
+    Обработчик обновлений: параллельно для разных пользователей, по очереди для одного.
+
+    Число одновременно обрабатываемых обновлений ограничивает BaseUpdateProcessor;
+    обновление, ждущее предыдущих обновлений своего пользователя, занимает одно из этих мест.
+    """
+
+    def __init__(self, max_concurrent_updates: int):
+        super().__init__(max_concurrent_updates)
+        self.serializer = UserSerializer()
+
+    async def do_process_update(self, update: object, coroutine: Awaitable[Any]) -> None:
+        await self.serializer.run(update_user_key(update), coroutine)
+
+    async def initialize(self) -> None:
+        pass
+
+    async def shutdown(self) -> None:
+        pass
@@ -0,0 +1,70 @@
+"""
+Модуль с последовательной обработкой обновлений одного пользователя.
+
+При параллельной обработке обновлений (concurrent_updates) обновления разных
+пользователей выполняются одновременно, а обновления одного пользователя -
+строго по очереди в порядке поступления: у каждого пользователя, у которого
+есть обновления в работе, своя блокировка (asyncio.Lock выпускает ожидающих
+в порядке очереди). Блокировка удаляется, когда у пользователя не остается
+обновлений, поэтому память не растет с числом пользователей.
+
+Модуль не зависит от telegram; подключение к боту - в update_processor.py.
+"""
+import asyncio
+import time
+from typing import Any, Awaitable, Dict, Hashable, Optional
+
+import metrics
+
+
+class UserSerializer:
+    """
+    Выполняет корутины одного ключа (пользователя) по очереди, разных ключей - параллельно
+    """
+
+    def __init__(self):
+        self._locks: Dict[Hashable, asyncio.Lock] = {}
+        # Сколько корутин каждого ключа выполняется или ждет своей очереди
+        self._pending: Dict[Hashable, int] = {}
+
+    @property
+    def active_keys(self) -> int:
+        return len(self._pending)
+
+    async def run(self, key: Optional[Hashable], coroutine: Awaitable[Any]) -> Any:
+        """
+        Выполняет корутину после всех ранее переданных корутин того же ключа
+
+        Args:
+            key: Ключ очереди (id пользователя); None - выполнить сразу, без очереди
+            coroutine: Корутина обработки обновления
+        """
+        if key is None:
+            return await coroutine
+
+        lock = self._locks.get(key)
+        if lock is None:
+            lock = self._locks[key] = asyncio.Lock()
+        self._pending[key] = self._pending.get(key, 0) + 1
+        metrics.set_gauge("updates_active_users", len(self._pending))
+
+        started = time.monotonic()
+        try:
+            try:
+                await lock.acquire()
+            except BaseException:
+                # Отменены до начала обработки - корутина так и не будет запущена
+                if asyncio.iscoroutine(coroutine):
+                    coroutine.close()
+                raise
+            try:
+                metrics.observe("update_user_wait_ms", (time.monotonic() - started) * 1000)
+                return await coroutine
+            finally:
+                lock.release()
+        finally:
+            self._pending[key] -= 1
+            if not self._pending[key]:
+                del self._pending[key]
+                del self._locks[key]
+            metrics.set_gauge("updates_active_users", len(self._pending))
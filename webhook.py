@@ -0,0 +1,233 @@
+"""
+Модуль со встроенным HTTP-сервером для получения обновлений Telegram через вебхук.
+
+Сервер написан на asyncio без сторонних зависимостей и умеет ровно то, что
+нужно для вебхука: принимает POST с JSON-обновлением на заданный путь,
+проверяет секретный токен из заголовка X-Telegram-Bot-Api-Secret-Token и
+передает обновление обработчику. Ответ 200 отправляется сразу после того, как
+обновление поставлено в очередь, не дожидаясь его обработки.
+
+Модуль не зависит от telegram, поэтому его можно проверять локально,
+отправляя записанные обновления (см. tools/replay_updates.py).
+"""
+import asyncio
+import hmac
+import json
+import logging
+import re
+from typing import Any, Awaitable, Callable, Dict, Optional, Set, Tuple
+
+import metrics
+
+# Заголовок, в котором Telegram передает секретный токен вебхука
+SECRET_TOKEN_HEADER = "x-telegram-bot-api-secret-token"
+
+# Допустимый секретный токен: 1-256 символов A-Z, a-z, 0-9, _ и - (ограничение Telegram)
+SECRET_TOKEN_RE = re.compile(r"^[A-Za-z0-9_-]{1,256}$")
+
+# Максимальный размер тела запроса (обновления Telegram намного меньше)
+MAX_BODY_SIZE = 1024 * 1024
+
+# Максимальный размер строки запроса или заголовка
+MAX_LINE_SIZE = 8 * 1024
+
+# Сколько секунд ждать следующий запрос в открытом соединении
+KEEPALIVE_TIMEOUT = 75.0
+
+_REASONS = {
+    200: "OK",
+    400: "Bad Request",
+    403: "Forbidden",
+    404: "Not Found",
+    405: "Method Not Allowed",
+    413: "Payload Too Large",
+    500: "Internal Server Error",
+}
+
+
+class WebhookServer:
+    """
+    HTTP-сервер, принимающий обновления Telegram
+    """
+
+    def __init__(
+        self,
+        handle_update: Callable[[Dict[str, Any]], Awaitable[None]],
+        secret_token: str,
+        host: str = "0.0.0.0",
+        port: int = 8443,
+        path: str = "/telegram",
+    ):
+        """
+        Args:
+            handle_update: Корутина, получающая разобранное обновление (dict)
+            secret_token: Секретный токен, переданный Telegram в setWebhook
+            host: Адрес, на котором слушает сервер
+            port: Порт, на котором слушает сервер
+            path: Путь, на который Telegram отправляет обновления
+        """
+        if not SECRET_TOKEN_RE.match(secret_token or ""):
+            raise ValueError("Секретный токен вебхука должен состоять из 1-256 символов A-Z, a-z, 0-9, _ и -")
+        self.handle_update = handle_update
+        self.secret_token = secret_token.encode()
+        self.host = host
+        self.port = port
+        self.path = path if path.startswith("/") else f"/{path}"
+        self._server: Optional[asyncio.AbstractServer] = None
+        # Задачи открытых соединений (закрываются при остановке сервера)
+        self._connections: Set[asyncio.Task] = set()
+
+    async def start(self) -> None:
+        self._server = await asyncio.start_server(self._serve_connection, self.host, self.port)
+        logging.info(f"Вебхук слушает http://{self.host}:{self.port}{self.path}")
+
+    async def stop(self) -> None:
+        if self._server is not None:
+            self._server.close()
+            # Закрываем соединения, ожидающие следующего запроса (keep-alive),
+            # иначе wait_closed в новых версиях Python ждет их до таймаута
+            for task in list(self._connections):
+                task.cancel()
+            await asyncio.gather(*self._connections, return_exceptions=True)
+            await self._server.wait_closed()
+            self._server = None
+            logging.info("Сервер вебхука остановлен")
+
+    async def _serve_connection(self, reader: asyncio.StreamReader, writer: asyncio.StreamWriter) -> None:
+        """
+        Обрабатывает запросы одного соединения (с поддержкой keep-alive)
+        """
+        task = asyncio.current_task()
+        self._connections.add(task)
+        try:
+            while True:
+                try:
+                    request = await asyncio.wait_for(_read_request(reader), KEEPALIVE_TIMEOUT)
+                except _HTTPError as e:
+                    await _write_response(writer, e.status, keep_alive=False)
+                    return
+                if request is None:
+                    return
+
+                method, path, headers, body = request
+                status = await self._handle_request(method, path, headers, body)
+                keep_alive = headers.get("connection", "").lower() != "close"
+                await _write_response(writer, status, keep_alive=keep_alive)
+                if not keep_alive:
+                    return
+        except (asyncio.TimeoutError, asyncio.IncompleteReadError, ConnectionError):
+            pass
+        except asyncio.CancelledError:
+            # Сервер остановлен
+            pass
+        finally:
+            self._connections.discard(task)
+            writer.close()
+
+    async def _handle_request(self, method: str, path: str, headers: Dict[str, str], body: bytes) -> int:
+        """
+        Проверяет запрос и передает обновление обработчику
+
+        Returns:
+            int: HTTP-статус ответа
+        """
+        if path.split("?", 1)[0] != self.path:
+            return 404
+        if method != "POST":
+            return 405
+
+        # Сравнение за постоянное время, чтобы токен нельзя было подобрать по времени ответа
+        if not hmac.compare_digest(headers.get(SECRET_TOKEN_HEADER, "").encode(), self.secret_token):
+            metrics.inc("webhook_rejected_secret")
+            logging.warning("Запрос к вебхуку с неверным секретным токеном")
+            return 403
+
+        try:
+            update = json.loads(body)
+        except ValueError:
+            metrics.inc("webhook_bad_request")
+            return 400
+        if not isinstance(update, dict):
+            metrics.inc("webhook_bad_request")
+            return 400
+
+        try:
+            await self.handle_update(update)
+        except Exception as e:
+            logging.error(f"Ошибка при приеме обновления из вебхука: {e}")
+            return 500
+
+        metrics.inc("webhook_updates")
+        return 200
+
+
+class _HTTPError(Exception):
+    def __init__(self, status: int):
+        super().__init__(status)
+        self.status = status
+
+
+async def _read_line(reader: asyncio.StreamReader) -> bytes:
+    try:
+        line = await reader.readuntil(b"\n")
+    except asyncio.LimitOverrunError:
+        raise _HTTPError(400)
+    if len(line) > MAX_LINE_SIZE:
+        raise _HTTPError(400)
+    return line
+
+
+async def _read_request(reader: asyncio.StreamReader) -> Optional[Tuple[str, str, Dict[str, str], bytes]]:
+    """
+    Читает один HTTP-запрос
+
+    Returns:
+        Optional[Tuple]: (метод, путь, заголовки, тело) или None, если клиент закрыл соединение
+    """
+    try:
+        request_line = await _read_line(reader)
+    except asyncio.IncompleteReadError as e:
+        if not e.partial:
+            return None
+        raise
+
+    parts = request_line.decode("latin-1").split()
+    if len(parts) != 3 or not parts[2].startswith("HTTP/1."):
+        raise _HTTPError(400)
+    method, path, _ = parts
+
+    headers: Dict[str, str] = {}
+    while True:
+        line = (await _read_line(reader)).decode("latin-1").strip()
+        if not line:
+            break
+        name, separator, value = line.partition(":")
+        if not separator:
+            raise _HTTPError(400)
+        headers[name.strip().lower()] = value.strip()
+
+    if "chunked" in headers.get("transfer-encoding", "").lower():
+        # Telegram отправляет обновления с Content-Length
+        raise _HTTPError(400)
+    try:
+        length = int(headers.get("content-length", "0"))
+    except ValueError:
+        raise _HTTPError(400)
+    if length < 0:
+        raise _HTTPError(400)
+    if length > MAX_BODY_SIZE:
+        raise _HTTPError(413)
+
+    body = await reader.readexactly(length) if length else b""
+    return method, path, headers, body
+
+
+async def _write_response(writer: asyncio.StreamWriter, status: int, keep_alive: bool) -> None:
+    reason = _REASONS.get(status, "")
+    writer.write(
+        f"HTTP/1.1 {status} {reason}\r\n"
+        f"Content-Length: 0\r\n"
+        f"Connection: {'keep-alive' if keep_alive else 'close'}\r\n"
+        f"\r\n".encode("latin-1")
+    )
+    await writer.drain()